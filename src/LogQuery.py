@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import json
+import logging, logging.config
+import concurrent.futures
+
+from shared.utils import Paths
+from shared.storage import Rawlog, serialize_entry
+from shared.storage.record_writer import RecordWriter
+from shared.storage.block_container import parse_time_range
+from LogViewer.storage import SettingsSingleton
+from LogViewer.utils import LogFormatter, LazyFormatter, matchQuery, compileQuery
+try:
+    import orjson
+    hasOrjson = True
+except ImportError:
+    hasOrjson = False
+
+logger = logging.getLogger(__name__)
+
+# parse commandline
+def parseArgs():
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter, description="Monal Log Query\n\n" +
+        "Streams all entries of the given rawlog files matching QUERY to stdout (or --output) without loading these files into memory.\n" +
+        "Queries and formatters are the same as in the Monal Log Viewer (its settings are used).\n" +
+        "Exits with 0 if any entry matched, 1 if no entry matched and 2 if an error occurred (like grep).")
+    parser.add_argument("query", type=str, help="Query entries have to match (an empty query matches all entries)")
+    parser.add_argument("files", type=str, help="Rawlog files to query (*.rawlog, *.rawlog.gz or *.rawlog.blk)", nargs="+")
+    queryType = parser.add_mutually_exclusive_group()
+    queryType.add_argument("--python", action="store_true", help="Use a python query (default depends on the Log Viewer settings)")
+    queryType.add_argument("--text", action="store_true", help="Search the formatted entries for the query text instead of using a python query")
+    parser.add_argument("--format", choices=["text", "jsonl", "rawlog"], default="text", help="Output format (default: text)")
+    parser.add_argument("--formatter", metavar="NAME", type=str, help="Log Viewer formatter used for text output and text queries (default: current one)")
+    parser.add_argument("--output", metavar="FILE", type=str, help="Write to this file instead of stdout (compressed if ending in .gz)")
+    parser.add_argument("--from", dest="start", metavar="TIMESTAMP", type=str, help="Only query entries logged at or after this (iso) timestamp, UTC if no timezone is given")
+    parser.add_argument("--to", dest="end", metavar="TIMESTAMP", type=str, help="Only query entries logged at or before this (iso) timestamp, UTC if no timezone is given (covers its whole second, minute etc.)")
+    parser.add_argument("--max-count", metavar="NUM", type=int, help="Stop querying a file after NUM matching entries")
+    parser.add_argument("--workers", metavar="NUM", type=int, help="Number of processes decoding (and threads compressing) in parallel (default: 1)", default=1)
+    parser.add_argument("--log", metavar="LOGLEVEL", help="Loglevel to log", default="WARNING")
+    return parser.parse_args()
+
+# entries are serialized to bytes without their formatted message (files holds the filename of every entry, if multiple files are queried)
+def createSerializer(format, lazyFormatter, files):
+    if format == "text":
+        if len(files) > 1:
+            return lambda filename, entry: bytes("%s: %s\n" % (filename, lazyFormatter.formattedMessage(entry)), "UTF-8")
+        return lambda filename, entry: bytes("%s\n" % lazyFormatter.formattedMessage(entry), "UTF-8")
+    if format == "jsonl":
+        def jsonl(filename, entry):
+            entry.pop("__formattedMessage", None)
+            if len(files) > 1:
+                entry["__file"] = filename
+            if hasOrjson:
+                try:
+                    return orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE)
+                except TypeError:
+                    pass        # e.g. integers exceeding 64 bit, let the json module handle these
+            return bytes(json.dumps(entry) + "\n", "UTF-8")
+        return jsonl
+    def rawlog(filename, entry):
+        if entry["__virtual"]:
+            return b""          # virtual entries are not part of rawlog files
+        entry.pop("__formattedMessage", None)
+        return serialize_entry(entry)
+    return rawlog
+
+# streams all entries of filename matching our query into writer, returns a tuple of the number of matching entries and query errors
+def queryFile(args, filename, writer, query, usePython, lazyFormatter, serialize):
+    matching = 0
+    errors = 0
+    # only text queries and python queries using the formatted message need formatted entries (see LazyFormatter.queryAccessor())
+    needsFormatting = query != "" and (not usePython or "__formattedMessage" in query)
+    timeRange = (args.start, args.end) if args.start != None or args.end != None else None
+    for entry in Rawlog().iterate_file(filename, workers=args.workers, time_range=timeRange):
+        if timeRange != None and "timestamp" not in entry:
+            continue        # virtual entries don't have a timestamp
+        if query != "":
+            if needsFormatting:
+                lazyFormatter.formattedMessage(entry)
+            result = matchQuery(query, None, entry["__logline_index"], entry=entry, usePython=usePython)
+            if result["error"] != None:
+                # like the Log Viewer, we hide entries our query can not be evaluated for (e.g. because they lack a key)
+                if errors == 0:
+                    logger.warning("Exception in query for entry %d of '%s': %s: %s" % (entry["__logline_index"], filename, str(type(result["error"]).__name__), str(result["error"])))
+                errors += 1
+                continue
+            if not result["matching"]:
+                continue
+        writer.write(serialize(filename, entry))
+        matching += 1
+        if args.max_count != None and matching >= args.max_count:
+            break
+    return (matching, errors)
+
+def main():
+    args = parseArgs()
+
+    # use the settings (e.g. formatters) of our Log Viewer
+    Paths.set_personality(os.path.join(os.path.dirname(os.path.abspath(__file__)), "LogViewer.py"))
+    os.makedirs(Paths.user_data_dir(), exist_ok=True)
+
+    with open(Paths.get_default_conf_filepath("logger.json"), 'rb') as fp:
+        logger_config = json.load(fp)
+    logger_config["handlers"]["stderr"]["level"] = args.log
+    logging.config.dictConfig(logger_config)
+
+    usePython = SettingsSingleton()["usePythonFilter"]
+    if args.python or args.text:
+        usePython = args.python
+    if args.start != None or args.end != None:
+        try:
+            parse_time_range((args.start, args.end))
+        except ValueError as e:
+            logger.error(str(e))
+            return 2
+    if args.query != "":
+        try:
+            compileQuery(args.query, usePython)
+        except SyntaxError as e:
+            logger.error("Exception in query: %s: %s" % (str(type(e).__name__), str(e)))
+            return 2
+    try:
+        formatterName = args.formatter if args.formatter != None else SettingsSingleton()["currentFormatter"]
+        lazyFormatter = LazyFormatter(LogFormatter(SettingsSingleton().getFormatter(formatterName)))
+    except KeyError:
+        logger.error("Unknown formatter '%s', available formatters: %s" % (formatterName, ", ".join(SettingsSingleton().getFormatterNames())))
+        return 2
+    except Exception:
+        logger.exception("Could not compile formatter '%s'" % formatterName)
+        return 2
+    serialize = createSerializer(args.format, lazyFormatter, args.files)
+
+    if args.output != None:
+        fp = open(args.output, "wb")
+    else:
+        fp = sys.stdout.buffer
+    status = 1
+    try:
+        writer = RecordWriter(fp, args.output != None and args.output.endswith(".gz"), workers=args.workers)
+        try:
+            for filename in args.files:
+                try:
+                    matching, errors = queryFile(args, filename, writer, args.query, usePython, lazyFormatter, serialize)
+                except (OSError, ValueError, concurrent.futures.BrokenExecutor) as e:
+                    logger.error("Could not query '%s': %s: %s" % (filename, str(type(e).__name__), str(e)))
+                    status = 2
+                    continue
+                logger.info("%d entries of '%s' matched..." % (matching, filename))
+                if errors > 0:
+                    logger.warning("Query could not be evaluated for %d entries of '%s' (they were skipped)" % (errors, filename))
+                if matching > 0 and status == 1:
+                    status = 0
+        finally:
+            writer.close()
+    finally:
+        if args.output != None:
+            fp.close()
+        else:
+            fp.flush()
+    return status
+
+# worker processes of our decoding pool import this file (e.g. using the spawn start method), they must not run main()
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        # our output was closed early (e.g. piped into head), don't let python complain about stdout while shutting down
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(0)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted, shutting down...")
+        sys.exit(2)
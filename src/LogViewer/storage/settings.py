@@ -1,11 +1,11 @@
 import json
-from PyQt5 import QtGui, QtCore
 
 from shared.utils import Paths
 
 import logging
 logger = logging.getLogger(__name__)
 
+# qt is only imported by the methods handling qt objects, to allow headless tools (like LogQuery.py) to use our settings without qt
 class SettingsSingleton():
     _instance = None
 
@@ -64,6 +64,7 @@ class SettingsSingleton():
         self.setComboboxHistoryByName(self._widgetName(combobox), history)
 
     def loadDimensions(self, widget):
+        from PyQt5 import QtCore
         if self._widgetName(widget) in self.data["dimensions"]:
             widget.restoreGeometry(QtCore.QByteArray.fromBase64(bytes(self.data["dimensions"][self._widgetName(widget)], "UTF-8")))
 
@@ -76,6 +77,7 @@ class SettingsSingleton():
         self._store()
 
     def loadState(self, widget):
+        from PyQt5 import QtCore
         if self._widgetName(widget) in self.data["state"]:
             widget.restoreState(QtCore.QByteArray.fromBase64(bytes(self.data["state"][self._widgetName(widget)], "UTF-8")))
 
@@ -84,6 +86,7 @@ class SettingsSingleton():
         self._store()
 
     def getQFont(self, miscKey="font"):
+        from PyQt5 import QtGui
         font = QtGui.QFont()
         font.fromString(self[miscKey])
         return font
@@ -132,6 +135,7 @@ class SettingsSingleton():
         return self.getColorTuple(name)[0]
     
     def getQColorTuple(self, name):
+        from PyQt5 import QtGui
         colorList = list(self.getColorTuple(name))
         for color in range(len(colorList)):
             if colorList[color] != None:
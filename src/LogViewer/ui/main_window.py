@@ -1,11 +1,11 @@
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtWidgets import QStyle
-import sys, os, functools
+import sys, os, functools, time
 
 from LogViewer.storage import SettingsSingleton
-from LogViewer.utils import Search, AbortSearch, QueryStatus, matchQuery
+from LogViewer.utils import Search, AbortSearch, SearchCache, QueryStatus, matchQueryAll, TrigramIndex, LogFormatter, LazyFormatter, FormatterCache
 import LogViewer.utils.helpers as helpers
-from .utils import Completer, MagicLineEdit, Statusbar
+from .utils import Completer, MagicLineEdit, Statusbar, Worker, RawlogModel, FilterProxyModel, isVisibleRow
 from .preferences_dialog import PreferencesDialog
 from shared.storage import Rawlog, AbortRawlogLoading
 from shared.ui.utils import UiAutoloader
@@ -16,17 +16,46 @@ from shared.utils.constants import LOGLEVELS
 import logging
 logger = logging.getLogger(__name__)
 
+LOAD_BATCH_SIZE = 1000          # hand over loaded entries to the ui thread once we got this many of them...
+LOAD_BATCH_INTERVAL = 0.1       # ...or this many seconds passed since the last handover
+FORMAT_BATCH_SIZE = 1000        # number of entries handed to the log formatter at once when reformatting all entries
+BENCHMARK_SAMPLE_SIZE = 10000   # number of entries of the loaded file used to benchmark log formatters
+LIVE_POLL_INTERVAL = 100        # milliseconds between two polls for entries received by our live stream
+FILTER_FILL_CHUNK_SIZE = 2000   # number of entries checked at once by filters applied incrementally (e.g. while loading a file)
+
 @UiAutoloader
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         SettingsSingleton().loadDimensions(self)
         self.rawlog = Rawlog()
         self.file = None
+        self.loadingFile = None         # file currently loaded by our background worker (its entries are shown while loading)
         self.search = None
+        self.worker = None              # background worker currently loading, filtering or searching
+        self.textIndex = None           # built on first use by _getTextIndex()
+        self.lazyFormatter = LazyFormatter(None)
+        self.searchCache = SearchCache()
+        # completes the result list of lazy searches in the background
+        self.searchFillTimer = QtCore.QTimer()
+        self.searchFillTimer.timeout.connect(self._fillSearch)
+        # appends the entries received by our live stream (if connected)
+        self.livePoll = None
+        self.livePollTimer = QtCore.QTimer()
+        self.livePollTimer.timeout.connect(self._pollLiveStream)
         self.statusbar = Statusbar(self.uiStatusbar_main, self.uiMenuBar_main)
         self.currentFilterQuery = None
+        self.filteredCount = 0          # number of rawlog entries our current filter was applied to (later ones are hidden)
+        self.filterError = None
+        # applies our current filter to the entries not yet filtered if filtering incrementally (e.g. while loading a file)
+        self.filterFillTimer = QtCore.QTimer()
+        self.filterFillTimer.timeout.connect(self._fillFilter)
         self.stack = []
         self.selectedCombobox = self.uiCombobox_filterInput
+        self.rawlogModel = RawlogModel(self)
+        # our filter model holds the sorted list of rawlog indexes matching the current filter
+        self.filterModel = FilterProxyModel(self)
+        self.filterModel.setSourceModel(self.rawlogModel)
+        self.uiWidget_listView.setModel(self.filterModel)
 
         self.queryStatus2colorMapping = {
             QueryStatus.EOF_REACHED:    SettingsSingleton().getColor("combobox-eof_reached"),
@@ -34,7 +63,6 @@ class MainWindow(QtWidgets.QMainWindow):
             QueryStatus.QUERY_OK:       SettingsSingleton().getColor("combobox-query_ok"),
             QueryStatus.QUERY_EMPTY:    SettingsSingleton().getColor("combobox-query_empty"),
         }
-        self.logflag2colorMapping = {v: "logline-%s" % k.lower() for k, v in LOGLEVELS.items()}
 
         self.toggleUiItems()
 
@@ -46,6 +74,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.uiButton_next.clicked.connect(self.searchNext)
 
         self.uiAction_open.triggered.connect(self.openFileBrowser)
+        self.uiAction_liveStream.triggered.connect(self.connectLiveStream)
         self.uiAction_close.triggered.connect(self.closeFile)
         self.uiAction_quit.triggered.connect(self.quit)
         self.uiAction_preferences.triggered.connect(self.preferences)
@@ -94,10 +123,16 @@ class MainWindow(QtWidgets.QMainWindow):
 
     @catch_exceptions(logger=logger)
     def quit(self):
+        self.cancelBackgroundTask()
+        self.disconnectLiveStream()
+        self.lazyFormatter.storeCache()     # python waits for this to be stored before exiting
         sys.exit()
 
     @catch_exceptions(logger=logger)
     def closeEvent(self, event):
+        self.cancelBackgroundTask()
+        self.disconnectLiveStream()
+        self.lazyFormatter.storeCache()     # python waits for this to be stored before exiting
         sys.exit()
 
     @catch_exceptions(logger=logger)
@@ -106,6 +141,8 @@ class MainWindow(QtWidgets.QMainWindow):
         SettingsSingleton().storeDimension(self)
     
     def toggleUiItems(self):
+        # filtering and searching is possible while loading a file, too
+        hasEntries = self.file != None or self.isLoading()
         self.uiAction_close.setEnabled(self.file != None)
         self.uiAction_quit.setEnabled(True)
         self.uiAction_open.setEnabled(True)
@@ -114,18 +151,18 @@ class MainWindow(QtWidgets.QMainWindow):
         self.uiAction_export.setEnabled(self.file != None)
         self.uiAction_pushStack.setEnabled(self.file != None)
         self.uiAction_popStack.setEnabled(self.file != None and len(self.stack) != 0)
-        self.uiAction_search.setEnabled(self.file != None)
+        self.uiAction_search.setEnabled(hasEntries)
         self.uiAction_save.setEnabled(self.file != None)
         self.uiAction_goToRow.setEnabled(self.file != None)
         self.uiAction_firstRow.setEnabled(self.file != None)
         self.uiAction_lastRow.setEnabled(self.file != None)
-        self.uiButton_previous.setEnabled(self.file != None and len(self.uiCombobox_searchInput.currentText().strip()) != 0)
-        self.uiButton_next.setEnabled(self.file != None and len(self.uiCombobox_searchInput.currentText().strip()) != 0)
-        self.uiButton_filterClear.setEnabled(self.file != None and self.currentFilterQuery != None)
+        self.uiButton_previous.setEnabled(hasEntries and len(self.uiCombobox_searchInput.currentText().strip()) != 0)
+        self.uiButton_next.setEnabled(hasEntries and len(self.uiCombobox_searchInput.currentText().strip()) != 0)
+        self.uiButton_filterClear.setEnabled(hasEntries and self.currentFilterQuery != None)
         self.uiButton_goToRow.setEnabled(self.file != None)
         self.uiSpinBox_goToRow.setEnabled(self.file != None)
-        self.uiCombobox_searchInput.setEnabled(self.file != None)
-        self.uiCombobox_filterInput.setEnabled(self.file != None)
+        self.uiCombobox_searchInput.setEnabled(hasEntries)
+        self.uiCombobox_filterInput.setEnabled(hasEntries)
         self.uiAction_lastRowInViewport.setEnabled(self.file != None)
         self.uiAction_firstRowInViewport.setEnabled(self.file != None)
 
@@ -135,7 +172,7 @@ class MainWindow(QtWidgets.QMainWindow):
             if check:
                 SettingsSingleton().setLastPath(os.path.dirname(os.path.abspath(file)))
                 formatter = self.createFormatter()
-                status = self.rawlog.export_file(file, custom_store_callback = lambda entry: entry["data"] if not entry["uiItem"].isHidden() else None, formatter = lambda entry: self.createFormatterText(formatter, entry))
+                status = self.rawlog.export_file(file, custom_store_callback = lambda entry: entry["data"] if self.filterModel.isVisible(entry["data"]["__logline_index"]) else None, formatter = lambda entry: entry["__formattedMessage"] if "__formattedMessage" in entry else self.createFormatterText(formatter, entry), compresslevel = self.compressionLevel())
                 if status:
                     self.statusbar.showDynamicText(str("Done ✓ | Log export was successful"))
                 else:
@@ -143,18 +180,22 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def save(self):
         if self.rawlog:
-            file, check = QtWidgets.QFileDialog.getSaveFileName(None, "Choose where to save this rawlog logfile", SettingsSingleton().getLastPath(), "Compressed Monal rawlog (*.rawlog.gz)(*.rawlog.gz);;Monal rawlog (*.rawlog)(*.rawlog);;All files (*)")
+            file, check = QtWidgets.QFileDialog.getSaveFileName(None, "Choose where to save this rawlog logfile", SettingsSingleton().getLastPath(), "Compressed Monal rawlog (*.rawlog.gz)(*.rawlog.gz);;Monal rawlog (*.rawlog)(*.rawlog);;Monal rawlog block container (*.rawlog.blk)(*.rawlog.blk);;All files (*)")
             if check:
                 SettingsSingleton().setLastPath(os.path.dirname(os.path.abspath(file)))
-                status = self.rawlog.store_file(file, custom_store_callback = lambda entry: entry["data"] if not entry["uiItem"].isHidden() else None)
+                status = self.rawlog.store_file(file, custom_store_callback = lambda entry: entry["data"] if self.filterModel.isVisible(entry["data"]["__logline_index"]) else None, compresslevel = self.compressionLevel())
                 if status:
                     self.statusbar.showDynamicText(str("Done ✓ | Rawlog saved successfully"))
                 else:
                     self.statusbar.showDynamicText(str("Error ✗ | Could not save warlow"))   
 
+    # gzip compression level used when saving or exporting .gz files (compression uses all cores)
+    def compressionLevel(self):
+        return max(0, min(SettingsSingleton()["compressionLevel"], 9))
+
     @catch_exceptions(logger=logger)
     def openFileBrowser(self, *args):
-        file, check = QtWidgets.QFileDialog.getOpenFileName(None, "Open rawlog logfile", SettingsSingleton().getLastPath(), "Monal rawlog (*.rawlog.gz *.rawlog)(*.rawlog.gz *.rawlog);;All files (*)")
+        file, check = QtWidgets.QFileDialog.getOpenFileName(None, "Open rawlog logfile", SettingsSingleton().getLastPath(), "Monal rawlog (*.rawlog.gz *.rawlog *.rawlog.blk)(*.rawlog.gz *.rawlog *.rawlog.blk);;All files (*)")
         if check:
             SettingsSingleton().setLastPath(os.path.dirname(os.path.abspath(file)))
             self.openLogFile(file)
@@ -164,80 +205,253 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.statusbar.setText("Loading File: '%s'..." % os.path.basename(file))
         formatter = self.createFormatter()
-        self.rawlog = Rawlog()
+        if formatter == None:
+            self.statusbar.setText("")
+            return
+        # formatting is deferred until an entry is needed (e.g. displayed or text searched), if lazyFormatting is enabled
+        lazyFormatting = SettingsSingleton()["lazyFormatting"]
+        # lazily formatted files are opened without decoding any entry, if lazyLoading is enabled, too: entries are decoded
+        # once needed using an offset index of the file (cached next to it, see Rawlog.load_file_lazy())
+        lazyLoading = lazyFormatting and SettingsSingleton()["lazyLoading"]
+        rawlog = Rawlog()
+        self.rawlog = rawlog
+        lazyFormatter = LazyFormatter(formatter, self._createLazyFormatterCache(file, formatter) if lazyFormatting else None)
+        self.lazyFormatter = lazyFormatter
+        self.rawlogModel.setRawlog(rawlog, 0, self.lazyFormatter)
         self.search = None
+        self.loadingFile = file
         
-        def loader(entry):
-            itemFont = SettingsSingleton().getQFont()
-            # directly warn about file corruptions when they happen to allow the user to abort the loading process
-            # using the cancel button in the progressbar window
-            if "__warning" in entry and entry["__warning"] == True:
-                QtWidgets.QMessageBox.warning(self, "File corruption detected", entry["message"])
-
-            formattedEntry = self.createFormatterText(formatter, entry)
-            entry["__formattedMessage"] = formattedEntry
-            
-            # return None if our formatter filtered out that entry
-            if formattedEntry == None:
-                return None
-            
-            item_with_color = helpers.wordWrapLogline(formattedEntry)   
-            fg, bg = SettingsSingleton().getQColorTuple(self.logflag2colorMapping[entry["flag"]])
-            item_with_color = QtWidgets.QListWidgetItem(item_with_color)
-            item_with_color.setFont(itemFont)
-            item_with_color.setForeground(fg)
-            if bg == None:
-                bg = QtGui.QBrush()     # default color (usually transparent)
-            item_with_color.setBackground(bg)
+        # this runs in our background worker: new entries are announced to our model by _addLoadedEntries() in our ui thread
+        def load(worker):
+            # lines lazily formatted when this file was last opened using the same formatter code get added by _fileLoaded()
+            lazyLines = lazyFormatter.cache.load() if lazyFormatter.cache != None else None
+            if lazyLoading:
+                # entries are wrapped again every time they get decoded, this wrapper must not depend on any state
+                if rawlog.load_file(file, lazy=True, progress_callback=worker.updateProgress, custom_load_callback=lambda entry: {"data": entry}) != True:
+                    return {"loaded": False, "formatterError": None}
+                worker.partialResult.emit({"count": len(rawlog), "warnings": rawlog.data.index.warnings()})
+                return {"loaded": True, "formatterError": None, "lazyLines": lazyLines}
+
+            # reuse the lines formatted when this file was last opened using the same formatter code (if any)
+            # lazily formatted files use the lazy cache of our LazyFormatter instead: lazily formatted entries can not be
+            # filtered out by our formatter (like eagerly cached ones could be)
+            formatterCache = None
+            if SettingsSingleton()["formatterCache"] and not lazyFormatting:
+                formatterCache = FormatterCache(file, formatter.codeHash)
+            # we need to do this because we can't write primitive datatypes from within our closure
+            state = {
+                "batch": {"count": 0, "warnings": []}, "lastHandover": time.monotonic(), "formatterError": None,
+                "cachedLines": formatterCache.load() if formatterCache != None else None, "lines": [], "position": 0,
+            }
+
+            def handover():
+                worker.partialResult.emit(state["batch"])
+                state["batch"] = {"count": 0, "warnings": []}
+                state["lastHandover"] = time.monotonic()
+
+            def loader(entry):
+                # all entries counted so far are part of our rawlog already (an entry gets appended once we returned it)
+                if state["batch"]["count"] >= LOAD_BATCH_SIZE or time.monotonic() - state["lastHandover"] >= LOAD_BATCH_INTERVAL:
+                    handover()
+                # directly warn about file corruptions when they happen to allow the user to abort the loading process
+                # using the cancel button in the progressbar window
+                if "__warning" in entry and entry["__warning"] == True:
+                    state["batch"]["warnings"].append(entry["message"])
+
+                position = state["position"]
+                state["position"] += 1
+                if lazyFormatting:
+                    # our LazyFormatter will format this entry once it is needed
+                    state["batch"]["count"] += 1
+                    return {"data": entry}
+                elif state["cachedLines"] != None and position < len(state["cachedLines"]):
+                    formattedEntry = state["cachedLines"][position]
+                else:
+                    try:
+                        formattedEntry = self.createFormatterText(formatter, entry, ignoreError=True)
+                    except AbortRawlogLoading as e:
+                        state["formatterError"] = (e.__context__, entry)        # message boxes can only be shown by our ui thread
+                        raise
+                state["lines"].append(formattedEntry)
+                entry["__formattedMessage"] = formattedEntry
+                
+                # return None if our formatter filtered out that entry
+                if formattedEntry == None:
+                    return None
+                
+                state["batch"]["count"] += 1
+                return {"data": entry}
             
-            return {"uiItem": item_with_color, "data": entry}
+            # don't pretend something was loaded if the loading was aborted
+            if rawlog.load_file(file, progress_callback=worker.updateProgress, custom_load_callback=loader) != True:
+                return {"loaded": False, "formatterError": state["formatterError"]}
+            handover()
+            # only completely formatted files can be cached
+            if formatterCache != None and len(state["lines"]) == state["position"] and state["cachedLines"] != state["lines"]:
+                formatterCache.store(state["lines"])
+            return {"loaded": True, "formatterError": None, "lazyLines": lazyLines}
         
-        progressbar, updateProgressbar = self.progressDialog("Opening File...", "Opening File: %s" % os.path.basename(file), True)
-        # don't pretend something was loaded if the loading was aborted
-        if self.rawlog.load_file(file, progress_callback=updateProgressbar, custom_load_callback=loader) != True:
+        # the user is allowed to scroll through all lines loaded so far while the rest of the file is still loading
+        self.runInBackground(load, functools.partial(self._fileLoaded, file), "Opening File...", "Opening File: %s" % os.path.basename(file),
+            hasCancelButton=True, modal=False, onPartialResult=self._addLoadedEntries)
+        self.toggleUiItems()
+
+    @catch_exceptions(logger=logger)
+    def connectLiveStream(self, *args):
+        host = SettingsSingleton()["liveStreamHost"]
+        port = SettingsSingleton()["liveStreamPort"]
+        key, check = QtWidgets.QInputDialog.getText(self, "Connect to live stream", "Listening on [%s]:%d, key configured in the app (empty if not encrypted):" % (host, port), QtWidgets.QLineEdit.Password)
+        if not check:
+            return
+        self.closeFile()
+
+        formatter = self.createFormatter()
+        if formatter == None:
+            return
+        rawlog = Rawlog()
+        try:
+            # received entries get formatted by our LazyFormatter once they are displayed
+            # only the most recent entries are held in memory, older ones are paged in from a temporary spill file (0 disables this)
+            memoryLimit = SettingsSingleton()["liveStreamMemoryLimit"]
+            poll = rawlog.stream_rawlog(key if key != "" else None, host=host, port=port, custom_load_callback=lambda entry: {"data": entry},
+                                        max_bytes=memoryLimit * 1024 * 1024 if memoryLimit > 0 else None)
+        except Exception as e:
+            logger.exception("Exception while connecting to live stream")
+            QtWidgets.QMessageBox.critical(
+                self,
+                "Monal Log Viewer | ERROR",
+                "Could not listen for live stream on [%s]:%d:\n%s: %s" % (host, port, str(type(e).__name__), str(e)),
+                QtWidgets.QMessageBox.Ok
+            )
+            return
+        self.rawlog = rawlog
+        self.lazyFormatter = LazyFormatter(formatter)
+        self.rawlogModel.setRawlog(rawlog, 0, self.lazyFormatter)
+        self.livePoll = poll
+        self.livePollTimer.start(LIVE_POLL_INTERVAL)
+        self.file = "live stream [%s]:%d" % (host, port)
+        self.stack.clear()
+        self.statusbar.showDynamicText(str("Done ✓ | Listening for live stream on [%s]:%d" % (host, port)))
+        self._updateStatusbar()
+        self.toggleUiItems()
+
+    def disconnectLiveStream(self):
+        if self.livePoll != None:
+            self.livePollTimer.stop()
+            self.livePoll(stop=True)
+            self.livePoll = None
+
+    # append the entries received since our last poll (all of them at once, that's faster than appending them in small batches)
+    # at most one batch of entries is appended per poll to keep our ui responsive, if more entries are pending we poll again
+    # as soon as all other ui events got processed
+    @catch_exceptions(logger=logger)
+    def _pollLiveStream(self):
+        first = len(self.rawlog)
+        self.livePoll()
+        self.livePollTimer.setInterval(0 if self.livePoll.statistics()["pending"] > 0 else LIVE_POLL_INTERVAL)
+        count = len(self.rawlog) - first
+        if count == 0:
+            self._updateStatusbar()     # update our live stream counters
+            return
+
+        # follow new entries unless the user scrolled away from the bottom
+        scrollbar = self.uiWidget_listView.verticalScrollBar()
+        following = scrollbar.value() == scrollbar.maximum()
+        self.rawlogModel.appendRows(count)
+        self._entriesAppended()
+        if following:
+            self.uiWidget_listView.scrollToBottom()
+
+        if first == 0:
+            self.setCompleter(self.uiCombobox_filterInput)
+            self.setCompleter(self.uiCombobox_searchInput)
+        self.uiSpinBox_goToRow.setMaximum(len(self.rawlog) - 1)
+        self._updateStatusbar()
+
+    # apply our current filter and search to the rows appended to our model (e.g. by our live stream or while loading a file)
+    # only the new entries are checked: visible rows and search results are only ever appended, so their positions stay stable
+    def _entriesAppended(self):
+        self.searchCache.clear()        # cached search results don't contain the new entries
+        if self.filterFillTimer.isActive():
+            return      # our filter is still catching up and will reach the new entries on its own
+        self._extendFilter()
+
+    # apply our current filter to up to limit entries not filtered yet (None filters all of them) and let our search follow,
+    # returns True if all rows of our model are filtered now
+    def _extendFilter(self, limit=None):
+        end = self.rawlogModel.rowCount()
+        if limit != None:
+            end = min(end, self.filteredCount + limit)
+        if self.filterModel.isFiltered() and end > self.filteredCount:
+            usePython = SettingsSingleton()["usePythonFilter"]
+            getEntry = self.lazyFormatter.queryAccessor(self.currentFilterQuery, usePython)
+            result = matchQueryAll(self.currentFilterQuery, self.rawlog, usePython=usePython, getEntry=getEntry, indexes=range(self.filteredCount, end))
+            self.filteredCount = end
+            self.filterModel.appendVisibleRows(result["matching"])
+            # update our state before showing the error: showing a message box processes events and thus could call us again
+            if result["error"] != None and self.filterError == None:
+                self.filterError = result["error"]
+                self.checkQueryResult(self.filterError, self.filterModel.rowCount(), self.uiCombobox_filterInput)
+            elif self.filterError == None:
+                self.checkQueryResult(None, self.filterModel.rowCount(), self.uiCombobox_filterInput)
+        self._extendSearch()
+        return not self.filterModel.isFiltered() or self.filteredCount >= self.rawlogModel.rowCount()
+
+    def _fillFilter(self):
+        if self._extendFilter(FILTER_FILL_CHUNK_SIZE):
+            self.filterFillTimer.stop()
+        self._updateStatusbar()
+
+    # entries not filtered yet are hidden and must not be searched before our filter reached them
+    def _searchableCount(self):
+        return self.filteredCount if self.filterModel.isFiltered() else self.rawlogModel.rowCount()
+
+    # let our search check the entries appended since it was created (or extended the last time), too
+    def _extendSearch(self):
+        if self.search != None:
+            self.search.extend(self._searchableCount())
+            if not self.search.isComplete():
+                self.searchFillTimer.start()
+
+    # True while our background worker is loading a file: filters and searches must not cancel it and work incrementally instead
+    # returns the cache of the lines lazily formatted for file or None if not caching formatted lines
+    def _createLazyFormatterCache(self, file, formatter):
+        if not SettingsSingleton()["formatterCache"]:
+            return None
+        try:
+            return FormatterCache(file, formatter.codeHash, lazy=True)
+        except OSError:
+            logger.warning("Could not create formatter cache for '%s', continuing without..." % file, exc_info=True)
+            return None
+
+    def isLoading(self):
+        return self.loadingFile != None and self.worker != None
+
+    def _addLoadedEntries(self, batch):
+        self.rawlogModel.appendRows(batch["count"])
+        self._entriesAppended()
+        # show warnings after adding our rows: showing a message box processes events and thus could add the next batch already
+        for message in batch["warnings"]:
+            QtWidgets.QMessageBox.warning(self, "File corruption detected", message)
+
+    def _fileLoaded(self, file, result):
+        self.loadingFile = None
+        if result["formatterError"] != None:
+            self.showFormatterError(*result["formatterError"])
+        if result["loaded"] != True:
             self.closeFile()        # reset our ui to a sane state
-            progressbar.hide()
             self.statusbar.setText("")
             return
 
-        self.statusbar.setText("Rendering File: '%s'..." % os.path.basename(file))
-        progressbar.setLabelText("Rendering File: '%s'..." % os.path.basename(file))
-        progressbar.setCancelButton(None)       # disable cancel button when rendering our file
-        QtWidgets.QApplication.processEvents()
-        error = None
-        visibleCounter = 0
-        
-        # Add uiItems and apply the filter manually as it's faster to do both things at the same time
-        self.currentFilterQuery = self.uiCombobox_filterInput.currentText().strip()
-        for index in range(len(self.rawlog)):
-            self.uiWidget_listView.addItem(self.rawlog[index]["uiItem"])
-            if len(self.currentFilterQuery ) != 0:
-                result = matchQuery(self.currentFilterQuery , self.rawlog, index, usePython=SettingsSingleton()["usePythonFilter"])
-                if result["status"] != QueryStatus.QUERY_ERROR:
-                    self.rawlog[index]["uiItem"].setHidden(not result["matching"])
-                else:
-                    error = result["error"]
-                visibleCounter += 1 if result["matching"] else 0
-        if len(self.currentFilterQuery) != 0:
-            self.checkQueryResult(error, visibleCounter, self.uiCombobox_filterInput)
-        QtWidgets.QApplication.processEvents()
-        progressbar.hide()
+        self._invalidateTextIndex()
+        self.lazyFormatter.addCachedLines(result["lazyLines"])
 
         if self.file != file:
             self.stack.clear()
 
         self.file = file
 
-        # abort our current search if we have an active search but no search query in our input box
-        if len(self.uiCombobox_searchInput.currentText().strip()) != 0:
-            self.search = None
-        
-        if self.search != None:
-            # set self.search to None to retrigger a new search using the new rawlog (new file) rather than the old one
-            self.search = None 
-            self.uiFrame_goToRow.hide()
-            self.uiFrame_search.show()
-            self.searchNext()
+        # searches and filters started while loading already got extended by all entries loaded (see _entriesAppended())
 
         self.statusbar.showDynamicText(str("Done ✓ | file opened: " + os.path.basename(file)))
 
@@ -248,6 +462,37 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._updateStatusbar()
         self.toggleUiItems()
+
+        # apply the filter currently entered (if any) to our newly loaded file, if it wasn't applied while loading already
+        if self.currentFilterQuery == None and len(self.uiCombobox_filterInput.currentText().strip()) != 0:
+            self.filter()
+    
+    # returns the rawlog index of the selected line (not its row in our list view, that depends on the current filter)
+    def selectedRow(self):
+        return self.filterModel.mapToSource(self.uiWidget_listView.selectedIndexes()[0]).row()
+
+    def isRowHidden(self, row):
+        return not self.filterModel.isVisible(row)
+
+    def setCurrentRow(self, row):
+        self.uiWidget_listView.setCurrentIndex(self.filterModel.mapFromSource(self.rawlogModel.index(row)))
+
+    def scrollToRow(self, row, hint=QtWidgets.QAbstractItemView.EnsureVisible):
+        self.uiWidget_listView.scrollTo(self.filterModel.mapFromSource(self.rawlogModel.index(row)), hint)
+
+    # drop our trigram index, it gets rebuilt by _getTextIndex() once needed again
+    def _invalidateTextIndex(self):
+        if self.textIndex != None:
+            self.textIndex.cancel()
+        self.textIndex = None
+
+    # returns our trigram index used by non-python searches and filters, building it in the background on first use
+    # (until it is ready, searches and filters will check every entry instead)
+    def _getTextIndex(self):
+        if self.textIndex == None and self.file != None:
+            self.textIndex = TrigramIndex(self.rawlog, self.lazyFormatter)
+            self.textIndex.startBuilding()
+        return self.textIndex
     
     def setCompleter(self, combobox):
         wordlist = self.rawlog.getCompleterList(lambda entry: entry["data"])
@@ -264,14 +509,17 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             logger.exception("Exception while calling log formatter for: %s" % entry)
             if not ignoreError:
-                QtWidgets.QMessageBox.critical(
-                    self,
-                    "Monal Log Viewer | ERROR", 
-                    "Exception in formatter code:\n%s: %s\n%s" % (str(type(e).__name__), str(e), entry),
-                    QtWidgets.QMessageBox.Ok
-                )
+                self.showFormatterError(e, entry)
             raise AbortRawlogLoading()       # abort loading
 
+    def showFormatterError(self, e, entry):
+        QtWidgets.QMessageBox.critical(
+            self,
+            "Monal Log Viewer | ERROR", 
+            "Exception in formatter code:\n%s: %s\n%s" % (str(type(e).__name__), str(e), entry),
+            QtWidgets.QMessageBox.Ok
+        )
+
     def createFormatter(self):
         # first of all: try to compile our log formatter code and abort, if this isn't generating a callable formatter function
         try:
@@ -287,19 +535,28 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
     def compileLogFormatter(self, code):
-        # compile our code by executing it
-        loc = {}
-        exec(code, {}, loc)
-        if "formatter" not in loc or not callable(loc["formatter"]):
-            logger.error("Formatter code did not evaluate to formatter() function!")
-            raise RuntimeError("Log formatter MUST define a function following this signature: formatter(e, **g)")
-        # bind all local variables (code imported, other defined functions etc.) onto our log formatter to be used later
-        return functools.partial(loc["formatter"], **loc)
+        return LogFormatter(code)
+
+    # format a list of entries using the batch api of our formatter, returns a list of formatted lines
+    # if formatting the batch failed, every entry is formatted separately to pinpoint the erroneous ones
+    def createFormatterTexts(self, formatter, entries, ignoreError=False):
+        try:
+            return formatter.batch(entries)
+        except Exception:
+            logger.exception("Exception while calling batch log formatter, formatting entries separately")
+        lines = []
+        for entry in entries:
+            try:
+                lines.append(self.createFormatterText(formatter, entry, ignoreError))
+            except Exception as e:
+                lines.append("E R R O R")
+                ignoreError = True      # only show the first error
+        return lines
 
     @catch_exceptions(logger=logger)
     def inspectLine(self, *args):
         if len(self.uiWidget_listView.selectedIndexes()) != 0:
-            if self.currentDetailIndex != self.uiWidget_listView.selectedIndexes()[0].row():
+            if self.currentDetailIndex != self.selectedRow():
                 def splitter(dictionary, path=[]):
                     retval = []
                     for key, value in dictionary.items():
@@ -314,7 +571,7 @@ class MainWindow(QtWidgets.QMainWindow):
                         path.pop(-1)
                     return retval
                 
-                selectedEntry = self.rawlog[self.uiWidget_listView.selectedIndexes()[0].row()].get("data")
+                selectedEntry = self.rawlog[self.selectedRow()].get("data")
                 details_table_data = splitter(selectedEntry)
                 logger.debug("details table data: %s" % details_table_data)
                 
@@ -333,7 +590,7 @@ class MainWindow(QtWidgets.QMainWindow):
                     row += 1
                 
                 self.uiTable_characteristics.show()
-                self.currentDetailIndex = self.uiWidget_listView.selectedIndexes()[0].row()
+                self.currentDetailIndex = self.selectedRow()
                 self.uiAction_inspectLine.setData(True)
                 self.uiAction_inspectLine.setChecked(True)
             else:
@@ -358,8 +615,16 @@ class MainWindow(QtWidgets.QMainWindow):
             
     @catch_exceptions(logger=logger)
     def closeFile(self, *args):
-        self.uiWidget_listView.clear()
+        self.cancelBackgroundTask()
+        self.disconnectLiveStream()
+        self.lazyFormatter.storeCache()
+        self.filterFillTimer.stop()
+        self.loadingFile = None
+        self._invalidateTextIndex()
+        self.searchCache.clear()
+        self.rawlog.clear()         # e.g. removes the spill file of our live stream
         self.rawlog = Rawlog()
+        self.rawlogModel.setRawlog(self.rawlog)
         self.hideSearchOrGoto()
         self.selectedCombobox = self.uiCombobox_filterInput
         self.file = None
@@ -367,11 +632,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.toggleUiItems()
         self.hideInspectLine()
 
+    # entries evenly spread over our loaded file (copies, our formatted messages must not be touched by the formatters to benchmark)
+    def _formatterSample(self):
+        step = max(1, len(self.rawlog) // BENCHMARK_SAMPLE_SIZE)
+        return [dict(entry["data"]) for entry in self.rawlog[::step][:BENCHMARK_SAMPLE_SIZE]]
+
     @catch_exceptions(logger=logger)
     def preferences(self, *args):
         preInstance = {
             "color": {},
-            "staticLineWrap": SettingsSingleton()["staticLineWrap"],
             "font": SettingsSingleton().getQFont(),
             "formatter": SettingsSingleton().getCurrentFormatterCode(),
             "style": SettingsSingleton()["uiStyle"]
@@ -379,7 +648,7 @@ class MainWindow(QtWidgets.QMainWindow):
         for colorName in SettingsSingleton().getColorNames():
             preInstance["color"][colorName] = SettingsSingleton().getQColorTuple(colorName)
         
-        self.preferencesDialog = PreferencesDialog()
+        self.preferencesDialog = PreferencesDialog(self._formatterSample())
         self.preferencesDialog.show()
         result = self.preferencesDialog.exec_()
         if result:
@@ -405,7 +674,7 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         # if no logline is selected, let the search implementation continue where it left of
         if len(self.uiWidget_listView.selectedIndexes()) > 0:
-            self.search.resetStartIndex(self.uiWidget_listView.selectedIndexes()[0].row())
+            self.search.resetStartIndex(self.selectedRow())
     
     def searchNext(self):
         # use unbound function, self will be bound in _search() later on after the instance was created
@@ -421,11 +690,15 @@ class MainWindow(QtWidgets.QMainWindow):
             self.search = None
             self.uiCombobox_searchInput.setStyleSheet("")
         elif self.search != None and self.search.getQuery() == query:
-            if len(self.uiWidget_listView.selectedIndexes()) != 0 and self.uiWidget_listView.selectedIndexes()[0].row() != self.search.getPosition():
-                self.search.resetStartIndex(self.uiWidget_listView.selectedIndexes()[0].row())
+            if len(self.uiWidget_listView.selectedIndexes()) != 0 and self.selectedRow() != self.search.getPosition():
+                self.search.resetStartIndex(self.selectedRow())
         else:
-            self._prepareSearch()   # create search instance (to be bound below)
-        
+            # create search instance (to be bound below), this possibly runs in the background
+            self._prepareSearch(functools.partial(self._searchStep, func))
+            return
+        self._searchStep(func)
+
+    def _searchStep(self, func):
         result = None
         if self.search != None:
             result = func(self.search)  # bind self (first arg) using our (newly created) self.search
@@ -433,28 +706,62 @@ class MainWindow(QtWidgets.QMainWindow):
             self.setComboboxStatusColor(self.uiCombobox_searchInput, self.search.getStatus())
 
         if result != None:
-            self.uiWidget_listView.setCurrentRow(result)
+            self.setCurrentRow(result)
             self.uiWidget_listView.setFocus()
         
+        if self.search != None and not self.search.isComplete():
+            self.searchFillTimer.start()
         self._updateStatusbar()
 
-    def _prepareSearch(self):
+    # create a new search instance and call onReady() afterwards
+    def _prepareSearch(self, onReady):
         query = self.uiCombobox_searchInput.currentText().strip()
+        self.updateComboboxHistory(query, self.uiCombobox_searchInput)
 
-        progressbar, update_progressbar = self.progressDialog("Searching...", query, True)
-        try:
-            # let our new search begin at the currently selected line (if any)
-            startIndex = 0       # if no logline is selected, let the search implementation begin at our list start
-            if len(self.uiWidget_listView.selectedIndexes()) > 0:
-                startIndex = self.uiWidget_listView.selectedIndexes()[0].row()
-            self.search = Search(self.rawlog, query, startIndex, update_progressbar)
-            if self.search.getStatus() == QueryStatus.QUERY_ERROR:
+        # let our new search begin at the currently selected line (if any)
+        startIndex = 0       # if no logline is selected, let the search implementation begin at our list start
+        if len(self.uiWidget_listView.selectedIndexes()) > 0:
+            startIndex = self.selectedRow()
+
+        def searchCreated(search):
+            self.search = search
+            self._extendSearch()        # entries appended while searching in the background
+            if self.search != None and self.search.getStatus() == QueryStatus.QUERY_ERROR:
                 self.checkQueryResult(self.search.getError(), 0, self.uiCombobox_searchInput)
-        except AbortSearch:
-            self.search = None
+            onReady()
 
-        progressbar.hide()
-        self.updateComboboxHistory(query, self.uiCombobox_searchInput)
+        usePython = SettingsSingleton()["usePythonSearch"]
+        textIndex = self._getTextIndex() if not usePython else None
+        getEntry = self.lazyFormatter.queryAccessor(query, usePython)
+
+        count = self._searchableCount()
+
+        # lazy searches don't check any entry upfront, no need to do this in the background (our loading worker must not be cancelled)
+        if SettingsSingleton()["lazySearch"] or self.isLoading():
+            searchCreated(Search(self.rawlog, query, startIndex, textIndex=textIndex, searchCache=self.searchCache, lazy=True, isVisible=self.filterModel.isVisible, getEntry=getEntry, count=count))
+            return
+        
+        # our worker must not touch our list view, use the indexes of our filter result to determine visible entries instead
+        rawlog = self.rawlog
+        searchCache = self.searchCache
+        visibleRows = self.filterModel.getVisibleRows()
+        isVisible = lambda index: isVisibleRow(visibleRows, index)
+        def search(worker):
+            try:
+                return Search(rawlog, query, startIndex, worker.updateProgress, textIndex=textIndex, searchCache=searchCache, isVisible=isVisible, getEntry=getEntry, count=count)
+            except AbortSearch:
+                return None
+        self.runInBackground(search, searchCreated, "Searching...", query, hasCancelButton=True)
+
+    def _fillSearch(self):
+        if self.search == None or self.search.isComplete():
+            self.searchFillTimer.stop()
+            return
+        if self.search.fill():
+            self.searchFillTimer.stop()
+            if self.search.getError() != None:
+                self.checkQueryResult(self.search.getError(), len(self.search), self.uiCombobox_searchInput)
+        self._updateStatusbar()
     
     @catch_exceptions(logger=logger)
     def hideSearchOrGoto(self):
@@ -469,23 +776,21 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.currentFilterQuery != None and len(self.currentFilterQuery) > 0:
             currentSelectetLine = None
             if len(self.uiWidget_listView.selectedIndexes()) != 0:
-                currentSelectetLine = self.uiWidget_listView.selectedIndexes()[0].row()
+                currentSelectetLine = self.selectedRow()
                 
             self.uiCombobox_filterInput.setCurrentText("")
             self.uiCombobox_filterInput.setStyleSheet("")
 
-            progressbar, update_progressbar = self.progressDialog("Clearing filter...", "")
-            QtWidgets.QApplication.processEvents()
-
             self.cancelFilter()
 
-            progressbar.hide()
             self.currentFilterQuery = None
             self.statusbar.showDynamicText("Filter cleared")
             self._updateStatusbar()
 
-            if currentSelectetLine:
-                self.uiWidget_listView.scrollToItem(self.rawlog[currentSelectetLine]["uiItem"], QtWidgets.QAbstractItemView.PositionAtCenter)
+            # changing the filter resets the selection of our list view
+            if currentSelectetLine != None:
+                self.setCurrentRow(currentSelectetLine)
+                self.scrollToRow(currentSelectetLine, QtWidgets.QAbstractItemView.PositionAtCenter)
 
             self.toggleUiItems()
     
@@ -503,56 +808,62 @@ class MainWindow(QtWidgets.QMainWindow):
 
         selectedLine = None
         if len(self.uiWidget_listView.selectedIndexes()) != 0:
-            selectedLine = self.uiWidget_listView.selectedIndexes()[0].row()
-
-        progressbar, update_progressbar = self.progressDialog("Filtering...", query, True)
-        error = None
-        visibleCounter = 0
-        filterMapping = {}
-        for rawlogPosition in range(len(self.rawlog)):
-            result = matchQuery(query, self.rawlog, rawlogPosition, usePython=SettingsSingleton()["usePythonFilter"])
-            if result["status"] == QueryStatus.QUERY_OK:
-                filterMapping[rawlogPosition] = not result["matching"]
-            else:
-                error = result["error"]
-                filterMapping[rawlogPosition] = True            # hide all entries having filter errors
-            visibleCounter += 1 if result["matching"] else 0
-            if update_progressbar(rawlogPosition, len(self.rawlog)) == True:
-                self.cancelFilter()
-                break
-        self.checkQueryResult(error, visibleCounter, self.uiCombobox_filterInput)
-        
-        progressbar.setLabelText("Rendering Filter...")
-        QtWidgets.QApplication.processEvents()
+            selectedLine = self.selectedRow()
+
+        self.filterFillTimer.stop()
+        if self.isLoading():
+            # filter the entries loaded so far in small chunks (and all entries loaded later on), instead of cancelling our worker
+            self.filterModel.setVisibleRows([])
+            self.filteredCount = 0
+            self.filterError = None
+            self.searchCache.clear()
+            self.filterFillTimer.start()
+            self.toggleUiItems()
+            self._updateStatusbar()
+            return
+
+        rawlog = self.rawlog
+        count = len(rawlog)     # entries appended while filtering (e.g. by our live stream) are checked by _filterFinished()
+        usePython = SettingsSingleton()["usePythonFilter"]
+        textIndex = self._getTextIndex() if not usePython else None
+        getEntry = self.lazyFormatter.queryAccessor(query, usePython)
+        self.runInBackground(
+            lambda worker: matchQueryAll(query, rawlog, usePython=usePython, update_progressbar=worker.updateProgress, getEntry=getEntry, textIndex=textIndex),
+            functools.partial(self._filterFinished, selectedLine, count), "Filtering...", query, hasCancelButton=True
+        )
+
+    def _filterFinished(self, selectedLine, count, result):
+        if result == None:
+            self.cancelFilter()
+            self.toggleUiItems()
+            self._updateStatusbar()
+            return
+        matching = sorted(index for index in result["matching"] if index < count)       # entries having filter errors are hidden, too
+        self.checkQueryResult(result["error"], len(matching), self.uiCombobox_filterInput)
         
-        # this has to be done outside of our filter loop above, to not slow down our filter process significantly
-        for rawlogPosition, hidden in filterMapping.items():
-            self.rawlog[rawlogPosition]["uiItem"].setHidden(hidden)
+        self.filterModel.setVisibleRows(matching)
+        self.filteredCount = count
+        self.filterError = result["error"]
+        self.searchCache.clear()        # cached search results depend on the visible entries
+        self._extendFilter()            # entries appended while filtering
         
-        if self.currentDetailIndex != None and self.rawlog[self.currentDetailIndex]["uiItem"].isHidden():
+        if self.currentDetailIndex != None and self.isRowHidden(self.currentDetailIndex):
             self.hideInspectLine()
 
-        progressbar.hide()
-
         self.toggleUiItems()
 
-        # scroll to selected line, if still visible or to next visible line, if not
+        # reselect the selected line and scroll to it, if still visible or scroll to next visible line, if not
         # (if there is no next visible line, scroll to previous visible line)
         if selectedLine != None:
-            found = False
-            for index in range(selectedLine, len(self.rawlog), 1):
-                if self.rawlog[index]["uiItem"].isHidden() == False:
-                    self.uiWidget_listView.scrollToItem(self.rawlog[index]["uiItem"], QtWidgets.QAbstractItemView.PositionAtCenter)
-                    found = True
-                    break 
-            if not found:
-                for index in range(len(self.rawlog)-1, selectedLine, -1):
-                    if self.rawlog[index]["uiItem"].isHidden() == False:
-                        self.uiWidget_listView.scrollToItem(self.rawlog[index]["uiItem"], QtWidgets.QAbstractItemView.PositionAtCenter)
-                        found = True
-                        break 
-            if not found:
+            index = self.filterModel.nextVisible(selectedLine)
+            if index == None:
+                index = self.filterModel.previousVisible(selectedLine)
+            if index == None:
                 logger.debug("No visible line to scroll to!")
+            else:
+                if index == selectedLine:
+                    self.setCurrentRow(index)
+                self.scrollToRow(index, QtWidgets.QAbstractItemView.PositionAtCenter)
 
         self._updateStatusbar()
 
@@ -574,8 +885,8 @@ class MainWindow(QtWidgets.QMainWindow):
         
         # prevent switching to row if that row is already selected
         rowIndex = self.uiSpinBox_goToRow.value()
-        if len(self.uiWidget_listView.selectedIndexes()) == 0 or rowIndex != self.uiWidget_listView.selectedIndexes()[0].row():
-            self.uiWidget_listView.setCurrentRow(rowIndex)
+        if len(self.uiWidget_listView.selectedIndexes()) == 0 or rowIndex != self.selectedRow():
+            self.setCurrentRow(rowIndex)
     
     def checkQueryResult(self, error = None, visibleCounter = 0, combobox=None):
         if error != None:
@@ -595,97 +906,131 @@ class MainWindow(QtWidgets.QMainWindow):
     def uiCombobox_inputChanged(self, *args):
         self.toggleUiItems()
 
-    @catch_exceptions(logger=logger)
-    def progressDialog(self, title, label, hasCancelButton=False):
+    # run task(worker) in a background Worker while showing a progressbar, any task already running gets cancelled
+    # onResult(result) and onPartialResult(partialResult) are called in our ui thread
+    # (they won't be called anymore if the task was cancelled by cancelBackgroundTask())
+    def runInBackground(self, task, onResult, title, label, hasCancelButton=False, modal=True, onPartialResult=None):
+        self.cancelBackgroundTask()
+
         progressbar = QtWidgets.QProgressDialog(label, "Cancel", 0, 100, self)
         progressbar.setWindowTitle(title)
         progressbar.setGeometry(200, 200, 650, 100)
         if not hasCancelButton:
             progressbar.setCancelButton(None)
         progressbar.setAutoClose(False)
+        progressbar.setAutoReset(False)
+        progressbar.setWindowModality(QtCore.Qt.WindowModal if modal else QtCore.Qt.NonModal)
         progressbar.setValue(0)
 
-        # we need to do this because we can't write primitive datatypes from within our closure
-        oldpercentage = {"value": 0}
-
-        def update_progressbar(pos, total):
-            # cancel loading if the progress dialog was canceled
-            if progressbar.wasCanceled():
-                return True
-            
-            currentpercentage = int(pos/total*100)
-            if currentpercentage != oldpercentage["value"]:
-                progressbar.setValue(currentpercentage)
-                QtWidgets.QApplication.processEvents()
-            oldpercentage["value"] = currentpercentage
+        worker = Worker(task, self)
+        worker.progressbar = progressbar
+        worker.progress.connect(progressbar.setValue)
+        progressbar.canceled.connect(worker.cancel)
 
+        @catch_exceptions(logger=logger)
+        def partialResult(partialResult):
+            if self.worker == worker and onPartialResult != None:
+                onPartialResult(partialResult)
+        
+        @catch_exceptions(logger=logger)
+        def result(result):
+            if self.worker != worker:
+                return
+            self._finishBackgroundTask()
+            onResult(result)
+
+        @catch_exceptions(logger=logger)
+        def error(e):
+            if self.worker != worker:
+                return
+            self._finishBackgroundTask()
+            self.statusbar.showDynamicText("Error ✗ | %s: %s" % (str(type(e).__name__), str(e)))
+        
+        worker.partialResult.connect(partialResult)
+        worker.result.connect(result)
+        worker.error.connect(error)
+        self.worker = worker
         progressbar.show()
-        return (progressbar, update_progressbar)
-    
+        worker.start()
+
+    def cancelBackgroundTask(self):
+        if self.worker != None:
+            logger.debug("Cancelling background task...")
+            self.worker.cancel()
+            self.worker.wait()
+            self._finishBackgroundTask()
+
+    def _finishBackgroundTask(self):
+        self.worker.progressbar.hide()
+        self.worker.deleteLater()
+        self.worker = None
+
     @catch_exceptions(logger=logger)
     def goToFirstRow(self, *args):
-        # set first row as current row
-        for index in range(len(self.rawlog)):
-            if not self.rawlog[index]["uiItem"].isHidden():
-                self.uiWidget_listView.setCurrentRow(index)
-                #self.statusbar.showDynamicText(str("Done ✓ | Switched to first row: %d" % index))
-                break
+        # set first visible row as current row
+        index = self.filterModel.nextVisible(0)
+        if index != None:
+            self.setCurrentRow(index)
+            #self.statusbar.showDynamicText(str("Done ✓ | Switched to first row: %d" % index))
 
     @catch_exceptions(logger=logger)
     def goToLastRow(self, *args):
-        # set last row as current row 
-        for index in range(len(self.rawlog)-1, -1, -1):
-            self.uiWidget_listView.setCurrentRow(index)
+        # set last visible row as current row 
+        index = self.filterModel.previousVisible(len(self.rawlog)-1)
+        if index != None:
+            self.setCurrentRow(index)
             #self.statusbar.showDynamicText(str("Done ✓ | Switched to last row: %d" % index))
-            break
 
     @catch_exceptions(logger=logger)
     def goToFirstRowInViewport(self, *args):
         if len(self.uiWidget_listView.selectedIndexes()) == 0:
             return;
-        lastIndex = self.uiWidget_listView.selectedIndexes()[0].row()
+        # rows of our list view (only containing visible entries)
+        lastRow = self.uiWidget_listView.selectedIndexes()[0].row()
         # Counts backwards from the current entry
-        for index in range(self.uiWidget_listView.selectedIndexes()[0].row(), -1, -1):
+        for row in range(self.uiWidget_listView.selectedIndexes()[0].row(), -1, -1):
             # If the item is not fully visible (e.g. y-position is not in our viewport anymore),
             # the previous one must have been the last one in our viewport --> use that
-            visualItemRect = self.uiWidget_listView.visualItemRect(self.rawlog[index]["uiItem"])
+            visualItemRect = self.uiWidget_listView.visualRect(self.filterModel.index(row))
             if visualItemRect.y() < 0:
                 break
             else:
-                lastIndex = index
-        self.uiWidget_listView.setCurrentRow(lastIndex)
+                lastRow = row
+        lastIndex = self.filterModel.rawlogIndex(lastRow)
+        self.setCurrentRow(lastIndex)
         #self.statusbar.showDynamicText(str("Done ✓ | Switched to the first line in the viewport: %d" % lastIndex))
 
     @catch_exceptions(logger=logger)
     def goToLastRowInViewport(self, *args):
         if len(self.uiWidget_listView.selectedIndexes()) == 0:
             return;
-        lastIndex = self.uiWidget_listView.selectedIndexes()[0].row()
+        # rows of our list view (only containing visible entries)
+        lastRow = self.uiWidget_listView.selectedIndexes()[0].row()
         # Counts upwards from the current entry
-        for index in range(self.uiWidget_listView.selectedIndexes()[0].row(), len(self.rawlog)):
+        for row in range(self.uiWidget_listView.selectedIndexes()[0].row(), self.filterModel.rowCount()):
             # If the item is not fully visible (e.g. y-position + height is not in our viewport anymore),
             # the previous one must have been the last one in our viewport --> use that
-            visualItemRect = self.uiWidget_listView.visualItemRect(self.rawlog[index]["uiItem"])
+            visualItemRect = self.uiWidget_listView.visualRect(self.filterModel.index(row))
             if visualItemRect.y() + visualItemRect.height() > self.uiWidget_listView.height():
                 break
             else:
-                lastIndex = index
-        self.uiWidget_listView.setCurrentRow(lastIndex)
+                lastRow = row
+        lastIndex = self.filterModel.rawlogIndex(lastRow)
+        self.setCurrentRow(lastIndex)
         #self.statusbar.showDynamicText(str("Done ✓ | Switched to the last line in the viewport: %d" % lastIndex))
     
     def cancelFilter(self):
-        for index in range(len(self.rawlog)):
-            if self.rawlog[index]["uiItem"].isHidden():
-                self.rawlog[index]["uiItem"].setHidden(False)
-            # this slows down significantly
-            #update_progressbar(index, len(self.rawlog))
+        self.filterFillTimer.stop()
+        self.filterModel.setVisibleRows(None)
         self.currentFilterQuery = None
+        self.searchCache.clear()
+        self._extendSearch()        # entries not filtered yet weren't searched
     
     @catch_exceptions(logger=logger)
     def pushStack(self, *args):
         selectedLine = None
         if self.uiWidget_listView.selectedIndexes():
-            selectedLine = self.uiWidget_listView.selectedIndexes()[0].row()
+            selectedLine = self.selectedRow()
 
         currentSearchResult = None
         if self.search:
@@ -749,8 +1094,9 @@ class MainWindow(QtWidgets.QMainWindow):
             self.uiCombobox_searchInput.lineEdit().setSelection(stack["search"]["selection"]["start"], stack["search"]["selection"]["length"])
             if stack["search"]["instance"]:
                 # Before continuing the search, we set the row so that the search starts at the correct index
-                self.uiWidget_listView.setCurrentRow(stack["search"]["currentLine"])
+                self.setCurrentRow(stack["search"]["currentLine"])
                 self.search = stack["search"]["instance"]
+                self._extendSearch()        # entries appended since pushing our state
                 self.searchNext()
                 self.searchPrevious()
 
@@ -761,7 +1107,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 
         # unpacking details
         if stack["detail"]["isOpen"]:
-            self.uiWidget_listView.setCurrentRow(stack["detail"]["currentDetailIndex"])
+            self.setCurrentRow(stack["detail"]["currentDetailIndex"])
             self.inspectLine()
             self.uiTable_characteristics.setFixedHeight(stack["detail"]["size"])
             if stack["detail"]["size"] == 0:
@@ -769,7 +1115,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # unpacking selected items and scroll position
         if stack["selectedLine"]:
-            self.uiWidget_listView.setCurrentRow(stack["selectedLine"])
+            self.setCurrentRow(stack["selectedLine"])
         self.uiWidget_listView.verticalScrollBar().setValue(stack["scrollPosVertical"])
         self.uiWidget_listView.horizontalScrollBar().setValue(stack["scrollPosHorizontal"])
 
@@ -788,18 +1134,20 @@ class MainWindow(QtWidgets.QMainWindow):
         text = ""
 
         if len(self.rawlog) > 0:
-            text += "%s:" % os.path.basename(self.file)
+            text += "%s:" % os.path.basename(self.file if self.file != None else self.loadingFile)
 
         if self.currentFilterQuery != None:
             text += " %d/%d" % (
-                len([item for item in self.rawlog if not item["uiItem"].isHidden()]),
+                self.filterModel.rowCount(),
                 len(self.rawlog)
             )
         else:
             text += " %d" % len(self.rawlog)
             
         if self.search != None and not self.uiFrame_search.isHidden() and len(self.uiCombobox_searchInput.currentText().strip()) > 0:
-            if len(self.search) != 0:
+            if not self.search.isComplete():
+                text += ", search: %d/%d+ (searching...)" % (self.search.getPosition(), len(self.search))
+            elif len(self.search) != 0:
                 text += ", search: %d/%d" % (self.search.getPosition(), len(self.search))
             else:
                 text += ", search: no result!"
@@ -807,6 +1155,10 @@ class MainWindow(QtWidgets.QMainWindow):
         if len(self.stack) != 0:
             text += ", stack: %d" % len(self.stack)
 
+        if self.livePoll != None:
+            statistics = self.livePoll.statistics()
+            text += ", live: %d received, %d dropped, %d late" % (statistics["received"], statistics["dropped"] + statistics["failed"], statistics["late"])
+
         self.statusbar.setText(text)
 
     @catch_exceptions(logger=logger)
@@ -819,30 +1171,27 @@ class MainWindow(QtWidgets.QMainWindow):
 
         def rebuildFormatter():
             formatter = self.createFormatter()
+            self.lazyFormatter.storeCache()     # the lines lazily formatted by our old formatter are still valid for its code
 
-            ignoreError = False
-            for entry in self.rawlog:
-                try:
-                    entry["data"]["__formattedMessage"] = self.createFormatterText(formatter, entry["data"], ignoreError)
-                except Exception as e:
-                    entry["data"]["__formattedMessage"] = "E R R O R"
-                    ignoreError = True
-                entry["uiItem"].setText(helpers.wordWrapLogline(entry["data"]["__formattedMessage"]))
-                rebuildFont(entry)
-                rebuildColor(entry)
-            
-        def rebuildColor(entry):
-            colorName = self.logflag2colorMapping[entry["data"]["flag"]]
-            fg, bg = SettingsSingleton().getQColorTuple(colorName)
-            if fg != preInstance["color"][colorName][0] or bg != preInstance["color"][colorName][1]:
-                entry["uiItem"].setForeground(fg)
-                if bg == None:
-                    bg = QtGui.QBrush()     # default color (usually transparent)
-                entry["uiItem"].setBackground(bg)
-                            
-
-        def rebuildFont(item):
-            item["uiItem"].setFont(SettingsSingleton().getQFont())
+            if formatter != None and SettingsSingleton()["lazyFormatting"]:
+                # just forget all formatted messages, our new LazyFormatter formats them again once needed
+                # (or takes them from its cache, if this file was opened lazily formatted)
+                for entry in self.rawlog:
+                    entry["data"].pop("__formattedMessage", None)
+                lazyFormatter = LazyFormatter(formatter, self._createLazyFormatterCache(self.file, formatter) if self.lazyFormatter.cache != None else None)
+                if lazyFormatter.cache != None:
+                    lazyFormatter.addCachedLines(lazyFormatter.cache.load())
+                self.lazyFormatter = lazyFormatter
+            else:
+                for start in range(0, len(self.rawlog), FORMAT_BATCH_SIZE):
+                    entries = [entry["data"] for entry in self.rawlog[start:start + FORMAT_BATCH_SIZE]]
+                    for entry, formattedEntry in zip(entries, self.createFormatterTexts(formatter, entries)):
+                        entry["__formattedMessage"] = formattedEntry
+                if formatter != None:
+                    self.lazyFormatter = LazyFormatter(formatter)
+            self.rawlog.mark_changed()      # e.g. columns cached by our query planner are outdated now
+            self._invalidateTextIndex()
+            self.searchCache.clear()
             
         rebuildCombobox(self.uiCombobox_filterInput)
         rebuildCombobox(self.uiCombobox_searchInput)
@@ -853,15 +1202,8 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.file != None:
             if preInstance["formatter"] != SettingsSingleton().getCurrentFormatterCode():
                 rebuildFormatter()
-            else:
-                if preInstance["staticLineWrap"] != SettingsSingleton()["staticLineWrap"]:
-                    for entry in range(len(self.rawlog)):
-                        self.rawlog[entry]["uiItem"].setText(helpers.wordWrapLogline(self.rawlog[entry]["data"]["__formattedMessage"]))
-                if preInstance["font"] != SettingsSingleton().getQFont():
-                    for item in self.rawlog:
-                        rebuildFont(item)
-                for entry in self.rawlog:
-                    rebuildColor(entry)
+        # our model renders text, font and colors on demand: let the view rerender all rows using the new settings
+        self.rawlogModel.refresh(self.lazyFormatter)
     
     def loadComboboxHistory(self, combobox):
         combobox.clear()
@@ -890,7 +1232,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def copyToClipboard(self):
         data = None
         if self.uiWidget_listView.hasFocus():
-            data = self.rawlog[self.uiWidget_listView.selectedIndexes()[0].row()]["data"]["__formattedMessage"]
+            data = self.lazyFormatter.formattedMessage(self.rawlog[self.selectedRow()]["data"])
         if self.uiTable_characteristics.hasFocus():
             data = self.uiTable_characteristics.currentItem().text()
         
@@ -4,6 +4,7 @@ import functools
 from PyQt5 import QtWidgets, uic, QtGui, QtCore
 
 from LogViewer.storage import SettingsSingleton
+from LogViewer.utils import LogFormatter, benchmarkFormatter
 from .utils import PythonHighlighter, DeletableQListWidget
 from shared.utils import catch_exceptions, Paths
 from shared.ui.utils import UiAutoloader
@@ -14,7 +15,9 @@ logger = logging.getLogger(__name__)
 
 @UiAutoloader
 class PreferencesDialog(QtWidgets.QDialog):
-    def __init__(self):
+    # sampleEntries are used to benchmark log formatters (e.g. some entries of the loaded file)
+    def __init__(self, sampleEntries=None):
+        self.sampleEntries = sampleEntries if sampleEntries != None else []
         self.colors = {}
         for colorName in SettingsSingleton().getColorNames():
             self.colors[colorName] = SettingsSingleton().getQColorTuple(colorName)
@@ -122,7 +125,7 @@ class PreferencesDialog(QtWidgets.QDialog):
     def _createMiscWidget(self, value, miscName):
         if type(value) == int:
             widget = QtWidgets.QSpinBox()
-            widget.setMaximum(1024)
+            widget.setMaximum(65535 if miscName == "liveStreamPort" else 1024)
             widget.setValue(value)
         elif type(value) == float:
             widget = QtWidgets.QDoubleSpinBox()
@@ -238,7 +241,7 @@ class PreferencesDialog(QtWidgets.QDialog):
         lineEdit = QtWidgets.QLineEdit()
         lineEdit.setPlaceholderText("Formatter name")
         code = QtWidgets.QPlainTextEdit()
-        code.setPlaceholderText("def formatter(e, **g):\n\tglobals().update(g)\n\treturn \"%s %s\" % (e[\"timestamp\"], e[\"message\"])")
+        code.setPlaceholderText("def formatter(e):\n\treturn \"%s %s\" % (e[\"timestamp\"], e[\"message\"])")
         self.syntaxHighlighters[""] = PythonHighlighter(code.document())
         button = QtWidgets.QPushButton()
         horizonalLayout = QtWidgets.QHBoxLayout()
@@ -250,19 +253,53 @@ class PreferencesDialog(QtWidgets.QDialog):
         button.setIcon(self.style().standardIcon(getattr(QtWidgets.QStyle, "SP_DialogApplyButton")))
         button.clicked.connect(functools.partial(self._addFormatter, lineEdit, code, button))
 
+        benchmarkButton = QtWidgets.QPushButton()
+        benchmarkButton.setText("Benchmark")
+        benchmarkButton.setIcon(self.style().standardIcon(getattr(QtWidgets.QStyle, "SP_MediaPlay")))
+        benchmarkButton.setEnabled(len(self.sampleEntries) != 0)
+        benchmarkButton.setToolTip("Format some lines of the loaded file" if len(self.sampleEntries) != 0 else "Open a file to benchmark formatters")
+        benchmarkButton.clicked.connect(functools.partial(self._benchmarkFormatter, lineEdit, code))
+
         lineEdit.setMaximumWidth(200)
         button.setMaximumWidth(200)
+        benchmarkButton.setMaximumWidth(200)
 
         code.setTabStopWidth(code.fontMetrics().width(" ") * SettingsSingleton().getTabWidth())
 
         verticalLayout.addWidget(lineEdit)
         verticalLayout.addWidget(button)
+        verticalLayout.addWidget(benchmarkButton)
         horizonalLayout.addLayout(verticalLayout)
         horizonalLayout.addWidget(code)
         self.uiVLayout_formatTabs.addLayout(horizonalLayout)
 
         return (lineEdit, button, code)
 
+    @catch_exceptions(logger=logger)
+    def _benchmarkFormatter(self, lineEdit, code, *args):
+        # benchmark the code currently entered, not the one saved in our settings
+        try:
+            QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+            try:
+                linesPerSecond = benchmarkFormatter(LogFormatter(code.toPlainText()), self.sampleEntries)
+            finally:
+                QtWidgets.QApplication.restoreOverrideCursor()
+        except Exception as e:
+            logger.exception("Exception while benchmarking log formatter")
+            QtWidgets.QMessageBox.critical(
+                self,
+                "Monal Log Viewer | ERROR",
+                "Exception in formatter code:\n%s: %s" % (str(type(e).__name__), str(e)),
+                QtWidgets.QMessageBox.Ok
+            )
+            return
+        QtWidgets.QMessageBox.information(
+            self,
+            "Monal Log Viewer | Formatter benchmark",
+            "Formatter '%s' formats %d lines/s (using a sample of %d lines of the loaded file)" % (lineEdit.text(), linesPerSecond, len(self.sampleEntries)),
+            QtWidgets.QMessageBox.Ok
+        )
+
     @catch_exceptions(logger=logger)
     def _restoreDefaults(self, *args):
         msgBox = QtWidgets.QMessageBox.question(
@@ -3,3 +3,6 @@ from .magic_line_edit import MagicLineEdit
 from .statusbar import Statusbar
 from .syntax_hilighting import PythonHighlighter
 from .deletable_qlist_widget import DeletableQListWidget
+from .worker import Worker, CancelToken
+from .rawlog_model import RawlogModel
+from .filter_proxy_model import FilterProxyModel, isVisibleRow
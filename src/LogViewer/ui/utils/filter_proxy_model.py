@@ -0,0 +1,137 @@
+import bisect
+from PyQt5 import QtCore
+
+import logging
+logger = logging.getLogger(__name__)
+
+# returns True if the rawlog index is part of the sorted list of visible rows (None means everything is visible)
+# this does not touch any qt object and can thus be used by background threads, too
+def isVisibleRow(visibleRows, index):
+    if visibleRows == None:
+        return True
+    pos = bisect.bisect_left(visibleRows, index)
+    return pos < len(visibleRows) and visibleRows[pos] == index
+
+# proxy model showing only the rows of our source model (e.g. our RawlogModel) contained in a sorted list of rawlog indexes
+# the list of visible rows is only ever appended to (keeping it sorted) or replaced as a whole (e.g. by setVisibleRows()),
+# so references to it can safely be handed over to background threads
+class FilterProxyModel(QtCore.QAbstractProxyModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.visibleRows = None         # None if not filtered
+
+    def setSourceModel(self, sourceModel):
+        super().setSourceModel(sourceModel)
+        sourceModel.modelAboutToBeReset.connect(self.beginResetModel)
+        sourceModel.modelReset.connect(self._sourceReset)
+        sourceModel.rowsAboutToBeInserted.connect(self._sourceRowsAboutToBeInserted)
+        sourceModel.rowsInserted.connect(self._sourceRowsInserted)
+        sourceModel.dataChanged.connect(self._sourceDataChanged)
+
+    # replace the rows currently visible by a new sorted list of rawlog indexes (None shows all rows again)
+    def setVisibleRows(self, visibleRows):
+        self.beginResetModel()
+        self.visibleRows = visibleRows
+        self.endResetModel()
+
+    # rows appended to our source model are not visible while we are filtered,
+    # use this to make some of them visible (their rawlog indexes have to be greater than all visible ones)
+    def appendVisibleRows(self, rows):
+        if self.visibleRows == None or len(rows) == 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.visibleRows), len(self.visibleRows) + len(rows) - 1)
+        self.visibleRows.extend(rows)
+        self.endInsertRows()
+
+    def getVisibleRows(self):
+        return self.visibleRows
+
+    def isFiltered(self):
+        return self.visibleRows != None
+
+    def isVisible(self, index):
+        return isVisibleRow(self.visibleRows, index)
+
+    # returns the rawlog index of a proxy row
+    def rawlogIndex(self, row):
+        if self.visibleRows == None:
+            return row
+        return self.visibleRows[row]
+
+    # returns the proxy row of a rawlog index or None if that rawlog entry is not visible
+    def proxyRow(self, index):
+        if self.visibleRows == None:
+            return index if 0 <= index < self.sourceModel().rowCount() else None
+        pos = bisect.bisect_left(self.visibleRows, index)
+        if pos < len(self.visibleRows) and self.visibleRows[pos] == index:
+            return pos
+        return None
+
+    # returns the first visible rawlog index >= index or None if there is none
+    def nextVisible(self, index):
+        if self.visibleRows == None:
+            return index if 0 <= index < self.sourceModel().rowCount() else None
+        pos = bisect.bisect_left(self.visibleRows, index)
+        return self.visibleRows[pos] if pos < len(self.visibleRows) else None
+
+    # returns the last visible rawlog index <= index or None if there is none
+    def previousVisible(self, index):
+        if self.visibleRows == None:
+            return min(index, self.sourceModel().rowCount() - 1) if index >= 0 and self.sourceModel().rowCount() > 0 else None
+        pos = bisect.bisect_right(self.visibleRows, index) - 1
+        return self.visibleRows[pos] if pos >= 0 else None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.sourceModel() == None:
+            return 0
+        if self.visibleRows == None:
+            return self.sourceModel().rowCount()
+        return len(self.visibleRows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def index(self, row, column=0, parent=QtCore.QModelIndex()):
+        if parent.isValid() or row < 0 or row >= self.rowCount() or column != 0:
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QtCore.QModelIndex()
+
+    def mapToSource(self, proxyIndex):
+        if not proxyIndex.isValid() or self.sourceModel() == None:
+            return QtCore.QModelIndex()
+        return self.sourceModel().index(self.rawlogIndex(proxyIndex.row()))
+
+    def mapFromSource(self, sourceIndex):
+        if not sourceIndex.isValid():
+            return QtCore.QModelIndex()
+        row = self.proxyRow(sourceIndex.row())
+        if row == None:
+            return QtCore.QModelIndex()
+        return self.index(row)
+
+    def _sourceReset(self):
+        self.visibleRows = None
+        self.endResetModel()
+
+    # rows appended to our source are only visible if we are not filtered
+    def _sourceRowsAboutToBeInserted(self, parent, first, last):
+        if self.visibleRows == None:
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+
+    def _sourceRowsInserted(self, parent, first, last):
+        if self.visibleRows == None:
+            self.endInsertRows()
+
+    def _sourceDataChanged(self, topLeft, bottomRight, roles):
+        if self.rowCount() == 0:
+            return
+        if self.visibleRows == None:
+            self.dataChanged.emit(self.index(topLeft.row()), self.index(bottomRight.row()), roles)
+            return
+        first = bisect.bisect_left(self.visibleRows, topLeft.row())
+        last = bisect.bisect_right(self.visibleRows, bottomRight.row()) - 1
+        if first <= last:
+            self.dataChanged.emit(self.index(first), self.index(last), roles)
@@ -0,0 +1,92 @@
+import collections
+from PyQt5 import QtCore
+
+from LogViewer.storage import SettingsSingleton
+import LogViewer.utils.helpers as helpers
+from shared.utils.constants import LOGLEVELS
+
+import logging
+logger = logging.getLogger(__name__)
+
+WRAP_CACHE_SIZE = 4096      # number of word wrapped rows to keep (should be well above the number of rows visible at once)
+
+# list model serving the (ui wrapped) entries of a rawlog on demand, no qt objects are created per entry
+# text, font and colors are computed by data() for the rows the view actually needs (e.g. visible ones)
+# word wrapped texts are cached per (row, wrap width) in a bounded LRU
+# entries not formatted yet get formatted by our formatter (a LazyFormatter) once the view needs them
+# the rawlog may grow (e.g. while loading in a background thread), appendRows() makes new entries visible to the view
+class RawlogModel(QtCore.QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rawlog = []
+        self.count = 0
+        self.formatter = None
+        self.wrapCache = collections.OrderedDict()
+        self.logflag2colorMapping = {v: "logline-%s" % k.lower() for k, v in LOGLEVELS.items()}
+        self.refreshStyle()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.count
+
+    # our rawlog could be cleared before we got reset (e.g. by a background thread), don't access rows it does not have anymore
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.count or index.row() >= len(self.rawlog):
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.wrappedText(index.row())
+        if role == QtCore.Qt.FontRole:
+            return self.font
+        if role == QtCore.Qt.ForegroundRole:
+            return self.colors[self.rawlog[index.row()]["data"]["flag"]][0]
+        if role == QtCore.Qt.BackgroundRole:
+            return self.colors[self.rawlog[index.row()]["data"]["flag"]][1]
+        return None
+
+    def wrappedText(self, row):
+        key = (row, self.lineWrap)
+        if key in self.wrapCache:
+            self.wrapCache.move_to_end(key)
+            return self.wrapCache[key]
+        if row >= len(self.rawlog):
+            return ""
+        text = helpers.wordWrapLogline(self.formatter.formattedMessage(self.rawlog[row]["data"]), self.lineWrap)
+        self.wrapCache[key] = text
+        if len(self.wrapCache) > WRAP_CACHE_SIZE:
+            self.wrapCache.popitem(last=False)
+        return text
+
+    def setRawlog(self, rawlog, count=None, formatter=None):
+        self.beginResetModel()
+        self.wrapCache.clear()
+        self.rawlog = rawlog
+        if formatter != None:
+            self.formatter = formatter
+        self.count = len(rawlog) if count == None else count
+        self.endResetModel()
+
+    # the first count entries not yet part of our model were appended to our rawlog
+    def appendRows(self, count):
+        if count == 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self.count, self.count + count - 1)
+        self.count += count
+        self.endInsertRows()
+
+    # reload font, colors and wrap width from our settings and let the view rerender all rows (e.g. after changing the formatter)
+    def refresh(self, formatter=None):
+        if formatter != None:
+            self.formatter = formatter
+        self.wrapCache.clear()      # formatted messages could have changed
+        self.refreshStyle()
+        if self.count > 0:
+            self.dataChanged.emit(self.index(0), self.index(self.count - 1))
+
+    def refreshStyle(self):
+        self.font = SettingsSingleton().getQFont()
+        self.lineWrap = SettingsSingleton()["staticLineWrap"]
+        self.colors = {}
+        for flag, colorName in self.logflag2colorMapping.items():
+            fg, bg = SettingsSingleton().getQColorTuple(colorName)
+            self.colors[flag] = (fg, bg)     # bg is None for the default color (usually transparent)
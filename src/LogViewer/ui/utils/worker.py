@@ -0,0 +1,55 @@
+import threading
+from PyQt5 import QtCore
+
+import logging
+logger = logging.getLogger(__name__)
+
+# token used to signal a cancel request to a task running in a Worker
+class CancelToken:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def isCancelled(self):
+        return self.event.is_set()
+
+# runs task(worker) in its own thread, results and progress get delivered to the ui thread using signals
+# the task has to regularly call worker.updateProgress(pos, total) (it can be used as update_progressbar or
+# progress_callback directly) and abort once that returns True (e.g. a cancel was requested)
+# tasks must never touch any ui objects, partial results can be handed over to the ui thread using worker.partialResult.emit()
+class Worker(QtCore.QThread):
+    progress = QtCore.pyqtSignal(int)               # percentage
+    partialResult = QtCore.pyqtSignal(object)
+    result = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(object)
+
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.token = CancelToken()
+        # we need to do this because we can't write primitive datatypes from within our closures
+        self.percentage = {"value": 0}
+
+    def cancel(self):
+        self.token.cancel()
+
+    def isCancelled(self):
+        return self.token.isCancelled()
+
+    def updateProgress(self, pos, total):
+        percentage = int(pos/total*100) if total != 0 else 100
+        if percentage != self.percentage["value"]:
+            self.percentage["value"] = percentage
+            self.progress.emit(percentage)
+        return self.token.isCancelled()
+
+    def run(self):
+        try:
+            retval = self.task(self)
+        except Exception as e:
+            logger.exception("Catched exception in background task!")
+            self.error.emit(e)
+            return
+        self.result.emit(retval)
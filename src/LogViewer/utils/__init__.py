@@ -1,2 +1,5 @@
-from .search import Search, AbortSearch
-from .queryhelpers import QueryStatus, matchQuery 
+from .search import Search, AbortSearch, SearchCache
+from .queryhelpers import QueryStatus, matchQuery, matchQueryAll, compileQuery, uiEntry, plainEntry
+from .textindex import TrigramIndex
+from .formatter import LogFormatter, LazyFormatter, benchmarkFormatter
+from .formatter_cache import FormatterCache
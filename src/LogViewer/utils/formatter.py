@@ -0,0 +1,135 @@
+import time
+import inspect
+import threading
+import functools
+import hashlib
+
+from .queryhelpers import uiEntry
+
+import logging
+logger = logging.getLogger(__name__)
+
+# compiled log formatter code defining formatter(e) to format a single entry and/or formatter_batch(entries)
+# formatting a list of entries at once (returning a list of formatted lines), at least one of them has to be defined
+# the code is executed like a module: its functions can use everything imported or defined at module level directly,
+# an optional setup() function is called once after compiling to initialize (constant) state used by these functions
+# formatters written for older versions, e.g. formatter(e, **g), get all module level names bound as keyword arguments
+# calling an instance formats a single entry, batch() formats a list of entries using whatever the code provides
+class LogFormatter:
+    def __init__(self, code):
+        # compile our code by executing it
+        namespace = {}
+        exec(code, namespace)
+        if not callable(namespace.get("formatter")) and not callable(namespace.get("formatter_batch")):
+            logger.error("Formatter code did not evaluate to formatter() or formatter_batch() function!")
+            raise RuntimeError("Log formatter MUST define a function following one of these signatures: formatter(e) or formatter_batch(entries)")
+        if callable(namespace.get("setup")):
+            namespace["setup"]()
+        # identifies the formatted lines produced by this code (e.g. in our FormatterCache)
+        self.codeHash = hashlib.sha256(bytes(code, "UTF-8")).hexdigest()
+        self.single = self._bind(namespace, "formatter")
+        self.multiple = self._bind(namespace, "formatter_batch")
+
+    @staticmethod
+    def _bind(namespace, name):
+        func = namespace.get(name)
+        if not callable(func):
+            return None
+        try:
+            parameters = inspect.signature(func).parameters.values()
+        except (TypeError, ValueError):
+            return func
+        if any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters):
+            return functools.partial(func, **{key: value for key, value in namespace.items() if key != "__builtins__"})
+        return func
+
+    def __call__(self, entry):
+        if self.single != None:
+            return self.single(entry)
+        return self.batch([entry])[0]
+
+    def batch(self, entries):
+        if self.multiple == None:
+            return [self.single(entry) for entry in entries]
+        lines = list(self.multiple(entries))
+        if len(lines) != len(entries):
+            raise RuntimeError("formatter_batch() returned %d lines for %d entries" % (len(lines), len(entries)))
+        return lines
+
+# formats the entries of a LogViewer rawlog on first access only, memoizing the result in the entry itself (as __formattedMessage)
+# instances can be used as entry accessor (getEntry) for matchQueryAll(), Search or TrigramIndex, returning formatted entries
+# (formatters can not filter out entries this way, None is shown as empty line and failing entries as "E R R O R")
+# if a (lazy) FormatterCache is given, all lines formatted are remembered by __logline_index: lines cached by an earlier
+# session can be added using addCachedLines() and storeCache() persists all lines known so far (e.g. when closing the file)
+class LazyFormatter:
+    def __init__(self, formatter, cache=None):
+        self.formatter = formatter
+        self.cache = cache
+        self.lines = []             # formatted line of every __logline_index or None if not formatted (yet)
+        self.changed = False        # True if we formatted lines not stored in our cache yet
+
+    def formattedMessage(self, entry):
+        if "__formattedMessage" not in entry:
+            index = entry.get("__logline_index")
+            if self.cache != None and index != None and index < len(self.lines) and self.lines[index] != None:
+                entry["__formattedMessage"] = self.lines[index]
+                return entry["__formattedMessage"]
+            try:
+                formattedEntry = self.formatter(entry)
+            except Exception:
+                logger.exception("Exception while calling log formatter for: %s" % entry)
+                formattedEntry = "E R R O R"
+            entry["__formattedMessage"] = formattedEntry if formattedEntry != None else ""
+            if self.cache != None and index != None:
+                self._remember(index, entry["__formattedMessage"])
+        return entry["__formattedMessage"]
+
+    # add the lines loaded from our cache (lines formatted meanwhile are kept)
+    def addCachedLines(self, lines):
+        if self.cache == None or lines == None:
+            return
+        lines = list(lines)
+        for index, line in enumerate(self.lines):
+            if line != None:
+                if index >= len(lines):
+                    lines.extend([None] * (index + 1 - len(lines)))
+                lines[index] = line
+        self.lines = lines
+
+    # persist all lines formatted so far in a background thread (storing is best effort, see FormatterCache.store())
+    def storeCache(self):
+        if self.cache == None or not self.changed:
+            return
+        self.changed = False
+        threading.Thread(target=self.cache.store, args=(list(self.lines), ), name="FormatterCache").start()
+
+    # our list of lines can be shared by multiple threads (e.g. our ui and a TrigramIndex), a lost line only won't be cached
+    def _remember(self, index, line):
+        if index >= len(self.lines):
+            self.lines.extend([None] * (index + 1 - len(self.lines)))
+        self.lines[index] = line
+        self.changed = True
+
+    def __call__(self, rawlog, index):
+        entry = uiEntry(rawlog, index)
+        self.formattedMessage(entry)
+        return entry
+
+    # returns the entry accessor to use for a query: only non-python queries and python queries using the
+    # formatted message need formatted entries (formatting all entries for other python queries would be a waste)
+    def queryAccessor(self, query, usePython):
+        if usePython and "__formattedMessage" not in query:
+            return uiEntry
+        return self
+
+# returns the number of lines per second formatter formats, using the given sample of entries
+# (the sample gets formatted repeatedly until at least minDuration seconds passed)
+def benchmarkFormatter(formatter, entries, minDuration=0.5):
+    count = 0
+    start = time.perf_counter()
+    while True:
+        formatter.batch(entries)
+        count += len(entries)
+        duration = time.perf_counter() - start
+        if duration >= minDuration:
+            return count / duration
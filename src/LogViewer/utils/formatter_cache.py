@@ -0,0 +1,71 @@
+import os
+import gzip
+import json
+import hashlib
+
+from shared.utils import Paths
+
+import logging
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "formatted"         # subdirectory of our user cache dir
+CACHE_SIZE = 512 * 1024 * 1024          # bytes all cached files may use, the least recently used ones get removed
+MAX_FILE_SIZE = 64 * 1024 * 1024        # cached files bigger than this are not kept (formatting these again is cheaper than evicting others)
+
+# persistent cache of the formatted lines of a rawlog file, keyed by the file (path, size and mtime) and the formatter code hash
+# lines contains one formatted line (or None if the formatter filtered out the entry) per entry handed to our load callback
+# lazy caches (used by a LazyFormatter) are kept apart: their lines are indexed by __logline_index (no entry is filtered out
+# when formatting lazily) and None marks lines not formatted yet
+class FormatterCache:
+    def __init__(self, filename, codeHash, lazy=False):
+        stat = os.stat(filename)
+        key = "%s\n%d\n%d\n%s" % (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, codeHash)
+        if lazy:
+            key += "\nlazy"
+        self.path = Paths.get_cache_filepath(os.path.join(CACHE_DIR, hashlib.sha256(bytes(key, "UTF-8")).hexdigest() + ".json.gz"))
+
+    # returns the cached list of lines or None if nothing (usable) is cached
+    def load(self):
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            with gzip.open(self.path, "rt", encoding="UTF-8") as fp:
+                lines = json.load(fp)
+            os.utime(self.path)     # mark as recently used
+        except (OSError, EOFError, ValueError):
+            logger.warning("Ignoring unreadable formatter cache: '%s'" % self.path, exc_info=True)
+            return None
+        if not isinstance(lines, list):
+            logger.warning("Ignoring formatter cache having unknown format: '%s'" % self.path)
+            return None
+        logger.debug("Loaded %d formatted lines from cache: '%s'" % (len(lines), self.path))
+        return lines
+
+    # storing is best effort: if it fails, we'll just have to format again next time
+    def store(self, lines):
+        logger.debug("Storing %d formatted lines to cache: '%s'" % (len(lines), self.path))
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with gzip.open(self.path + ".tmp", "wt", encoding="UTF-8", compresslevel=1) as fp:
+                json.dump(lines, fp)
+            size = os.path.getsize(self.path + ".tmp")
+            if size > MAX_FILE_SIZE:
+                logger.info("Not caching %d formatted lines, they would use %d bytes..." % (len(lines), size))
+                os.remove(self.path + ".tmp")
+                return
+            os.replace(self.path + ".tmp", self.path)
+            self._prune()
+        except OSError:
+            logger.warning("Could not store formatter cache to '%s', continuing without..." % self.path, exc_info=True)
+
+    # remove the least recently used files until all of them fit into CACHE_SIZE
+    def _prune(self):
+        directory = os.path.dirname(self.path)
+        files = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json.gz")]
+        files = sorted(((os.stat(file), file) for file in files), key=lambda item: item[0].st_mtime, reverse=True)
+        size = 0
+        for stat, file in files:
+            size += stat.st_size
+            if size > CACHE_SIZE:
+                logger.debug("Removing least recently used formatter cache: '%s'" % file)
+                os.remove(file)
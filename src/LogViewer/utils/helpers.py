@@ -6,13 +6,16 @@ def pythonize(value):
         return str(value)
     return "'%s'" % str(value)
 
-def wordWrapLogline(formattedMessage):
-    uiItem = "\n".join([textwrap.fill(line, SettingsSingleton()["staticLineWrap"],
+# width defaults to our staticLineWrap setting, callers wrapping many lines should pass it in directly
+def wordWrapLogline(formattedMessage, width=None):
+    if width == None:
+        width = SettingsSingleton()["staticLineWrap"]
+    uiItem = "\n".join([textwrap.fill(line, width,
         expand_tabs=False,
         replace_whitespace=False,
         drop_whitespace=False,
         break_long_words=True,
         break_on_hyphens=True,
         max_lines=None
-    ) if len(line) > SettingsSingleton()["staticLineWrap"]  else line for line in formattedMessage.strip().splitlines(keepends=False)])
+    ) if len(line) > width else line for line in formattedMessage.strip().splitlines(keepends=False)])
     return uiItem
\ No newline at end of file
@@ -1,16 +1,38 @@
 import logging
+import functools
 from enum import Enum
 
 from shared.utils.constants import LOGLEVELS
+from .queryplanner import matchQueryVectorized
 
 logger = logging.getLogger(__name__)
 
+# globals available to every python query (these are shared by all queries, eval() only adds __builtins__ to it)
+QUERY_GLOBALS = {
+    **LOGLEVELS,
+    "true" : True,
+    "false": False,
+}
+
 class QueryStatus(Enum):
     EOF_REACHED = 1
     QUERY_ERROR = 2
     QUERY_OK = 3
     QUERY_EMPTY = 4
 
+# the text non-python queries are matched against
+# (__formattedMessage is unset if not loaded into ui, fall back to raw message in non-ui cases)
+def entryText(entry):
+    return entry["__formattedMessage"] if "__formattedMessage" in entry else entry["message"]
+
+# compile our query only once (raises SyntaxError for malformed python queries)
+@functools.lru_cache(maxsize=32)
+def compileQuery(query, usePython=True):
+    if usePython:
+        code = compile(query, "<query>", "eval")
+        return lambda entry: eval(code, QUERY_GLOBALS, entry)
+    return lambda entry: query in entryText(entry)
+
 def matchQuery(query, rawlog, index, entry=None, preSearchFilter=None, usePython=True):
     matching = False
     error = None
@@ -20,23 +42,58 @@ def matchQuery(query, rawlog, index, entry=None, preSearchFilter=None, usePython
         if entry == None:
             entry = rawlog[index]['data']
         if preSearchFilter == None or preSearchFilter(index, rawlog):
-            if usePython:
-                if eval(query, {
-                    **LOGLEVELS,
-                    "true" : True,
-                    "false": False,
-                }, entry):
-                    matching = True
-            else:
-                # this is unset if not loaded into ui, fall back to raw message in non-ui cases
-                if "__formattedMessage" in entry:
-                    if query in entry["__formattedMessage"]:
-                        matching = True
-                else:
-                    if query in entry["message"]:
-                        matching = True
+            if compileQuery(query, usePython)(entry):
+                matching = True
     except (SyntaxError, NameError) as e:
         error = e
         status = QueryStatus.QUERY_ERROR
     
     return {"status": status, "error": error, "matching": matching}
+
+# entry accessors for matchQueryAll(): entries wrapped by the LogViewer ui and plain rawlog entries
+def uiEntry(rawlog, index):
+    return rawlog[index]["data"]
+
+def plainEntry(rawlog, index):
+    return rawlog[index]
+
+# match our query against all entries of the rawlog at once, returning the list of matching rawlog indexes
+# (returns None if update_progressbar() signaled an abort)
+# common python query shapes are evaluated vectorized over whole columns if numpy is available,
+# non-python queries only check the candidates returned by textIndex (a TrigramIndex), if given
+# if indexes is given, only these (sorted) rawlog indexes are checked
+def matchQueryAll(query, rawlog, preSearchFilter=None, usePython=True, update_progressbar=None, getEntry=uiEntry, textIndex=None, indexes=None):
+    matching = []
+    error = None
+    status = QueryStatus.QUERY_OK
+
+    try:
+        predicate = compileQuery(query, usePython)
+    except SyntaxError as e:
+        return {"status": QueryStatus.QUERY_ERROR, "error": e, "matching": matching}
+
+    if usePython and indexes == None:
+        result = matchQueryVectorized(query, rawlog, QUERY_GLOBALS, predicate, preSearchFilter, getEntry, plainEntries=getEntry == plainEntry)
+        if result != None:
+            if update_progressbar != None:
+                if update_progressbar(len(rawlog), len(rawlog)) == True:
+                    return None
+            return {"status": QueryStatus.QUERY_OK if result["error"] == None else QueryStatus.QUERY_ERROR, **result}
+
+    if indexes == None and not usePython and textIndex != None:
+        indexes = textIndex.candidates(query)
+    if indexes == None:
+        indexes = range(len(rawlog))
+    
+    for pos, index in enumerate(indexes):
+        try:
+            if (preSearchFilter == None or preSearchFilter(index, rawlog)) and predicate(getEntry(rawlog, index)):
+                matching.append(index)
+        except (SyntaxError, NameError) as e:
+            error = e
+            status = QueryStatus.QUERY_ERROR
+        if update_progressbar != None:
+            if update_progressbar(pos, len(indexes)) == True:
+                return None
+    
+    return {"status": status, "error": error, "matching": matching}
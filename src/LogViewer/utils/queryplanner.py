@@ -0,0 +1,279 @@
+import ast
+import operator
+import weakref
+import logging
+
+from shared.storage.columnar import ColumnarEntries, INT, BOOL, INTERNED, REST
+try:
+    import numpy
+    hasNumpy = True
+except ImportError:
+    hasNumpy = False
+
+logger = logging.getLogger(__name__)
+COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+# operators to use if field and constant of a comparison get swapped (e.g. "8 > flag" --> "flag < 8")
+SWAPPED_OPERATORS = {
+    operator.eq: operator.eq,
+    operator.ne: operator.ne,
+    operator.lt: operator.gt,
+    operator.le: operator.ge,
+    operator.gt: operator.lt,
+    operator.ge: operator.le,
+}
+# fields that get modified by the LogViewer and thus can not be cached
+UNCACHED_FIELDS = ("__formattedMessage", )
+MISSING = object()
+
+# columns extracted from a rawlog, cached until the length or generation (see Rawlog.mark_changed()) of the rawlog changes
+columnCache = weakref.WeakKeyDictionary()
+
+# own exception to signal that a query (or a part of it) can not be evaluated vectorized
+class UnsupportedQuery(RuntimeError):
+    pass
+
+# translate a python query into a plan consisting of nested tuples:
+# ("and", [plans]), ("or", [plans]), ("not", plan), ("compare", field, operator, constant), ("contains", field, needle)
+# returns None if the query has a shape we can not evaluate vectorized
+def planQuery(query, constants):
+    try:
+        return _translate(ast.parse(query, mode="eval").body, constants)
+    except (SyntaxError, UnsupportedQuery):
+        return None
+
+def _translate(node, constants):
+    if isinstance(node, ast.BoolOp):
+        return ("and" if isinstance(node.op, ast.And) else "or", [_translate(value, constants) for value in node.values])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ("not", _translate(node.operand, constants))
+    if isinstance(node, ast.Compare):
+        # python evaluates chained comparisons like "a < b < c" as "a < b and b < c"
+        plans = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            plans.append(_translateComparison(left, op, right, constants))
+            left = right
+        return plans[0] if len(plans) == 1 else ("and", plans)
+    raise UnsupportedQuery("Unsupported node: %s" % ast.dump(node))
+
+def _translateComparison(left, op, right, constants):
+    if isinstance(op, (ast.In, ast.NotIn)):
+        needle = _constant(left, constants)
+        if not isinstance(needle, str):
+            raise UnsupportedQuery("Only substring tests are supported")
+        plan = ("contains", _field(right, constants), needle)
+        return ("not", plan) if isinstance(op, ast.NotIn) else plan
+    if type(op) not in COMPARE_OPERATORS:
+        raise UnsupportedQuery("Unsupported comparison: %s" % ast.dump(op))
+    try:
+        return ("compare", _field(left, constants), COMPARE_OPERATORS[type(op)], _constant(right, constants))
+    except UnsupportedQuery:
+        return ("compare", _field(right, constants), SWAPPED_OPERATORS[COMPARE_OPERATORS[type(op)]], _constant(left, constants))
+
+def _field(node, constants):
+    if isinstance(node, ast.Name) and node.id not in constants:
+        return node.id
+    raise UnsupportedQuery("Not a top level entry field: %s" % ast.dump(node))
+
+def _constant(node, constants):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in constants:
+        return constants[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant) and type(node.operand.value) in (int, float):
+        return -node.operand.value
+    raise UnsupportedQuery("Not a constant: %s" % ast.dump(node))
+
+# column of arbitrary values stored as ids into a table of unique values, predicates are evaluated once per unique value
+class ValueColumn:
+    def __init__(self, ids, values):
+        self.ids = ids
+        self.values = values
+
+    def apply(self, predicate):
+        try:
+            lookup = numpy.fromiter((bool(predicate(value)) for value in self.values), dtype=bool, count=len(self.values))
+        except TypeError as e:
+            raise UnsupportedQuery(str(e))     # let the python path raise this exception
+        return lookup[self.ids]
+
+    def compare(self, op, constant):
+        return self.apply(lambda value: op(value, constant))
+
+    def contains(self, needle):
+        return self.apply(lambda value: needle in value)
+
+class NumericColumn:
+    def __init__(self, values):
+        self.values = values
+
+    def compare(self, op, constant):
+        if type(constant) in (int, float, bool):
+            return op(self.values, constant)
+        if op in (operator.eq, operator.ne):
+            return numpy.full(len(self.values), op == operator.ne)
+        raise UnsupportedQuery("Can not compare numbers to %s" % str(type(constant)))
+
+    def contains(self, needle):
+        raise UnsupportedQuery("Numbers are not iterable")
+
+# utf-8 string pool of a ColumnarEntries store: substrings can be searched in the whole pool at once
+class PoolColumn:
+    def __init__(self, pool, offsets, lengths):
+        self.pool = pool
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def compare(self, op, constant):
+        values = [str(self.pool[offset:offset + length], "UTF-8", "surrogatepass") for offset, length in zip(self.offsets.tolist(), self.lengths.tolist())]
+        return ValueColumn(numpy.arange(len(values)), values).compare(op, constant)
+
+    def contains(self, needle):
+        mask = numpy.zeros(len(self.offsets), dtype=bool)
+        data = needle.encode("UTF-8", "surrogatepass")
+        if len(data) == 0:
+            mask[:] = True
+            return mask
+        # entries modified after loading get appended to the end of the pool, so our offsets are not necessarily sorted
+        order = numpy.argsort(self.offsets, kind="stable")
+        offsets = self.offsets[order]
+        ends = offsets + self.lengths[order]
+        pos = self.pool.find(data)
+        while pos != -1:
+            index = int(numpy.searchsorted(offsets, pos, side="right")) - 1
+            if index >= 0 and pos + len(data) <= ends[index]:
+                mask[order[index]] = True
+                pos = self.pool.find(data, int(ends[index]))
+            else:
+                pos = self.pool.find(data, pos + 1)
+        return mask
+
+# provides the columns and presence masks of all fields of a rawlog
+class ColumnSource:
+    def __init__(self, rawlog, getEntry, columnar):
+        self.rawlog = rawlog
+        self.getEntry = getEntry
+        self.entries = rawlog.data if columnar else None
+        try:
+            # entries replaced or changed in place (e.g. reformatted) bump the generation of our rawlog
+            key = {"length": len(rawlog), "generation": getattr(rawlog, "generation", None), "getEntry": getEntry}
+            if rawlog not in columnCache or columnCache[rawlog]["key"] != key:
+                columnCache[rawlog] = {"key": key, "columns": {}}
+            self.cache = columnCache[rawlog]["columns"]
+        except TypeError:
+            self.cache = {}     # plain lists can not be weakly referenced and thus not be cached
+
+    # returns (column, presence mask)
+    def column(self, field):
+        if field in self.cache:
+            return self.cache[field]
+        column = None
+        if self.entries != None:
+            column = self._columnarColumn(field)
+        if column == None:
+            column = self._extractColumn(field)
+        if field not in UNCACHED_FIELDS:
+            self.cache[field] = column
+        return column
+
+    def _columnarColumn(self, field):
+        kinds = self.entries.layout_kinds(field)
+        storedKinds = set(kind for kind in kinds if kind != None)
+        if len(storedKinds) == 0:
+            return (NumericColumn(numpy.zeros(len(self.rawlog), dtype=bool)), numpy.zeros(len(self.rawlog), dtype=bool))
+        if REST in storedKinds:
+            return None     # some values are not stored in a column, extract them from materialized entries instead
+        present = numpy.array([kind != None for kind in kinds], dtype=bool)[numpy.array(self.entries.layout_ids, dtype=numpy.int64)]
+        kind = storedKinds.pop()
+        if kind in (INT, BOOL):
+            column = NumericColumn(numpy.array(self.entries.columns[field], dtype=bool if kind == BOOL else numpy.int64))
+        elif kind == INTERNED:
+            column = ValueColumn(numpy.array(self.entries.columns[field], dtype=numpy.int64), [value for valueType, value in self.entries.values])
+        else:
+            column = PoolColumn(bytes(self.entries.pools[field]), numpy.array(self.entries.pool_offsets[field], dtype=numpy.int64), numpy.array(self.entries.pool_lengths[field], dtype=numpy.int64))
+        return (column, present)
+
+    def _extractColumn(self, field):
+        ids = numpy.zeros(len(self.rawlog), dtype=numpy.int64)
+        present = numpy.zeros(len(self.rawlog), dtype=bool)
+        values = []
+        valueIds = {}
+        for index in range(len(self.rawlog)):
+            value = self.getEntry(self.rawlog, index).get(field, MISSING)
+            if value is MISSING:
+                continue
+            present[index] = True
+            try:
+                # use the type as part of our interning key, because 1 == 1.0 == True
+                key = (type(value), value)
+                if key not in valueIds:
+                    valueIds[key] = len(values)
+                    values.append(value)
+                ids[index] = valueIds[key]
+            except TypeError:
+                raise UnsupportedQuery("Field %s contains unhashable values" % field)
+        if len(values) == 0:
+            values.append(None)     # missing values reference this one, too (but they are masked out by our presence mask)
+        return (ValueColumn(ids, values), present)
+
+# evaluate a plan returning a mask of matching entries and a mask of entries that would have raised a NameError
+# (the boolean operators short circuit like python does: a field is not evaluated if it does not influence the result)
+def evaluatePlan(plan, source):
+    if plan[0] in ("compare", "contains"):
+        column, present = source.column(plan[1])
+        if plan[0] == "compare":
+            mask = column.compare(plan[2], plan[3])
+        else:
+            mask = column.contains(plan[2])
+        return (numpy.asarray(mask, dtype=bool) & present, ~present)
+    if plan[0] == "not":
+        mask, raises = evaluatePlan(plan[1], source)
+        return (~mask & ~raises, raises)
+    mask, raises = evaluatePlan(plan[1][0], source)
+    for subplan in plan[1][1:]:
+        submask, subraises = evaluatePlan(subplan, source)
+        if plan[0] == "and":
+            raises = raises | (mask & subraises)
+            mask = mask & submask
+        else:
+            raises = raises | (~mask & ~raises & subraises)
+            mask = mask | submask
+    return (mask & ~raises, raises)
+
+# try to evaluate a python query vectorized over the columns of a rawlog, returns None if that's not possible
+# (the caller should use the python path then)
+# the columns of a ColumnarEntries store are used directly, if the entries are not wrapped (plainEntries=True)
+def matchQueryVectorized(query, rawlog, constants, predicate, preSearchFilter=None, getEntry=None, plainEntries=False):
+    if not hasNumpy or len(rawlog) == 0:
+        return None
+    plan = planQuery(query, constants)
+    if plan == None:
+        return None
+    try:
+        columnar = plainEntries and isinstance(getattr(rawlog, "data", None), ColumnarEntries)
+        mask, raises = evaluatePlan(plan, ColumnSource(rawlog, getEntry, columnar))
+    except UnsupportedQuery as e:
+        logger.debug("Falling back to python query evaluation: %s" % str(e))
+        return None
+
+    matching = numpy.flatnonzero(mask).tolist()
+    raising = numpy.flatnonzero(raises).tolist()
+    if preSearchFilter != None:
+        matching = [index for index in matching if preSearchFilter(index, rawlog)]
+        raising = [index for index in raising if preSearchFilter(index, rawlog)]
+
+    error = None
+    if len(raising) != 0:
+        # let python produce the exact same error the python path would report
+        try:
+            predicate(getEntry(rawlog, raising[-1]))
+        except NameError as e:
+            error = e
+    return {"matching": matching, "error": error}
@@ -1,9 +1,44 @@
+import bisect
+import collections
+
 from LogViewer.storage import SettingsSingleton
-from LogViewer.utils.queryhelpers import QueryStatus, matchQuery
+from LogViewer.utils.queryhelpers import QueryStatus, matchQueryAll, compileQuery, uiEntry
 
 import logging
 logger = logging.getLogger(__name__)
 
+SEARCH_CACHE_SIZE = 16
+FILL_CHUNK_SIZE = 2000      # number of entries to check per fill() call of lazy searches
+
+# LRU of recent (non-python) search queries and their result lists
+# a substring query containing a cached query can only match a subset of the cached result list,
+# so only these entries have to be checked (this cache has to be cleared if the rawlog or its visibility changed)
+class SearchCache:
+    def __init__(self, size=SEARCH_CACHE_SIZE):
+        self.size = size
+        self.results = collections.OrderedDict()
+
+    def clear(self):
+        self.results.clear()
+
+    def store(self, query, resultList):
+        self.results[query] = resultList
+        self.results.move_to_end(query)
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+    # returns the result list of the longest cached query contained in query or None if there is none
+    def narrowest(self, query):
+        best = None
+        for cachedQuery in self.results:
+            if cachedQuery in query and (best == None or len(cachedQuery) > len(best)):
+                best = cachedQuery
+        if best == None:
+            return None
+        logger.debug("Narrowing search for '%s' from %d results of '%s'..." % (query, len(self.results[best]), best))
+        self.results.move_to_end(best)
+        return self.results[best]
+
 # own exception to allow our __init__ to communicate an abort condition
 class AbortSearch(RuntimeError):
     pass
@@ -12,7 +47,13 @@ class Search:
     PREVIOUS = -1
     NEXT = 1
 
-    def __init__(self, rawlog, query, startIndex, update_progressbar=None):
+    # lazy searches don't check any entry on creation: next() and previous() scan for the next hit directly,
+    # while the caller has to fill our resultList by calling fill() until it returns True (e.g. using a timer)
+    # until the resultList is complete, resultIndex and eofIndex are rawlog indexes rather than result indexes
+    # isVisible(index) determines which entries are visible (e.g. not hidden by a filter), all entries are visible if it is None
+    # getEntry(rawlog, index) is the entry accessor used to match our query (see matchQueryAll())
+    # only the first count entries of our rawlog are searched (None searches all), the rest can be added by extend() later on
+    def __init__(self, rawlog, query, startIndex, update_progressbar=None, textIndex=None, searchCache=None, lazy=False, isVisible=None, getEntry=uiEntry, count=None):
         super().__init__()
         self.query = query
         self.resultList = []
@@ -21,18 +62,48 @@ class Search:
         self.startIndex = startIndex                    # begin our search at this rawlog index
         self.status = QueryStatus.QUERY_OK
         self.error = None
+        self.complete = True
+        self.isVisible = isVisible
+        self.getEntry = getEntry
+        self.rawlog = rawlog
+        self.searchedCount = len(rawlog) if count == None else count        # entries appended later on are checked by extend()
+
+        # only plain substring searches can be narrowed using previous results
+        self.usePython = SettingsSingleton()["usePythonSearch"]
+        if self.usePython:
+            searchCache = None
+        self.searchCache = searchCache
+        indexes = None
+        if searchCache != None:
+            indexes = searchCache.narrowest(query)
 
-        for index in range(len(rawlog)):
-            # Presearch filter is expecting a finished rawlog loading
-            result = matchQuery(query, rawlog, index, preSearchFilter=self._preSearchFilter, usePython=SettingsSingleton()["usePythonSearch"])
-            if result["matching"]:
-                self.resultList.append(index)
-            if result["status"] == QueryStatus.QUERY_ERROR:
-                self.status = result["status"]
-                self.error = result["error"]
-            if update_progressbar != None:
-                if update_progressbar(index, len(rawlog)) == True:
-                    raise AbortSearch()
+        if lazy:
+            try:
+                self.predicate = compileQuery(query, self.usePython)
+            except SyntaxError as e:
+                self.status = QueryStatus.QUERY_ERROR
+                self.error = e
+            else:
+                if indexes == None and not self.usePython and textIndex != None:
+                    indexes = textIndex.candidates(query)
+                # sorted rawlog indexes possibly matching
+                self.candidates = indexes[:bisect.bisect_left(indexes, self.searchedCount)] if indexes != None else range(self.searchedCount)
+                self.scanned = 0                                                        # number of candidates checked by fill()
+                self.complete = False
+            self.resultIndex = -1
+            self.eofIndex = None
+            return
+
+        result = matchQueryAll(query, rawlog, preSearchFilter=self._preSearchFilter, usePython=self.usePython, update_progressbar=update_progressbar, getEntry=getEntry, textIndex=textIndex, indexes=indexes)
+        if result == None:
+            raise AbortSearch()
+        # entries appended to our rawlog while searching (e.g. while loading or streaming) are checked by extend() instead
+        self.resultList = [index for index in result["matching"] if index < self.searchedCount]
+        if searchCache != None:
+            searchCache.store(query, self.resultList)
+        if result["status"] == QueryStatus.QUERY_ERROR:
+            self.status = result["status"]
+            self.error = result["error"]
         if len(self.resultList) == 0 and self.status != QueryStatus.QUERY_ERROR:
             self.status = QueryStatus.QUERY_EMPTY
 
@@ -40,9 +111,124 @@ class Search:
         self.eofIndex = 0               # the initial EOF point is the first result (e.g. result index 0)
 
     def _preSearchFilter(self, resultIndex, rawlog):
-        if rawlog[resultIndex]["uiItem"].isHidden() == False:
+        if self.isVisible != None:
+            return self.isVisible(resultIndex)
+        return True
+
+    def isComplete(self):
+        return self.complete
+
+    # check the next chunk of entries of a lazy search, returns True once our resultList is complete
+    def fill(self, count=FILL_CHUNK_SIZE):
+        if self.complete:
             return True
-        return False
+        result = matchQueryAll(self.query, self.rawlog, preSearchFilter=self._preSearchFilter, usePython=self.usePython, getEntry=self.getEntry, indexes=self.candidates[self.scanned:self.scanned + count])
+        self.resultList.extend(result["matching"])
+        if result["error"] != None:
+            self.error = result["error"]
+        self.scanned = min(self.scanned + count, len(self.candidates))
+        if self.scanned < len(self.candidates):
+            return False
+
+        # convert rawlog indexes back to result indexes (all of our hits are part of the complete resultList)
+        logger.debug("Lazy search for '%s' complete: %d results" % (self.query, len(self.resultList)))
+        self.complete = True
+        if self.resultIndex != -1:
+            self.resultIndex = bisect.bisect_left(self.resultList, self.resultIndex)
+        self.eofIndex = bisect.bisect_left(self.resultList, self.eofIndex) if self.eofIndex != None else 0
+        if self.searchCache != None:
+            self.searchCache.store(self.query, self.resultList)
+        if self.error != None:
+            self.status = QueryStatus.QUERY_ERROR
+        elif len(self.resultList) == 0:
+            self.status = QueryStatus.QUERY_EMPTY
+        return True
+
+    # check the entries appended to our rawlog since we were created (or extended the last time) up to count, too
+    # new results are appended to our resultList, so the positions of all existing results stay the same
+    def extend(self, count):
+        if count <= self.searchedCount:
+            return
+        first = self.searchedCount
+        self.searchedCount = count
+        if not self.complete:
+            # sorted candidates are checked by fill(), next() and previous() as usual
+            if isinstance(self.candidates, range) and self.candidates.step == 1 and self.candidates.stop == first:
+                self.candidates = range(self.candidates.start, count)
+            else:
+                self.candidates = list(self.candidates) + list(range(first, count))
+            return
+        result = matchQueryAll(self.query, self.rawlog, preSearchFilter=self._preSearchFilter, usePython=self.usePython, getEntry=self.getEntry, indexes=range(first, count))
+        self.resultList.extend(result["matching"])
+        if result["error"] != None:
+            self.error = result["error"]
+            self.status = QueryStatus.QUERY_ERROR
+        elif self.status == QueryStatus.QUERY_EMPTY and len(self.resultList) != 0:
+            self.status = QueryStatus.QUERY_OK
+
+    def _matches(self, index):
+        try:
+            return self._preSearchFilter(index, self.rawlog) and self.predicate(self.getEntry(self.rawlog, index))
+        except (SyntaxError, NameError) as e:
+            self.error = e
+            return False
+
+    # rawlog index of the first candidate not yet checked by fill()
+    def _scanBoundary(self):
+        return self.candidates[self.scanned] if self.scanned < len(self.candidates) else len(self.rawlog)
+
+    # returns the first hit in [start, stop) or None (using our resultList for the part already checked by fill())
+    def _scanForward(self, start, stop):
+        boundary = self._scanBoundary()
+        if start < boundary:
+            pos = bisect.bisect_left(self.resultList, start)
+            if pos < len(self.resultList) and self.resultList[pos] < stop:
+                return self.resultList[pos]
+            start = boundary
+        for pos in range(bisect.bisect_left(self.candidates, start), len(self.candidates)):
+            index = self.candidates[pos]
+            if index >= stop:
+                break
+            if self._matches(index):
+                return index
+        return None
+
+    # returns the last hit in [stop, start) or None (using our resultList for the part already checked by fill())
+    def _scanBackward(self, start, stop):
+        boundary = self._scanBoundary()
+        for pos in range(bisect.bisect_left(self.candidates, start) - 1, -1, -1):
+            index = self.candidates[pos]
+            if index < stop or index < boundary:
+                break
+            if self._matches(index):
+                return index
+        pos = bisect.bisect_left(self.resultList, min(start, boundary)) - 1
+        if pos >= 0 and self.resultList[pos] >= stop:
+            return self.resultList[pos]
+        return None
+
+    # lazy counterpart of next() and previous() having the same round wrap semantics as calculateStartIndex()
+    def _lazyStep(self, direction):
+        fromIndex = self.startIndex if self.startIndex != None else self.resultIndex
+        self.startIndex = None
+        if direction == Search.NEXT:
+            hit = self._scanForward(fromIndex + 1, len(self.rawlog))
+            if hit == None:
+                hit = self._scanForward(0, fromIndex + 1)
+        else:
+            hit = self._scanBackward(fromIndex, 0)
+            if hit == None:
+                hit = self._scanBackward(len(self.rawlog), fromIndex)
+        if hit == None:
+            self.startIndex = fromIndex
+            self.status = QueryStatus.QUERY_EMPTY if self.error == None else QueryStatus.QUERY_ERROR
+            return None
+
+        self.resultIndex = hit
+        self._handleEof()
+        if self.error != None:
+            self.status = QueryStatus.QUERY_ERROR
+        return hit
 
     def calculateStartIndex(self, startIndex, direction):
         if direction == Search.NEXT:
@@ -93,6 +279,8 @@ class Search:
         self.startIndex = startIndex
     
     def next(self):
+        if not self.complete:
+            return self._lazyStep(Search.NEXT)
         if len(self.resultList) == 0:
             return None
         
@@ -111,6 +299,8 @@ class Search:
         return self.getCurrentResult()
     
     def previous(self):
+        if not self.complete:
+            return self._lazyStep(Search.PREVIOUS)
         if len(self.resultList) == 0:
             return None
         
@@ -138,6 +328,8 @@ class Search:
         return self.query
     
     def getCurrentResult(self):
+        if not self.complete:
+            return self.resultIndex if self.resultIndex != -1 else None
         if len(self.resultList) == 0:
             return None
         return self.resultList[self.resultIndex]
@@ -146,5 +338,8 @@ class Search:
         return len(self.resultList)
 
     def getPosition(self):
+        if not self.complete:
+            # position among the results found so far
+            return bisect.bisect_left(self.resultList, self.resultIndex) + 1 if self.resultIndex != -1 else 0
         return self.resultIndex + 1
     
\ No newline at end of file
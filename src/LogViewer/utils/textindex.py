@@ -0,0 +1,118 @@
+import threading
+
+from .queryhelpers import entryText, uiEntry
+
+import logging
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 16         # number of consecutive rawlog entries sharing one posting in our index
+MAX_INTERSECTIONS = 8   # intersecting more posting lists than this does not reduce our candidates noticeably
+MAX_INDEX_SIZE = 256 * 1024 * 1024      # estimated bytes our index may use, bigger rawlogs are searched without index
+TRIGRAM_OVERHEAD = 150  # estimated bytes used by every trigram besides its posting (key, value object and dict slot)
+
+# trigram index over the text of all rawlog entries, used to speed up non-python (substring) searches and filters:
+# every trigram maps to the ascending block numbers containing it (a block consists of BLOCK_SIZE consecutive entries),
+# stored as varint encoded deltas (mostly one byte per block), the blocks containing all trigrams of a query are candidates
+# that have to be verified by the caller
+# the index is built in a background thread and can be used once ready, entries appended after starting the build
+# are always returned as candidates, builds exceeding MAX_INDEX_SIZE are aborted (the index never becomes ready then)
+class TrigramIndex:
+    def __init__(self, rawlog, getEntry=uiEntry):
+        self.rawlog = rawlog
+        self.getEntry = getEntry
+        self.postings = None
+        self.indexedCount = 0
+        self.ready = False
+        self.aborted = False
+        self.thread = None
+
+    def startBuilding(self):
+        self.thread = threading.Thread(target=self._build, name="TrigramIndex", daemon=True)
+        self.thread.start()
+
+    # abort a running build, the index will never become ready afterwards
+    def cancel(self):
+        self.aborted = True
+
+    # returns a sorted list of rawlog indexes possibly matching our query or None if the index can not be used for this query
+    def candidates(self, query):
+        if not self.ready or len(query) < 3:
+            return None
+        postings = []
+        for trigram in set(query[i:i+3] for i in range(len(query) - 2)):
+            if trigram not in self.postings:
+                postings = []
+                break
+            postings.append(self.postings[trigram])
+        else:
+            postings.sort(key=len)
+            blocks = set(_decodePosting(postings[0]))
+            for posting in postings[1:MAX_INTERSECTIONS]:
+                blocks.intersection_update(_decodePosting(posting))
+        candidates = []
+        for block in sorted(blocks) if len(postings) != 0 else []:
+            candidates.extend(range(block * BLOCK_SIZE, min((block + 1) * BLOCK_SIZE, self.indexedCount)))
+        candidates.extend(range(self.indexedCount, len(self.rawlog)))
+        return candidates
+
+    def _build(self):
+        logger.debug("Building trigram index...")
+        postings = {}
+        lastBlocks = {}         # last block appended to the posting of every trigram (our deltas are relative to it)
+        size = 0
+        count = len(self.rawlog)
+        for start in range(0, count, BLOCK_SIZE):
+            if self.aborted:
+                logger.debug("Trigram index build aborted")
+                return
+            # trigrams spanning two entries only add false positive candidates
+            text = "\n".join(entryText(self.getEntry(self.rawlog, index)) for index in range(start, min(start + BLOCK_SIZE, count)))
+            block = start // BLOCK_SIZE
+            for trigram in map("".join, set(zip(text, text[1:], text[2:]))):
+                posting = postings.get(trigram)
+                if posting == None:
+                    posting = postings[trigram] = bytearray()
+                    lastBlocks[trigram] = -1
+                    size += TRIGRAM_OVERHEAD
+                delta = block - lastBlocks[trigram]
+                lastBlocks[trigram] = block
+                if delta < 0x80:
+                    posting.append(delta)       # the common case, inlined for speed
+                    size += 1
+                else:
+                    size += _appendVarint(posting, delta)
+            if size > MAX_INDEX_SIZE:
+                logger.info("Trigram index would exceed %d MiB, searching without index..." % (MAX_INDEX_SIZE // (1024 * 1024)))
+                return
+        del lastBlocks
+        for trigram in postings:
+            postings[trigram] = bytes(postings[trigram])     # drop the overallocation of our bytearrays
+        self.postings = postings
+        self.indexedCount = count
+        self.ready = True
+        logger.debug("Trigram index containing %d trigrams (about %d bytes) built" % (len(postings), size))
+
+# appends value as varint (7 bits per byte, least significant group first) to buffer, returns the number of bytes appended
+def _appendVarint(buffer, value):
+    length = 1
+    while value >= 0x80:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+        length += 1
+    buffer.append(value)
+    return length
+
+# yields the block numbers of a posting
+def _decodePosting(posting):
+    block = -1
+    value = 0
+    shift = 0
+    for byte in posting:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        block += value
+        yield block
+        value = 0
+        shift = 0
@@ -1,2 +1,2 @@
-from .rawlog import Rawlog, AbortRawlogLoading
+from .rawlog import Rawlog, AbortRawlogLoading, serialize_entry
 from .report import CrashReport
\ No newline at end of file
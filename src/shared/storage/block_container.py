@@ -0,0 +1,323 @@
+import io
+import os
+import re
+import json
+import zlib
+import struct
+import bisect
+import datetime
+import collections
+import concurrent.futures
+import logging
+
+from shared.utils import randread
+try:
+    import orjson
+    hasOrjson = True
+except ImportError:
+    hasOrjson = False
+
+logger = logging.getLogger(__name__)
+CONTAINER_SUFFIX = ".blk"               # block container files are named like rawlog files plus this suffix (e.g. foo.rawlog.blk)
+CONTAINER_MAGIC = b"MLVBLK"
+CONTAINER_VERSION = 1
+HEADER_FORMAT = "!6sH"                  # magic, version
+TRAILER_FORMAT = "!QQ6s"                # offset and length of the footer, magic
+RECORDS_PER_BLOCK = 4096                # number of records compressed together into one block
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+# date, hour, minute, second and fraction of an iso timestamp, used to determine the precision of the end of a time range
+PRECISION_PATTERN = re.compile(r"\d{4}-?\d{2}-?\d{2}(?:[T ](\d{2})(?::?(\d{2})(?::?(\d{2})(?:[.,](\d+))?)?)?)?")
+
+# block container file format for rawlogs:
+# header, independently zlib compressed blocks of RECORDS_PER_BLOCK length prefixed records (exactly like in a plain rawlog file),
+# a zlib compressed json footer indexing all blocks and a trailer pointing to this footer
+# every block in the footer is described by [compressed offset, compressed length, uncompressed length, record count,
+# lowest timestamp, highest timestamp] of all its records (timestamps of records logged by multiple threads are not ordered),
+# these bounds are microseconds since the epoch (UTC) and None if any record could not be decoded or does not have a timestamp
+# blocks can thus be decompressed in parallel, accessed randomly and skipped if they are outside of a wanted time range
+
+def is_block_container(fp):
+    with randread(fp, len(CONTAINER_MAGIC), offset=0, whence=io.SEEK_SET) as data:
+        return data == CONTAINER_MAGIC
+
+# returns the timezone aware datetime of an iso formatted timestamp (timestamps without timezone are taken as UTC)
+# or None if timestamp is not a valid iso timestamp
+def parse_timestamp(timestamp):
+    try:
+        moment = datetime.datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    return moment if moment.tzinfo != None else moment.replace(tzinfo=datetime.timezone.utc)
+
+# returns a time_range tuple of iso timestamps (see Rawlog.load_fp()) as (start, end) tuple of timezone aware datetimes,
+# end is exclusive and lies one unit of the precision given after the end timestamp, e.g. an end of "2024-01-01T10:00"
+# covers this whole minute and an end of "2024-01-01T10:00:07" covers "2024-01-01T10:00:07.007", too
+# raises a ValueError if a timestamp is invalid
+def parse_time_range(time_range):
+    start, end = (None if timestamp == None else parse_timestamp(timestamp) for timestamp in time_range)
+    for timestamp, moment in zip(time_range, (start, end)):
+        if timestamp != None and moment == None:
+            raise ValueError("Invalid timestamp: '%s'" % str(timestamp))
+    if end != None:
+        match = PRECISION_PATTERN.match(time_range[1])
+        if match == None:
+            end += MICROSECOND
+        elif match.group(4) != None:
+            end += MICROSECOND * 10 ** max(0, 6 - len(match.group(4)))
+        elif match.group(3) != None:
+            end += datetime.timedelta(seconds=1)
+        elif match.group(2) != None:
+            end += datetime.timedelta(minutes=1)
+        elif match.group(1) != None:
+            end += datetime.timedelta(hours=1)
+        else:
+            end += datetime.timedelta(days=1)
+    return (start, end)
+
+# returns True if [first, last] overlaps the (start, end) time_range tuple returned by parse_time_range()
+# (None bounds are unbounded and None values match everything), first and last have to be comparable to these bounds
+def in_time_range(first, last, time_range):
+    start, end = time_range
+    if start != None and last != None and last < start:
+        return False
+    if end != None and first != None and first >= end:
+        return False
+    return True
+
+# returns a timezone aware datetime as microseconds since the epoch, like stored in the footer of our block containers
+def epoch_microseconds(moment):
+    return (moment - EPOCH) // MICROSECOND
+
+# write only stream of length prefixed records (e.g. written by Rawlog.store_fp()) creating a block container
+# the timestamps of the records to write can be announced in record order by add_timestamp(), records written
+# without an announced timestamp get decoded to get their timestamp (see parse_timestamp())
+# blocks are compressed by a thread pool using workers threads (None uses all cores), the fp is not closed by close()
+class BlockContainerWriter(io.RawIOBase):
+    def __init__(self, fileobj, prefix_format, compresslevel=6, workers=None, records_per_block=RECORDS_PER_BLOCK):
+        super().__init__()
+        self.fileobj = fileobj
+        self.prefix = struct.Struct(prefix_format)
+        self.compresslevel = compresslevel
+        self.records_per_block = records_per_block
+        self.workers = workers if workers != None else (os.cpu_count() or 1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = collections.deque()      # (future, uncompressed length, record count, lowest timestamp, highest timestamp)
+        self.blocks = []
+        self.buffer = bytearray()
+        self.scan_pos = 0                       # end of the last complete record in our buffer
+        self.moments = []                       # timestamps (aware datetimes or None) of the complete records in our buffer
+        self.timestamps = collections.deque()   # announced timestamps of the records not yet complete in our buffer
+        self.offset = struct.calcsize(HEADER_FORMAT)
+        self.fileobj.write(struct.pack(HEADER_FORMAT, CONTAINER_MAGIC, CONTAINER_VERSION))
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        self.buffer += data
+        # this loop runs once per record, so keep it cheap
+        unpack_from, prefix_size, timestamps, moments = self.prefix.unpack_from, self.prefix.size, self.timestamps, self.moments
+        while self.scan_pos + prefix_size <= len(self.buffer):
+            end = self.scan_pos + prefix_size + unpack_from(self.buffer, self.scan_pos)[0]
+            if end > len(self.buffer):
+                break
+            moments.append(timestamps.popleft() if timestamps else self._record_timestamp(self.buffer, self.scan_pos))
+            self.scan_pos = end
+            if len(moments) == self.records_per_block:
+                self._queue_block(self.scan_pos)
+                moments = self.moments
+        return len(data)
+
+    # announces the (iso formatted) timestamp of the next record written (None if it does not have one)
+    def add_timestamp(self, timestamp):
+        self.timestamps.append(parse_timestamp(timestamp))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if len(self.buffer) > self.scan_pos:
+                logger.warning("Storing %d bytes of incomplete record data in last block..." % (len(self.buffer) - self.scan_pos))
+            if len(self.buffer) > 0:
+                self._queue_block(len(self.buffer))
+            while len(self.pending) > 0:
+                self._write_block()
+            footer = zlib.compress(bytes(json.dumps({"codec": "zlib", "blocks": self.blocks}), "UTF-8"))
+            self.fileobj.write(footer)
+            self.fileobj.write(struct.pack(TRAILER_FORMAT, self.offset, len(footer), CONTAINER_MAGIC))
+        finally:
+            for block in self.pending:
+                block[0].cancel()
+            self.executor.shutdown(wait=True)
+            super().close()
+
+    def _queue_block(self, end):
+        block = bytes(self.buffer[:end])
+        lowest = highest = None
+        # this block has to be read for every time range if any of its records (or incomplete records) has no timestamp
+        if len(self.moments) > 0 and end == self.scan_pos and None not in self.moments:
+            lowest, highest = epoch_microseconds(min(self.moments)), epoch_microseconds(max(self.moments))
+        self.pending.append((self.executor.submit(zlib.compress, block, self.compresslevel), len(block), len(self.moments), lowest, highest))
+        del self.buffer[:end]
+        self.scan_pos = 0
+        self.moments = []
+        # limit the memory used by compressed blocks waiting to be written
+        while len(self.pending) > self.workers * 2:
+            self._write_block()
+
+    def _write_block(self):
+        future, length, count, first, last = self.pending.popleft()
+        data = future.result()
+        self.fileobj.write(data)
+        self.blocks.append([self.offset, len(data), length, count, first, last])
+        self.offset += len(data)
+
+    def _record_timestamp(self, buffer, start):
+        try:
+            length = self.prefix.unpack_from(buffer, start)[0]
+            json_bytes = bytes(buffer[start + self.prefix.size:start + self.prefix.size + length])
+            entry = orjson.loads(json_bytes) if hasOrjson else json.loads(str(json_bytes, "UTF-8"))
+            return parse_timestamp(entry.get("timestamp")) if isinstance(entry, dict) else None
+        except (struct.error, ValueError):
+            return None
+
+# seekable read only stream of the uncompressed records of all blocks of a block container (like SeekableGzipFile for gzip files)
+# the blocks following the one currently read get decompressed ahead by workers threads (None or 1 decompresses on demand)
+# select_blocks() restricts reading to some blocks: reading skips all other blocks (positions stay those of the complete data)
+class BlockContainerFile(io.RawIOBase):
+    def __init__(self, fileobj, workers=None):
+        super().__init__()
+        self.fileobj = fileobj
+        self.fileobj.seek(0, io.SEEK_END)
+        self.compressed_size = self.fileobj.tell()
+        trailer_length = struct.calcsize(TRAILER_FORMAT)
+        if self.compressed_size < struct.calcsize(HEADER_FORMAT) + trailer_length:
+            raise ValueError("Block container is truncated!")
+        self.fileobj.seek(0, io.SEEK_SET)
+        magic, version = struct.unpack(HEADER_FORMAT, self.fileobj.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+            raise ValueError("Unknown block container version: %d" % version)
+        self.fileobj.seek(-trailer_length, io.SEEK_END)
+        footer_offset, footer_length, magic = struct.unpack(TRAILER_FORMAT, self.fileobj.read(trailer_length))
+        if magic != CONTAINER_MAGIC:
+            raise ValueError("Block container is truncated (no trailer found)!")
+        self.fileobj.seek(footer_offset, io.SEEK_SET)
+        footer = json.loads(str(zlib.decompress(self.fileobj.read(footer_length)), "UTF-8"))
+        if footer["codec"] != "zlib":
+            raise ValueError("Unknown block container codec: %s" % footer["codec"])
+        self.blocks = footer["blocks"]
+        self.block_offsets = []         # uncompressed offset of every block
+        self.size = 0
+        for block in self.blocks:
+            self.block_offsets.append(self.size)
+            self.size += block[2]
+        self.selected = None            # sorted list of selected block numbers (None selects all blocks)
+        self.workers = workers if workers != None and workers > 1 else 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        self.readahead = {}             # block number --> future of its decompressed data
+        self._pos = 0
+        self._block_num = None
+        self._block_data = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    # compressed position (the end of the block currently read), needed for progress calculation
+    def compressed_tell(self):
+        if self._block_num == None:
+            return struct.calcsize(HEADER_FORMAT)
+        return self.blocks[self._block_num][0] + self.blocks[self._block_num][1]
+
+    # returns the numbers of all blocks that could contain records within time_range (see parse_time_range())
+    def blocks_in_range(self, time_range):
+        time_range = tuple(None if moment == None else epoch_microseconds(moment) for moment in time_range)
+        return [num for num, block in enumerate(self.blocks) if in_time_range(block[4], block[5], time_range)]
+
+    def select_blocks(self, block_numbers):
+        self.selected = sorted(block_numbers) if block_numbers != None else None
+        logger.debug("Selected %s of %d blocks..." % ("all" if self.selected == None else len(self.selected), len(self.blocks)))
+
+    def readinto(self, b):
+        while self._pos < self.size:
+            num = bisect.bisect_right(self.block_offsets, self._pos) - 1
+            if self.selected != None:
+                pos = bisect.bisect_left(self.selected, num)
+                if pos == len(self.selected):
+                    self._pos = self.size
+                    break
+                if self.selected[pos] != num:
+                    self._pos = self.block_offsets[self.selected[pos]]
+                    continue
+            data = self._load_block(num)
+            start = self._pos - self.block_offsets[num]
+            count = min(len(b), len(data) - start)
+            b[:count] = data[start:start + count]
+            self._pos += count
+            return count
+        return 0
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self._pos + offset
+        elif whence == io.SEEK_END:
+            target = self.size + offset
+        else:
+            raise ValueError("Invalid whence: %s" % str(whence))
+        self._pos = max(0, min(target, self.size))
+        return self._pos
+
+    def close(self):
+        if self.closed:
+            return
+        for future in self.readahead.values():
+            future.cancel()
+        self.readahead.clear()
+        if self.executor != None:
+            self.executor.shutdown(wait=True)
+        self.fileobj.close()
+        super().close()
+
+    def _load_block(self, num):
+        if num == self._block_num:
+            return self._block_data
+        if num in self.readahead:
+            data = self.readahead.pop(num).result()
+        else:
+            data = zlib.decompress(self._read_compressed(num))
+        self._block_num = num
+        self._block_data = data
+        if self.executor != None:
+            self._schedule_readahead(num)
+        return data
+
+    # decompress the next blocks we are going to read in the background and drop the ones we are not going to read anymore
+    def _schedule_readahead(self, num):
+        upcoming = []
+        candidates = range(num + 1, len(self.blocks)) if self.selected == None else self.selected[bisect.bisect_right(self.selected, num):]
+        for candidate in candidates:
+            if len(upcoming) == self.workers * 2:
+                break
+            upcoming.append(candidate)
+        for stale in [other for other in self.readahead if other not in upcoming]:
+            self.readahead.pop(stale).cancel()
+        for candidate in upcoming:
+            if candidate not in self.readahead:
+                self.readahead[candidate] = self.executor.submit(zlib.decompress, self._read_compressed(candidate))
+
+    def _read_compressed(self, num):
+        self.fileobj.seek(self.blocks[num][0], io.SEEK_SET)
+        return self.fileobj.read(self.blocks[num][1])
+
+def open_block_container(fileobj, workers=None, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    return io.BufferedReader(BlockContainerFile(fileobj, workers), buffer_size)
@@ -0,0 +1,163 @@
+import array
+import marshal
+import logging
+
+logger = logging.getLogger(__name__)
+NoneType = type(None)
+
+# entry keys stored in typed arrays (values of other types are stored in the rest dict of that entry instead)
+INT_COLUMNS = {
+    "flag": "H",
+    "line": "q",
+    "__logline_index": "q",
+}
+BOOL_COLUMNS = ("__virtual", )
+# entry keys stored as one id per entry, referencing a table of unique (interned) values
+INTERNED_COLUMNS = ("_processID", "threadID", "file", "function")
+# entry keys stored in one utf-8 string pool per key
+POOLED_COLUMNS = ("timestamp", "message")
+
+# storage kind of every key
+REST, INT, BOOL, INTERNED, POOLED = range(5)
+KINDS = {
+    **{key: INT for key in INT_COLUMNS},
+    **{key: BOOL for key in BOOL_COLUMNS},
+    **{key: INTERNED for key in INTERNED_COLUMNS},
+    **{key: POOLED for key in POOLED_COLUMNS},
+}
+
+# list like columnar store of rawlog entries: dicts appended get split up into typed arrays, interned value ids and string pools,
+# all remaining keys (like the tag dict) are stored in interned marshalled form
+# reading materializes a new dict every time, modified entries have to be assigned back to be persisted
+class ColumnarEntries:
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.layout_ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._materialize(num) for num in range(*key.indices(len(self)))]
+        return self._materialize(self._normalize(key))
+
+    def __setitem__(self, key, entry):
+        num = self._normalize(key)
+        self._store(num, entry)
+
+    def __iter__(self):
+        for num in range(len(self)):
+            yield self._materialize(num)
+
+    def clear(self):
+        self.int_columns = {key: array.array(typecode) for key, typecode in INT_COLUMNS.items()}
+        self.bool_columns = {key: array.array("b") for key in BOOL_COLUMNS}
+        self.interned_columns = {key: array.array("I") for key in INTERNED_COLUMNS}
+        self.pools = {key: bytearray() for key in POOLED_COLUMNS}
+        self.pool_offsets = {key: array.array("Q") for key in POOLED_COLUMNS}
+        self.pool_lengths = {key: array.array("I") for key in POOLED_COLUMNS}
+        self.layout_ids = array.array("I")          # key order and storage location of every entry
+        self.rest_ids = array.array("I")            # id of the marshalled dict holding all keys not stored in columns
+        self.values = []                            # interned values of all INTERNED_COLUMNS
+        self.value_ids = {}
+        self.layouts = []
+        self.layout_table = {}
+        self.rests = []
+        self.rest_table = {}
+        self.objects = {}                           # rest dicts not marshallable (e.g. containing ui objects)
+        self.columns = {**self.int_columns, **self.bool_columns, **self.interned_columns}
+        self.all_columns = [*self.columns.values(), *self.pool_offsets.values(), *self.pool_lengths.values(), self.layout_ids, self.rest_ids]
+
+    def append(self, entry):
+        for column in self.all_columns:
+            column.append(0)
+        self._store(len(self.layout_ids) - 1, entry)
+
+    # this is a rough estimation of the memory used by this store (interned values and marshalled rest dicts are only counted once)
+    def memory_usage(self):
+        usage = 0
+        for columns in (self.int_columns, self.bool_columns, self.interned_columns, self.pool_offsets, self.pool_lengths):
+            usage += sum(column.itemsize * len(column) for column in columns.values())
+        usage += sum(len(pool) for pool in self.pools.values())
+        usage += self.layout_ids.itemsize * len(self.layout_ids) + self.rest_ids.itemsize * len(self.rest_ids)
+        usage += sum(len(rest) for rest in self.rests)
+        return usage
+
+    # returns the storage kind of key for every layout id (None if key is not part of that layout),
+    # this allows direct access to the columns (used by the query planner of the LogViewer, for example)
+    def layout_kinds(self, key):
+        return [dict(layout).get(key) for layout in self.layouts]
+
+    def _normalize(self, key):
+        num = key + len(self) if key < 0 else key
+        if num < 0 or num >= len(self):
+            raise IndexError("rawlog index out of range")
+        return num
+
+    def _intern(self, table, values, value):
+        if value not in table:
+            table[value] = len(values)
+            values.append(value)
+        return table[value]
+
+    def _store(self, num, entry):
+        layout = []
+        rest = {}
+        for key, value in entry.items():
+            kind = KINDS.get(key, REST)
+            value_type = type(value)
+            if kind == INT and value_type == int:
+                try:
+                    self.columns[key][num] = value
+                except OverflowError:
+                    kind = REST
+            elif kind == BOOL and value_type == bool:
+                self.columns[key][num] = value
+            elif kind == INTERNED and value_type in (str, int, float, bool, NoneType):
+                # use the type as part of our interning key, because 1 == 1.0 == True
+                value_id = self.value_ids.get((value_type, value))
+                if value_id == None:
+                    value_id = self._intern(self.value_ids, self.values, (value_type, value))
+                self.columns[key][num] = value_id
+            elif kind == POOLED and value_type == str:
+                data = value.encode("UTF-8", "surrogatepass")
+                pool = self.pools[key]
+                self.pool_offsets[key][num] = len(pool)
+                self.pool_lengths[key][num] = len(data)
+                pool += data
+            else:
+                kind = REST
+            if kind == REST:
+                rest[key] = value
+            layout.append((key, kind))
+        layout = tuple(layout)
+        layout_id = self.layout_table.get(layout)
+        self.layout_ids[num] = layout_id if layout_id != None else self._intern(self.layout_table, self.layouts, layout)
+        if len(self.objects) != 0:
+            self.objects.pop(num, None)
+        try:
+            # marshal version 2 does not use references and always creates the same data for equal dicts
+            self.rest_ids[num] = self._intern(self.rest_table, self.rests, marshal.dumps(rest, 2))
+        except ValueError:
+            self.rest_ids[num] = 0
+            self.objects[num] = rest
+
+    def _materialize(self, num):
+        if num in self.objects:
+            rest = self.objects[num]
+        else:
+            rest = marshal.loads(self.rests[self.rest_ids[num]])
+        entry = {}
+        for key, kind in self.layouts[self.layout_ids[num]]:
+            if kind == REST:
+                entry[key] = rest[key]
+            elif kind == INT:
+                entry[key] = self.columns[key][num]
+            elif kind == BOOL:
+                entry[key] = bool(self.columns[key][num])
+            elif kind == INTERNED:
+                entry[key] = self.values[self.columns[key][num]][1]
+            else:
+                offset = self.pool_offsets[key][num]
+                entry[key] = str(self.pools[key][offset:offset + self.pool_lengths[key][num]], "UTF-8", "surrogatepass")
+        return entry
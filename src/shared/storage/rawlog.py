@@ -1,23 +1,41 @@
+import os
 import math
 import pathlib
 import json
 import struct
-import gzip
 import io
-from queue import Queue
+import marshal
+import tempfile
+import array
+import collections
+import concurrent.futures
 import logging
 
-from shared.utils import randread, is_gzip_file, gzip_file_size
+from shared.utils import is_gzip_file, open_seekable_gzip
 from shared.utils.constants import LOGLEVELS
+from .rawlog_index import RawlogIndex, LazyRawlogEntries
+from .columnar import ColumnarEntries
+from .record_writer import RecordWriter
+from .block_container import CONTAINER_SUFFIX, BlockContainerFile, is_block_container, open_block_container, parse_time_range, parse_timestamp, in_time_range
+from .spill import SpillingEntries
 try:
     from .udp_server import UdpServer
     hasLogserver = True
 except ImportError:
     hasLogserver = False
+try:
+    import orjson
+    hasOrjson = True
+except ImportError:
+    hasOrjson = False
 
 logger = logging.getLogger(__name__)
 PREFIX_FORMAT = "!L"        # constant defining the struct.{pack,unpack} format of our length prefix
 LENGTH_BITS_NEEDED = 20
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024       # json bytes per chunk handed to a worker process when decoding in parallel
+PROGRESS_INTERVAL = 1000                    # number of entries to process between two progress callbacks when storing or exporting
+POLL_BATCH_SIZE = 2000                      # default maximum number of received entries appended by one poll of a live stream
+MISSING = object()
 
 # own exception to allow the loader callback to communicate an abort condition
 class AbortRawlogLoading(RuntimeError):
@@ -40,16 +58,47 @@ class Rawlog:
         return self.data[key]
     def __setitem__(self, key, value):
         self.data[key] = value
+        for index in (range(*key.indices(len(self.data))) if isinstance(key, slice) else [key % len(self.data)]):
+            self.mark_modified(index)
     def __delitem__(self, key):
         del self.data[key]
+        self.mark_changed()
     def __len__(self):
         return len(self.data)
+    def __iter__(self):
+        return iter(self.data)      # lazily loaded and spilled entries are iterated without evicting their caches
     
     def clear(self):
+        if hasattr(self, "data") and isinstance(self.data, (LazyRawlogEntries, SpillingEntries)):
+            self.data.close()
         self.data = []
         self.needs_custom_callbacks = False
+        # (path, size, mtime_ns) of the rawlog file we loaded and the byte spans of all of its records, indexed by __logline_index
+        # (offset -1 for entries not read from that file), store_fp() copies the original bytes of unmodified entries
+        self.source = None
+        self.source_offsets = array.array("q")
+        self.source_lengths = array.array("I")
+        self.modified = set()
+        # incremented whenever our entries change other than by appending entries (it never decreases, not even when clearing),
+        # caches derived from our entries (e.g. query columns) are valid as long as our length and generation stay the same
+        self.generation = self.generation + 1 if hasattr(self, "generation") else 0
+    
+    # entries changed in place without changing their stored data (e.g. their formatted message) have to be marked as changed
+    def mark_changed(self):
+        self.generation += 1
     
-    def stream_rawlog(self, key, /, host="::", port=5555, custom_load_callback=None):
+    # entries modified in place have to be marked as modified to not store their original bytes (replacing entries marks them, too)
+    # lazily loaded entries are decoded again once evicted from their cache, marking them keeps the modified entry in memory
+    def mark_modified(self, index):
+        self.modified.add(index)
+        self.mark_changed()
+        if isinstance(self.data, LazyRawlogEntries):
+            self.data[index] = self.data[index]
+    
+    # if max_entries or max_bytes (of json data) is given, only the most recent entries are held in memory: all received entries
+    # are written to spill_file (a temporary file deleted by clear() if None) and older ones are paged in from there on access
+    # (custom_load_callback gets called again for paged in entries and thus should not depend on any state)
+    def stream_rawlog(self, key, /, host="::", port=5555, custom_load_callback=None, max_entries=None, max_bytes=None, spill_file=None):
         if not hasLogserver:
             raise Exception("UDP logserver not importable!")
         
@@ -60,17 +109,31 @@ class Rawlog:
         if custom_load_callback != None:
             self.needs_custom_callbacks = True
         
-        queue = Queue(128)
-        server = UdpServer(queue, key, host=host, port=port)
+        server = UdpServer(key, host=host, port=port)
+        if max_entries != None or max_bytes != None or spill_file != None:
+            try:
+                self.data = SpillingEntries(PREFIX_FORMAT, _encode_entry, custom_load_callback, max_entries, max_bytes, spill_file)
+            except:
+                server.stop()
+                raise
         
-        def poll(stop=False):
+        # poll() appends the entries received so far (but at most max_entries, the rest is left for the next poll), poll(stop=True)
+        # stops receiving, the counters of our server (received, dropped, decoded, pending etc. packets) can be queried using
+        # poll.statistics()
+        def poll(stop=False, max_entries=POLL_BATCH_SIZE):
             if stop:
                 server.stop()
                 return False
-            retval = not queue.empty()
-            while not queue.empty():
-                self._append_entry(queue.get(), custom_load_callback)
-            return retval
+            appended = 0
+            while appended < max_entries:
+                entries = server.read(max_entries - appended)
+                if len(entries) == 0:
+                    break
+                for entry in entries:
+                    self._append_entry(entry, custom_load_callback)
+                appended += len(entries)
+            return appended > 0
+        poll.statistics = server.statistics
         return poll
     
     def load_bytes(self, data, /, **kwargs):
@@ -78,133 +141,337 @@ class Rawlog:
         with io.BytesIO(data) as fp:
             return self.load_fp(fp, **kwargs)       # returns True on success and None on abort
     
-    def load_file(self, filename, /, **kwargs):
+    def load_file(self, filename, /, lazy=False, **kwargs):
+        if lazy:
+            return self.load_file_lazy(filename, **kwargs)
         logger.debug("Loading rawlog data from '%s'..." % filename)
         with open(filename, "rb") as fp:
-            return self.load_fp(fp, **kwargs)       # returns True on success and None on abort
+            stat = os.fstat(fp.fileno())
+            if self.load_fp(fp, **kwargs) != True:
+                return None     # always return None on abort
+        self.source = (filename, stat.st_size, stat.st_mtime_ns)
+        return True     # return True on success
     
-    def load_fp(self, fp, /, progress_callback=None, custom_load_callback=None):
+    # only read an offset index of all entries (reusing or creating a sidecar index file) and decode entries on access
+    # custom_load_callback gets called again for entries decoded again and thus should not depend on any state,
+    # it can't filter out entries (every entry of the file is part of our data)
+    def load_file_lazy(self, filename, /, progress_callback=None, custom_load_callback=None, workers=None):
+        logger.debug("Lazy loading rawlog data from '%s'..." % filename)
+        self.clear()
+        
+        # force custom save/export callbacks later on if data is now loaded with a custom load callback
+        if custom_load_callback != None:
+            self.needs_custom_callbacks = True
+        stat = os.stat(filename)
+        index_filename = RawlogIndex.sidecar_filename(filename)
+        index = RawlogIndex.load_file(index_filename, stat.st_size, stat.st_mtime_ns)
+        fp, filesize, position = self._open_data_fp(open(filename, "rb"))
+        try:
+            if index == None:
+                index = self._build_index(fp, filesize, position, progress_callback, workers)
+                if index == None:
+                    fp.close()
+                    return None     # always return None on abort
+                try:
+                    index.store_file(index_filename, stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    logger.warning("Could not store rawlog index to '%s', continuing without..." % index_filename, exc_info=True)
+        except:
+            fp.close()
+            raise
+        self.data = LazyRawlogEntries(index, fp, len(struct.pack(PREFIX_FORMAT, 0)), custom_load_callback)
+        self.source = (filename, stat.st_size, stat.st_mtime_ns)
+        self.source_offsets = array.array("q", index.offsets)
+        self.source_lengths = array.array("I", index.lengths)
+        return True     # return True on success
+    
+    # columnar=True stores all entries in a compact columnar form, materializing entry dicts only on access
+    # time_range=(first, last) only loads entries having a timestamp in this range (None bounds are unbounded),
+    # the iso formatted bounds and timestamps are compared as points in time (see parse_time_range()), entries whose
+    # timestamp can not be parsed are always loaded, blocks of block containers not overlapping this range are skipped
+    def load_fp(self, fp, /, progress_callback=None, custom_load_callback=None, workers=None, columnar=False, time_range=None):
         logger.debug("Loading rawlog data from fp: %s" % str(fp))
         self.clear()
-        prefix_length = len(struct.pack(PREFIX_FORMAT, 0))
+        if columnar:
+            self.data = ColumnarEntries()
         
         # force custom save/export callbacks later on if data is now loaded with a custom load callback
         if custom_load_callback != None:
             self.needs_custom_callbacks = True
         
-        # readsize and filesize are needed for progress calculation
-        readsize = 0
+        # filesize and position are needed for progress calculation
+        fp, filesize, position = self._open_data_fp(fp, workers)
+        
+        # now process our data
+        with fp:
+            try:
+                for entry, offset, length, readsize in self._load_entries(fp, workers, time_range):
+                    self._append_entry(entry, custom_load_callback, offset, length)
+                    if offset == None:
+                        continue        # don't report progress for virtual entries
+                    
+                    if progress_callback != None:
+                        # the callback returns True if it wants to cancel the loading
+                        # the entries loaded so far are kept: we may run in a background thread while our data is
+                        # still shown by the ui, the caller has to discard this rawlog (e.g. from its ui thread)
+                        if progress_callback(position(readsize), filesize) == True:
+                            return None     # always return None on abort
+            except AbortRawlogLoading:
+                return None     # always return None on abort
+        return True     # return True on success
+    
+    # generator yielding all entries of fp like load_fp() would append them, without holding them in memory (our data stays untouched),
+    # the __logline_index of every entry is its position in this sequence (e.g. to process rawlogs of any size using constant memory)
+    def iterate_fp(self, fp, /, workers=None, time_range=None):
+        logger.debug("Iterating rawlog data from fp: %s" % str(fp))
+        fp, filesize, position = self._open_data_fp(fp, workers)
+        with fp:
+            for index, (entry, offset, length, readsize) in enumerate(self._load_entries(fp, workers, time_range)):
+                entry["__logline_index"] = index
+                if "__virtual" not in entry:
+                    entry["__virtual"] = False
+                yield entry
+    
+    def iterate_file(self, filename, /, **kwargs):
+        logger.debug("Iterating rawlog data from '%s'..." % filename)
+        with open(filename, "rb") as fp:
+            yield from self.iterate_fp(fp, **kwargs)
+    
+    # like _read_entries(), but skipping the entries (and blocks of block containers) not within time_range (see load_fp())
+    def _load_entries(self, fp, workers=None, time_range=None):
+        if time_range != None:
+            time_range = parse_time_range(time_range)
+            if isinstance(getattr(fp, "raw", None), BlockContainerFile):
+                fp.raw.select_blocks(fp.raw.blocks_in_range(time_range))
+        for entry, offset, length, readsize in self._read_entries(fp, workers):
+            if time_range != None and offset != None and "timestamp" in entry:
+                moment = parse_timestamp(entry["timestamp"])
+                if not in_time_range(moment, moment, time_range):
+                    continue
+            yield (entry, offset, length, readsize)
+    
+    def _build_index(self, fp, filesize, position, progress_callback=None, workers=None):
+        logger.debug("Building rawlog index...")
+        index = RawlogIndex()
+        for entry, offset, length, readsize in self._read_entries(fp, workers):
+            index.append(entry, offset, length)
+            if progress_callback != None and offset != None:
+                # the callback returns True if it wants to cancel the loading
+                if progress_callback(position(readsize), filesize) == True:
+                    return None
+        logger.debug("Rawlog index contains %d entries..." % len(index))
+        return index
+    
+    # returns a seekable fp of the uncompressed data, the total size and a function mapping the
+    # uncompressed read position to a position relative to this total size (both are needed for progress calculation)
+    # blocks of block containers are decompressed ahead by workers threads
+    def _open_data_fp(self, fp, workers=None):
+        if is_block_container(fp):
+            logger.debug("Data is a block container...")
+            fp = open_block_container(fp, workers)
+            return (fp, fp.raw.compressed_size, lambda readsize: fp.raw.compressed_tell())
         if is_gzip_file(fp):
             logger.debug("Data is gzip compressed...")
-            filesize = gzip_file_size(fp)
+            fp = open_seekable_gzip(fp)
+            # the uncompressed size is not known in advance (the ISIZE trailer wraps at 4 GiB), use compressed positions instead
+            return (fp, fp.raw.compressed_size, lambda readsize: fp.raw.compressed_tell())
+        logger.debug("Data is uncompressed...")
+        # calculate file size by seeking to the end
+        fp.seek(0, io.SEEK_END)
+        filesize = fp.tell()
+        fp.seek(0, io.SEEK_SET)
+        return (fp, filesize, lambda readsize: readsize)
+    
+    # generator yielding (entry, offset, length, readsize) for every entry to be appended to our rawlog,
+    # this includes virtual status entries (having offset and length set to None) for processid changes and corruptions
+    # json decoding is distributed onto a pool of worker processes if workers is greater than 1
+    def _read_entries(self, fp, workers=None):
+        if workers != None and workers > 1:
+            records = self._read_records_parallel(fp, workers)
         else:
-            logger.debug("Data is uncompressed...")
-            # calculate file size by seeking to the end
-            fp.seek(0, io.SEEK_END)
-            filesize = fp.tell()
-            fp.seek(0, io.SEEK_SET)
-        
-        # now process our data
-        entry = None
+            records = self._read_records(fp)
         old_processid = None
-        corruption_counter = 0
-        corruption_skipped = 0
-        with gzip.GzipFile(fileobj=fp, mode="rb") if is_gzip_file(fp) else fp as fp:
+        for entry, offset, length, readsize in records:
+            if offset != None:
+                if old_processid != None and entry["_processID"] != old_processid:
+                    message = "Processid changed from %s to %s..." % (old_processid, entry["_processID"])
+                    yield ({
+                        "__virtual": True,
+                        "flag": LOGLEVELS["STATUS"],    # this is status logline (a fake loglevel only used by the logviewer itself)
+                        "message": message,
+                    }, None, None, readsize)
+                if "_processID" in entry:
+                    old_processid = entry["_processID"]
+            yield (entry, offset, length, readsize)
+    
+    # parallel variant of _read_records(): the length prefixes are scanned by this process and the json data of record aligned
+    # chunks is decoded by a process pool, the decoded chunks are then merged back in order
+    # if a record could not be decoded, reading continues serially at that record to produce the same corruption handling
+    # (and status entries) as the serial variant
+    def _read_records_parallel(self, fp, workers):
+        logger.debug("Decoding rawlog data using %d worker processes..." % workers)
+        state = {"readsize": 0, "corruption_counter": 0, "corruption_skipped": 0}
+        scanner = self._read_records(fp, decode=False, state=state)
+        pending = collections.deque()
+        
+        def submit_chunk():
+            items = []
+            blobs = []
+            chunk_size = 0
+            for entry, offset, length, readsize in scanner:
+                if offset == None:
+                    items.append((entry, offset, length, readsize, None))
+                    continue
+                # save the reader state before this record (needed to resume serially at this record)
+                items.append((None, offset, length, readsize, dict(state, readsize=readsize - length - len(struct.pack(PREFIX_FORMAT, 0)))))
+                blobs.append(entry)
+                chunk_size += length
+                if chunk_size >= PARALLEL_CHUNK_SIZE:
+                    break
+            if len(items) == 0:
+                return False
+            pending.append((items, executor.submit(_decode_json_records, blobs)))
+            return True
+        
+        resume = None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
             try:
-                while True:
-                    # Unwraps the rawlog file and strips down the values
-                    json_raw_read_len = fp.read(prefix_length)
-                    if len(json_raw_read_len) != prefix_length:
+                while resume == None:
+                    while len(pending) < workers * 2 and submit_chunk():
+                        pass
+                    if len(pending) == 0:
                         break
-                    json_read_len = struct.unpack(PREFIX_FORMAT, json_raw_read_len)[0]
-                    if json_read_len == 0:
-                        logger.debug("Length prefix at %d is zero (possibly old format), ignoring this chunk...", readsize)
-                        continue
-                    
-                    skip_corrupted_part = False
-                    # only 20 bits of our length prefix should ever be needed
-                    if json_read_len > (1<<LENGTH_BITS_NEEDED):
-                        logger.error("Potential corruption at %d [%d], trying to skip to next full entry..." % (readsize, fp.tell()))
-                        logger.debug("Last complete entry: %s" % entry)
-                        fp.seek(-prefix_length, io.SEEK_CUR)
-                        skip_corrupted_part = True
-                    else:
-                        #logger.debug("Loading %d json bytes at %d..." % (json_read_len, fp.tell()))
-                        json_bytes = fp.read(json_read_len)
-                        if len(json_bytes) != json_read_len:
-                            logger.debug("Corruption detected: failed to read data: %d expected, but only %d read..." % (json_read_len, len(json_bytes)))
-                            skip_corrupted_part = True
-                            #raise Exception("Rawlog file corrupt!")
-                        else:
-                            try:
-                                entry = json.loads(str(json_bytes, "UTF-8"))
-                                readsize += json_read_len + prefix_length
-                            except:
-                                logger.debug("Corruption detected: failed to load json: %s" % json_bytes, exc_info=True)
-                                skip_corrupted_part = True
-                    
-                    if skip_corrupted_part:
-                        # seek through the file byte by byte and search for a (prefix_length*8)-LENGTH_BITS_NEEDED bit zero sequence beginning on a byte boundary
-                        search_length = math.ceil(((prefix_length*8)-LENGTH_BITS_NEEDED)/8)
-                        while True:
-                            potential_high_bytes = fp.read(search_length)
-                            logger.debug("Searching for next length prefix at %d: %s" % (fp.tell(), potential_high_bytes))
-                            if len(potential_high_bytes) != search_length:
-                                logger.error("Could not find next undamaged block, EOF reached!")
-                                break
-                            fp.seek(-(search_length-1), io.SEEK_CUR)        # move cursor by one byte relative to our old search position
-                            # only allow for the [LENGTH_BITS_NEEDED % 8] low bits to be used
-                            # (these are the [LENGTH_BITS_NEEDED % 8] high bits of our [LENGTH_BITS_NEEDED] bit number mentioned above)
-                            if struct.unpack("!H", potential_high_bytes)[0] <= (1<<(LENGTH_BITS_NEEDED % 8)):
-                                fp.seek(-1, io.SEEK_CUR)        # move cursor back to original search position (compensate the off by one of our seek above)
-                                logger.error("Found next undamaged block at %d, skipping %d bytes!" % (fp.tell(), fp.tell()-readsize))
-                                message = "Corruption at %d, skipping %d bytes!" % (readsize, fp.tell()-readsize)
-                                self._append_entry({
-                                    "__warning": False,
-                                    "__virtual": True,
-                                    "flag": LOGLEVELS["STATUS"],    # this is status logline (a fake loglevel only used by the logviewer itself)
-                                    "message": message,
-                                }, custom_load_callback)
-                                corruption_counter += 1
-                                corruption_skipped += fp.tell()-readsize
-                                readsize = fp.tell()        # fix readsize value
+                    items, future = pending.popleft()
+                    entries = iter(marshal.loads(future.result()))
+                    for entry, offset, length, readsize, record_state in items:
+                        if offset != None:
+                            entry = next(entries, None)
+                            if entry == None:
+                                resume = (offset, record_state)
                                 break
-                        continue        # continue reading (eof will be automatically handled by our normal code, too)
-                    
-                    if old_processid != None and entry["_processID"] != old_processid:
-                        message = "Processid changed from %s to %s..." % (old_processid, entry["_processID"])
-                        self._append_entry({
+                        yield (entry, offset, length, readsize)
+            finally:
+                for items, future in pending:
+                    future.cancel()
+        
+        if resume != None:
+            offset, record_state = resume
+            logger.debug("Could not decode record at %d, continuing serially..." % offset)
+            fp.seek(offset, io.SEEK_SET)
+            yield from self._read_records(fp, state=record_state)
+    
+    # generator yielding (entry, offset, length, readsize) for every length prefixed json record read from (uncompressed) fp,
+    # offset is the position of the length prefix, length the size of the json data following it
+    # corruptions are skipped and get reported by yielding virtual status entries having offset and length set to None
+    # if decode is False, the raw json bytes are yielded instead of the decoded entry (json errors can not be detected then)
+    # state holds the readsize and corruption counters and is updated before every yield to allow resuming at any record later on
+    def _read_records(self, fp, decode=True, state=None):
+        prefix_length = len(struct.pack(PREFIX_FORMAT, 0))
+        if state == None:
+            state = {"readsize": 0, "corruption_counter": 0, "corruption_skipped": 0}
+        readsize = state["readsize"]
+        entry = None
+        corruption_counter = state["corruption_counter"]
+        corruption_skipped = state["corruption_skipped"]
+        while True:
+            # Unwraps the rawlog file and strips down the values
+            json_raw_read_len = fp.read(prefix_length)
+            if len(json_raw_read_len) != prefix_length:
+                break
+            json_read_len = struct.unpack(PREFIX_FORMAT, json_raw_read_len)[0]
+            if json_read_len == 0:
+                logger.debug("Length prefix at %d is zero (possibly old format), ignoring this chunk...", readsize)
+                continue
+            
+            skip_corrupted_part = False
+            # only 20 bits of our length prefix should ever be needed
+            if json_read_len > (1<<LENGTH_BITS_NEEDED):
+                logger.error("Potential corruption at %d [%d], trying to skip to next full entry..." % (readsize, fp.tell()))
+                logger.debug("Last complete entry: %s" % entry)
+                fp.seek(-prefix_length, io.SEEK_CUR)
+                skip_corrupted_part = True
+            else:
+                #logger.debug("Loading %d json bytes at %d..." % (json_read_len, fp.tell()))
+                offset = fp.tell() - prefix_length
+                json_bytes = fp.read(json_read_len)
+                if len(json_bytes) != json_read_len:
+                    logger.debug("Corruption detected: failed to read data: %d expected, but only %d read..." % (json_read_len, len(json_bytes)))
+                    skip_corrupted_part = True
+                    #raise Exception("Rawlog file corrupt!")
+                elif not decode:
+                    entry = json_bytes
+                    readsize += json_read_len + prefix_length
+                else:
+                    try:
+                        entry = json.loads(str(json_bytes, "UTF-8"))
+                        readsize += json_read_len + prefix_length
+                    except:
+                        logger.debug("Corruption detected: failed to load json: %s" % json_bytes, exc_info=True)
+                        skip_corrupted_part = True
+            
+            if skip_corrupted_part:
+                # seek through the file byte by byte and search for a (prefix_length*8)-LENGTH_BITS_NEEDED bit zero sequence beginning on a byte boundary
+                search_length = math.ceil(((prefix_length*8)-LENGTH_BITS_NEEDED)/8)
+                while True:
+                    potential_high_bytes = fp.read(search_length)
+                    logger.debug("Searching for next length prefix at %d: %s" % (fp.tell(), potential_high_bytes))
+                    if len(potential_high_bytes) != search_length:
+                        logger.error("Could not find next undamaged block, EOF reached!")
+                        break
+                    fp.seek(-(search_length-1), io.SEEK_CUR)        # move cursor by one byte relative to our old search position
+                    # only allow for the [LENGTH_BITS_NEEDED % 8] low bits to be used
+                    # (these are the [LENGTH_BITS_NEEDED % 8] high bits of our [LENGTH_BITS_NEEDED] bit number mentioned above)
+                    if struct.unpack("!H", potential_high_bytes)[0] <= (1<<(LENGTH_BITS_NEEDED % 8)):
+                        fp.seek(-1, io.SEEK_CUR)        # move cursor back to original search position (compensate the off by one of our seek above)
+                        logger.error("Found next undamaged block at %d, skipping %d bytes!" % (fp.tell(), fp.tell()-readsize))
+                        message = "Corruption at %d, skipping %d bytes!" % (readsize, fp.tell()-readsize)
+                        state.update(readsize=readsize, corruption_counter=corruption_counter, corruption_skipped=corruption_skipped)
+                        yield ({
+                            "__warning": False,
                             "__virtual": True,
                             "flag": LOGLEVELS["STATUS"],    # this is status logline (a fake loglevel only used by the logviewer itself)
                             "message": message,
-                        }, custom_load_callback)
-                    self._append_entry(entry, custom_load_callback)
-                    if "_processID" in entry:
-                        old_processid = entry["_processID"]
-                    
-                    if progress_callback != None:
-                        # the callback returns True if it wants to cancel the loading
-                        if progress_callback(readsize, filesize) == True:
-                            self.clear()
-                            return None     # always return None on abort
-            except AbortRawlogLoading:
-                return None     # always return None on abort
+                        }, None, None, readsize)
+                        corruption_counter += 1
+                        corruption_skipped += fp.tell()-readsize
+                        readsize = fp.tell()        # fix readsize value
+                        break
+                continue        # continue reading (eof will be automatically handled by our normal code, too)
+            
+            state.update(readsize=readsize, corruption_counter=corruption_counter, corruption_skipped=corruption_skipped)
+            yield (entry, offset, json_read_len, readsize)
+        
+        state.update(readsize=readsize, corruption_counter=corruption_counter, corruption_skipped=corruption_skipped)
         if corruption_counter > 0:
             message = "%d corruptions detected, skipped %d bytes total!" % (corruption_counter, corruption_skipped)
-            self._append_entry({
+            yield ({
                 "__warning": True,
                 "__virtual": True,
                 "flag": LOGLEVELS["STATUS"],    # this is status logline (a fake loglevel only used by the logviewer itself)
                 "message": message,
-            }, custom_load_callback)
-        return True     # return True on success
+            }, None, None, readsize)
     
+    # files having the CONTAINER_SUFFIX are stored as block container (see BlockContainerWriter)
     def store_file(self, filename, **kwargs):
         compressed = pathlib.Path(filename).suffix == ".gz"
-        logger.debug("Storing %s rawlog data to '%s'..." % ("compressed " if compressed else "uncompressed", filename))
+        container = pathlib.Path(filename).suffix == CONTAINER_SUFFIX
+        logger.debug("Storing %s rawlog data to '%s'..." % ("block container" if container else "compressed " if compressed else "uncompressed", filename))
+        # lazily loaded entries are decoded from their file while storing: don't truncate that file, replace it once we are done
+        if isinstance(self.data, LazyRawlogEntries) and self.source != None and os.path.exists(filename) and os.path.samefile(filename, self.source[0]):
+            logger.debug("Storing to a temporary file replacing our lazily loaded source file...")
+            fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix=".%s." % os.path.basename(filename))
+            try:
+                with os.fdopen(fd, "wb") as fp:
+                    result = self.store_fp(fp, compressed, container=container, **kwargs)
+                if result == True:
+                    os.replace(tmp_filename, filename)
+            finally:
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+            return result       # returns True on success and None on abort
         with open(filename, "wb") as fp:
             fp.truncate()       # make sure the file is empty now
-            return self.store_fp(fp, compressed, **kwargs)      # returns True on success and None on abort
+            return self.store_fp(fp, compressed, container=container, **kwargs)      # returns True on success and None on abort
     
     def store_bytes(self, data, compressed, **kwargs):
         logger.debug("Storing %s rawlog data to bytearray..." % ("compressed " if compressed else "uncompressed"))
@@ -213,36 +480,52 @@ class Rawlog:
                 return fp.getvalue()    # return bytearray on success
             return None                 # return None on abort
     
-    def store_fp(self, fp, compressed, *, progress_callback=None, custom_store_callback=None):
+    # if passthrough is True, the original bytes of unmodified entries are copied from the rawlog file we loaded instead of encoding them
+    # (entries returned by custom_store_callback must not be modified unless they are marked as modified or lack a __logline_index)
+    # compressed data is deflated by workers threads (None uses all cores) using the given compresslevel
+    # if container is True, a block container is written instead of a (gzip compressed) plain rawlog
+    def store_fp(self, fp, compressed, *, progress_callback=None, custom_store_callback=None, passthrough=True, compresslevel=6, workers=None, container=False):
         if self.needs_custom_callbacks and custom_store_callback == None:
             raise Exception("You need to specify a custom_store_callback because you loaded this file/data using a custom_load_callback!")
         logger.debug("Storing %s rawlog data to fp: %s" % ("compressed " if compressed else "uncompressed", str(fp)))
-        entry_num = 0
-        # don't use a context manager here, to not close this file pointer after writing!
-        if compressed:
-            fp = gzip.GzipFile(fileobj=fp, mode="wb")
-        for entry in self.data:
-            if custom_store_callback != None:
-                entry = custom_store_callback(entry)
-            entry_num += 1      # increment before checking for None
-            if not entry or ("__virtual" in entry and entry["__virtual"]):
-                continue
-            
-            # don't store this, too
-            entry = entry.copy()
-            del entry["__logline_index"]
-            
-            json_bytes = bytearray(json.dumps(entry), "UTF-8")
-            size = struct.pack(PREFIX_FORMAT, len(json_bytes))
-            fp.write(size + json_bytes)
-            
-            if progress_callback != None:
-                if progress_callback(entry_num, len(self.data)) == True:
-                    logger.debug("Store was aborted...")
-                    return None     # always return None on abort
+        prefix = struct.Struct(PREFIX_FORMAT)
+        def span(entry):
+            index = entry.get("__logline_index")
+            if index == None or index >= len(self.source_offsets) or self.source_offsets[index] == -1 or index in self.modified:
+                return None
+            return (self.source_offsets[index], prefix.size + self.source_lengths[index])
+        source_fp = self._open_source() if passthrough else None
+        try:
+            if self._write_entries(fp, compressed, serialize_entry, progress_callback, custom_store_callback, source_fp, span,
+                                   compresslevel, workers, PREFIX_FORMAT if container else None) != True:
+                logger.debug("Store was aborted...")
+                return None     # always return None on abort
+        finally:
+            if source_fp != None:
+                source_fp.close()
         logger.debug("Store completed...")
         return True     # return True on success
     
+    # returns a (seekable, uncompressed) fp of the rawlog file we loaded or None if there is none or it was changed since loading
+    # (the spill file of a spilling stream contains all of its records and is used instead)
+    def _open_source(self):
+        if isinstance(self.data, SpillingEntries):
+            return self.data.open_segment()
+        if self.source == None:
+            return None
+        filename, size, mtime = self.source
+        try:
+            fp = open(filename, "rb")
+        except OSError:
+            logger.info("Could not open source rawlog '%s', encoding all entries..." % filename, exc_info=True)
+            return None
+        stat = os.fstat(fp.fileno())
+        if stat.st_size != size or stat.st_mtime_ns != mtime:
+            logger.info("Source rawlog '%s' was changed since loading, encoding all entries..." % filename)
+            fp.close()
+            return None
+        return self._open_data_fp(fp)[0]
+    
     def export_file(self, filename, **kwargs):
         compressed = pathlib.Path(filename).suffix == ".gz"
         logger.debug("Exporting %s textlog data to '%s'..." % ("compressed " if compressed else "uncompressed", filename))
@@ -257,28 +540,39 @@ class Rawlog:
             return fp.getvalue()    # return bytearray on success
         return None                 # return None on abort
     
-    def export_fp(self, fp, compressed, *, formatter, progress_callback=None, custom_store_callback=None):
+    def export_fp(self, fp, compressed, *, formatter, progress_callback=None, custom_store_callback=None, compresslevel=6, workers=None):
         if self.needs_custom_callbacks and custom_store_callback == None:
             raise Exception("You need to specify a custom_store_callback because you loaded this file/data using a custom_load_callback!")
         logger.debug("Exporting %s textlog data to fp: %s" % ("compressed " if compressed else "uncompressed", str(fp)))
-        entry_num = 0
-        # don't use a context manager here, to not close this file pointer after writing!
-        if compressed:
-            fp = gzip.GzipFile(fileobj=fp, mode="wb")
-        for entry in self.data:
-            if custom_store_callback != None:
-                entry = custom_store_callback(entry)
-            entry_num += 1
-            if not entry or ("__virtual" in entry and entry["__virtual"]):
-                continue
-            fp.write(bytes("%s\n" % formatter(entry), "UTF-8"))
-            
-            if progress_callback != None:
-                if progress_callback(entry_num, len(self.data)) == True:
-                    logger.debug("Export was aborted...")
-                    return None     # always return None on abort
+        if self._write_entries(fp, compressed, lambda entry: bytes("%s\n" % formatter(entry), "UTF-8"), progress_callback, custom_store_callback,
+                               compresslevel=compresslevel, workers=workers) != True:
+            logger.debug("Export was aborted...")
+            return None     # always return None on abort
         logger.debug("Export completed...")
-        return True     # return wrapped fp on success
+        return True     # return True on success
+    
+    # write all (non virtual) entries serialized to bytes by serialize(entry) using a RecordWriter,
+    # if span(entry) returns an (offset, length) tuple, that byte range of source_fp is copied instead
+    def _write_entries(self, fp, compressed, serialize, progress_callback=None, custom_store_callback=None, source_fp=None, span=None,
+                       compresslevel=6, workers=None, container_prefix_format=None):
+        writer = RecordWriter(fp, compressed, source_fp, compresslevel, workers, container_prefix_format)
+        try:
+            for entry_num, entry in enumerate(self.data, 1):
+                if custom_store_callback != None:
+                    entry = custom_store_callback(entry)
+                if entry and not ("__virtual" in entry and entry["__virtual"]):
+                    record = span(entry) if source_fp != None else None
+                    if record != None:
+                        writer.copy(*record, timestamp=entry.get("timestamp"))
+                    else:
+                        writer.write(serialize(entry), timestamp=entry.get("timestamp"))
+                
+                if progress_callback != None and entry_num % PROGRESS_INTERVAL == 0:
+                    if progress_callback(entry_num, len(self.data)) == True:
+                        return None     # always return None on abort
+        finally:
+            writer.close()
+        return True
     
     def getCompleterList(self, custom_extract_callback=None):
         if self.needs_custom_callbacks and custom_extract_callback == None:
@@ -298,7 +592,9 @@ class Rawlog:
         return completer_list
     
     
-    def _append_entry(self, entry, custom_load_callback=None):
+    # offset and length are the byte span of the record this entry was decoded from (None for virtual or streamed entries),
+    # entries of spilling streams get the span of their record in the spill file instead
+    def _append_entry(self, entry, custom_load_callback=None, offset=None, length=None):
         entry["__logline_index"] = len(self.data)
         if "__virtual" not in entry:
             entry["__virtual"] = False
@@ -307,7 +603,13 @@ class Rawlog:
             custom_entry = custom_load_callback(entry)
         if not custom_entry:
             return
-        self.data.append(custom_entry)
+        if isinstance(self.data, SpillingEntries):
+            # spill files contain the entries without our custom_load_callback applied (it gets applied again when paging them in)
+            offset, length = self.data.append(custom_entry, entry)
+        else:
+            self.data.append(custom_entry)
+        self.source_offsets.append(-1 if offset == None else offset)
+        self.source_lengths.append(0 if length == None else length)
     
     def _completerList_recursor(self, initial_parts, entry):
         retval = []
@@ -320,4 +622,35 @@ class Rawlog:
             if isinstance(entry[key], dict):
                 retval += self._completerList_recursor(parts, entry[key])
             retval.append("".join(parts))
-        return retval
\ No newline at end of file
+        return retval
+
+# returns the length prefixed json record of an entry as stored in rawlog files (e.g. to stream entries into a RecordWriter)
+def serialize_entry(entry):
+    json_bytes = _encode_entry(entry)
+    return struct.pack(PREFIX_FORMAT, len(json_bytes)) + json_bytes
+
+# json encode an entry to be stored without its __logline_index (without copying the entry), using orjson if available
+def _encode_entry(entry):
+    logline_index = entry.pop("__logline_index", MISSING)
+    try:
+        if hasOrjson:
+            try:
+                return orjson.dumps(entry)
+            except TypeError:
+                pass        # e.g. integers exceeding 64 bit, let the json module handle these
+        return bytes(json.dumps(entry), "UTF-8")
+    finally:
+        if logline_index is not MISSING:
+            entry["__logline_index"] = logline_index
+
+# decodes a list of json records inside a worker process,
+# decoding stops at the first record that can not be decoded (the caller will handle this one serially)
+# the decoded entries are returned marshalled, because unmarshalling them is faster than unpickling
+def _decode_json_records(blobs):
+    entries = []
+    for json_bytes in blobs:
+        try:
+            entries.append(json.loads(str(json_bytes, "UTF-8")))
+        except:
+            break
+    return marshal.dumps(entries)
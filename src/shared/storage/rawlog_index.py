@@ -0,0 +1,192 @@
+import os
+import io
+import json
+import struct
+import array
+import threading
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+INDEX_SUFFIX = ".mlvidx"                # sidecar index files are named like the rawlog file plus this suffix
+INDEX_MAGIC = b"MLVIDX"
+INDEX_VERSION = 2                       # version 1 also stored the flag and timestamp of every record
+INDEX_HEADER_FORMAT = "=6sHQQQ"         # magic, version, size and mtime_ns of the indexed rawlog file, record count
+CACHE_SIZE = 4096                       # number of decoded entries to keep in memory
+
+# offset index of a rawlog file: record number --> byte offset and length
+# virtual entries (status lines created while loading) don't have an offset and are stored as a whole instead
+class RawlogIndex:
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def clear(self):
+        self.offsets = array.array("q")     # offset of the length prefix or -1 for virtual entries
+        self.lengths = array.array("I")     # length of the json data following the length prefix
+        self.virtual = {}
+
+    def append(self, entry, offset, length):
+        if offset == None:
+            self.virtual[len(self.offsets)] = entry
+            offset = -1
+            length = 0
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def is_virtual(self, num):
+        return self.offsets[num] == -1
+
+    # returns the messages of all corruption warnings created while indexing (in record order)
+    def warnings(self):
+        return [self.virtual[num]["message"] for num in sorted(self.virtual) if self.virtual[num].get("__warning") == True]
+
+    @staticmethod
+    def sidecar_filename(filename):
+        return filename + INDEX_SUFFIX
+
+    def store_file(self, filename, source_size, source_mtime):
+        logger.debug("Storing rawlog index to '%s'..." % filename)
+        with open(filename, "wb") as fp:
+            fp.write(struct.pack(INDEX_HEADER_FORMAT, INDEX_MAGIC, INDEX_VERSION, source_size, source_mtime, len(self)))
+            self.offsets.tofile(fp)
+            self.lengths.tofile(fp)
+            blob = bytes(json.dumps({str(num): entry for num, entry in self.virtual.items()}), "UTF-8")
+            fp.write(struct.pack("=Q", len(blob)))
+            fp.write(blob)
+
+    # returns None if the index file does not exist or does not match the given source file size and mtime
+    @staticmethod
+    def load_file(filename, source_size, source_mtime):
+        if not os.path.isfile(filename):
+            return None
+        logger.debug("Loading rawlog index from '%s'..." % filename)
+        header_length = struct.calcsize(INDEX_HEADER_FORMAT)
+        with open(filename, "rb") as fp:
+            header = fp.read(header_length)
+            if len(header) != header_length:
+                logger.warning("Ignoring truncated rawlog index: '%s'" % filename)
+                return None
+            magic, version, size, mtime, count = struct.unpack(INDEX_HEADER_FORMAT, header)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                logger.warning("Ignoring rawlog index having unknown format: '%s'" % filename)
+                return None
+            if size != source_size or mtime != source_mtime:
+                logger.info("Ignoring stale rawlog index: '%s'" % filename)
+                return None
+            index = RawlogIndex()
+            try:
+                index.offsets.fromfile(fp, count)
+                index.lengths.fromfile(fp, count)
+                blob_length = struct.unpack("=Q", fp.read(struct.calcsize("=Q")))[0]
+                blob = fp.read(blob_length)
+            except (EOFError, struct.error):
+                logger.warning("Ignoring truncated rawlog index: '%s'" % filename)
+                return None
+            index.virtual = {int(num): entry for num, entry in json.loads(str(blob, "UTF-8")).items()}
+        return index
+
+# list like object decoding rawlog entries on demand using a RawlogIndex and the (uncompressed) rawlog fp
+# a bounded number of decoded entries is cached, entries assigned or appended are held in memory
+# entries modified in place have to be assigned back (e.g. by Rawlog.mark_modified()) to survive being evicted from our cache
+# only appended entries can be deleted, entries of the indexed file can only be replaced
+# load_callback(entry) creates the (custom) entry to hold for every decoded entry (it gets called again once an entry got evicted)
+# entries can be read by multiple threads at once (e.g. while the ui thread appends), our fp and cache are guarded by a lock
+class LazyRawlogEntries:
+    def __init__(self, index, fp, prefix_length, load_callback=None):
+        self.index = index
+        self.fp = fp
+        self.prefix_length = prefix_length
+        self.load_callback = load_callback
+        self.cache = collections.OrderedDict()
+        self.overrides = {}
+        self.appended = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index) + len(self.appended)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[num] for num in range(*key.indices(len(self)))]
+        num = self._normalize(key)
+        with self.lock:
+            if num >= len(self.index):
+                return self.appended[num - len(self.index)]
+            if num in self.overrides:
+                return self.overrides[num]
+            if num in self.cache:
+                self.cache.move_to_end(num)
+                return self.cache[num]
+            entry = self._decode(num)
+            self.cache[num] = entry
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+            return entry
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            nums = range(*key.indices(len(self)))
+            if len(nums) != len(value):
+                raise ValueError("Entries of lazily loaded rawlog files can not be resized using slices!")
+            for num, entry in zip(nums, value):
+                self[num] = entry
+            return
+        num = self._normalize(key)
+        with self.lock:
+            if num >= len(self.index):
+                self.appended[num - len(self.index)] = value
+            else:
+                self.cache.pop(num, None)
+                self.overrides[num] = value
+
+    def __delitem__(self, key):
+        nums = range(*key.indices(len(self))) if isinstance(key, slice) else [self._normalize(key)]
+        if len(nums) > 0 and min(nums) < len(self.index):
+            raise IndexError("Entries of lazily loaded rawlog files can not be deleted (only appended ones)!")
+        with self.lock:
+            for num in sorted(nums, reverse=True):
+                del self.appended[num - len(self.index)]
+
+    # iterating decodes entries without evicting the ones cached
+    def __iter__(self):
+        for num in range(len(self)):
+            with self.lock:
+                if num >= len(self.index):
+                    entry = self.appended[num - len(self.index)]
+                elif num in self.overrides:
+                    entry = self.overrides[num]
+                elif num in self.cache:
+                    entry = self.cache[num]
+                else:
+                    entry = self._decode(num)
+            yield entry
+
+    def append(self, entry):
+        with self.lock:
+            self.appended.append(entry)
+
+    def close(self):
+        with self.lock:
+            self.cache.clear()
+            self.fp.close()
+
+    def _normalize(self, key):
+        num = key + len(self) if key < 0 else key
+        if num < 0 or num >= len(self):
+            raise IndexError("rawlog index out of range")
+        return num
+
+    # our lock has to be held while calling this (our fp is shared by all threads)
+    def _decode(self, num):
+        if self.index.is_virtual(num):
+            entry = dict(self.index.virtual[num])
+        else:
+            self.fp.seek(self.index.offsets[num] + self.prefix_length, io.SEEK_SET)
+            entry = json.loads(str(self.fp.read(self.index.lengths[num]), "UTF-8"))
+        entry["__logline_index"] = num
+        if "__virtual" not in entry:
+            entry["__virtual"] = False
+        return self.load_callback(entry) if self.load_callback != None else entry
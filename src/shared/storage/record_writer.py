@@ -0,0 +1,124 @@
+import os
+import io
+import gzip
+import logging
+
+from shared.utils import ParallelGzipWriter
+from .block_container import BlockContainerWriter
+
+logger = logging.getLogger(__name__)
+WRITE_CHUNK_SIZE = 1024 * 1024              # bytes to collect before writing them to the fp
+COPY_CHUNK_SIZE = 1024 * 1024               # bytes to read at once when copying byte ranges of the source the hard way
+UNKNOWN = object()
+
+# buffered writer used to store or export rawlog data: records are collected into large chunks before writing them to the fp
+# byte ranges of a source fp (e.g. the unmodified records of the rawlog file we loaded) can be copied instead of writing
+# bytes, adjacent ranges get merged into one copy and are copied by the kernel (copy_file_range or sendfile) if possible
+# compressed data is deflated by a ParallelGzipWriter using workers threads (None uses all cores, 1 compresses in this thread)
+# if container_prefix_format is given, a block container is written instead (see BlockContainerWriter, compressed is ignored then),
+# every write() or copy() has to be exactly one record then and its timestamp should be given to spare decoding the record again
+# the fp is not closed by close(), but the gzip trailer (or container footer) gets written
+class RecordWriter:
+    def __init__(self, fp, compressed, source_fp=None, compresslevel=6, workers=None, container_prefix_format=None):
+        self.raw_fp = fp
+        self.container = None
+        if container_prefix_format != None:
+            self.fp = self.container = BlockContainerWriter(fp, container_prefix_format, compresslevel, workers)
+        elif not compressed:
+            self.fp = fp
+        elif workers == 1:
+            self.fp = gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=compresslevel)
+        else:
+            self.fp = ParallelGzipWriter(fp, compresslevel, workers)
+        self.source_fp = source_fp
+        self.buffer = bytearray()
+        self.pending_range = None       # [offset, length] of the source range to copy next
+        self.copy_method = None
+        if self.fp is fp and source_fp != None:
+            try:
+                source_fp.fileno()
+                fp.fileno()
+                self.copy_method = "copy_file_range" if hasattr(os, "copy_file_range") else "sendfile" if hasattr(os, "sendfile") else None
+            except (AttributeError, io.UnsupportedOperation):
+                pass        # e.g. BytesIO or seekable gzip files don't have a file descriptor
+        self.copied = 0                 # bytes copied from our source (statistics only)
+
+    def write(self, data, timestamp=UNKNOWN):
+        if self.container != None and timestamp is not UNKNOWN:
+            self.container.add_timestamp(timestamp)
+        if self.pending_range != None:
+            self._flush_range()
+        self.buffer += data
+        if len(self.buffer) >= WRITE_CHUNK_SIZE:
+            self._flush_buffer()
+
+    def copy(self, offset, length, timestamp=UNKNOWN):
+        if self.container != None and timestamp is not UNKNOWN:
+            self.container.add_timestamp(timestamp)
+        if self.pending_range != None and self.pending_range[0] + self.pending_range[1] == offset:
+            self.pending_range[1] += length
+            return
+        if self.pending_range != None:
+            self._flush_range()
+        self.pending_range = [offset, length]
+
+    def close(self):
+        try:
+            if self.pending_range != None:
+                self._flush_range()
+            self._flush_buffer()
+        finally:
+            # this writes the gzip trailer (or container footer) but does not close the underlying fp
+            if self.fp is not self.raw_fp:
+                self.fp.close()
+        if self.copied > 0:
+            logger.debug("Copied %d bytes from source using %s..." % (self.copied, self.copy_method or "read/write"))
+
+    def _flush_buffer(self):
+        if len(self.buffer) > 0:
+            self.fp.write(self.buffer)
+            self.buffer.clear()
+
+    def _flush_range(self):
+        self._flush_buffer()        # keep our records in order
+        offset, length = self.pending_range
+        self.pending_range = None
+        self.copied += length
+        if self.copy_method != None:
+            copied = self._kernel_copy(offset, length)
+            offset += copied
+            length -= copied
+        while length > 0:
+            self.source_fp.seek(offset, io.SEEK_SET)
+            data = self.source_fp.read(min(length, COPY_CHUNK_SIZE))
+            if len(data) == 0:
+                raise EOFError("Source ended before all records could be copied!")
+            self.fp.write(data)
+            offset += len(data)
+            length -= len(data)
+
+    # returns the number of bytes copied, this is less than length if the kernel can not copy these files
+    def _kernel_copy(self, offset, length):
+        self.fp.flush()
+        in_fd = self.source_fp.fileno()
+        out_fd = self.fp.fileno()
+        position = self.fp.tell()
+        copied = 0
+        while self.copy_method != None and copied < length:
+            try:
+                if self.copy_method == "copy_file_range":
+                    count = os.copy_file_range(in_fd, out_fd, length - copied, offset + copied, position + copied)
+                else:
+                    os.lseek(out_fd, position + copied, os.SEEK_SET)
+                    count = os.sendfile(out_fd, in_fd, offset + copied, length - copied)
+            except OSError:
+                # e.g. copy_file_range between different filesystems on old kernels or sendfile not supporting files as target
+                logger.debug("Could not copy using %s, falling back..." % self.copy_method, exc_info=True)
+                self.copy_method = "sendfile" if self.copy_method == "copy_file_range" and hasattr(os, "sendfile") else None
+                continue
+            if count == 0:
+                raise EOFError("Source ended before all records could be copied!")
+            copied += count
+        # let our fp know the position we copied up to
+        self.fp.seek(position + copied, io.SEEK_SET)
+        return copied
@@ -0,0 +1,176 @@
+import os
+import io
+import json
+import struct
+import array
+import tempfile
+import threading
+import collections
+import logging
+
+try:
+    import orjson
+    hasOrjson = True
+except ImportError:
+    hasOrjson = False
+
+logger = logging.getLogger(__name__)
+CACHE_SIZE = 4096                       # number of spilled entries to keep in memory once they got paged in again
+SPILL_HYSTERESIS = 8                    # spill 1/8 of our limits at once instead of single entries when exceeding them
+
+# list like object of rawlog entries holding only the most recent entries in memory (at most max_entries entries or max_bytes
+# bytes of encoded json data, None disables that limit), every appended entry is written to an append-only segment file
+# (a plain uncompressed rawlog file using prefix_format) and older entries are paged in from there on access
+# if filename is None a temporary segment file is used and deleted by close(), otherwise the segment file is kept
+# append(entry, record) needs the entry as it should be stored (record) additionally to the (possibly custom) entry to hold
+# encode(record) returns the json bytes of a record, load_callback(record) creates the (custom) entry again for paged in records
+# entries modified in place have to be assigned back to survive being spilled (modifications are held in memory)
+# entries can be read by multiple threads at once (e.g. while the ui thread appends), our reader and cache are guarded by a lock
+class SpillingEntries:
+    def __init__(self, prefix_format, encode, load_callback=None, max_entries=None, max_bytes=None, filename=None):
+        self.prefix = struct.Struct(prefix_format)
+        self.encode = encode
+        self.load_callback = load_callback
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        if filename == None:
+            fd, filename = tempfile.mkstemp(prefix="rawlog-", suffix=".spill")
+            os.close(fd)
+            self.temporary = True
+        else:
+            self.temporary = False
+        self.filename = filename
+        self.writer = open(filename, "wb")
+        self.reader = open(filename, "rb")
+        self.written = 0                        # bytes written to our segment file (the reader can only see flushed ones)
+        self.flushed = 0
+        self.offsets = array.array("q")         # offset of the length prefix of every record in our segment file
+        self.lengths = array.array("I")         # length of the json data following the length prefix
+        self.spilled = 0                        # number of entries not held in memory anymore (always the oldest ones)
+        self.resident = []                      # entries not spilled yet
+        self.resident_bytes = 0
+        self.cache = collections.OrderedDict()
+        self.overrides = {}
+        self.lock = threading.Lock()
+        logger.debug("Spilling rawlog entries to '%s'..." % self.filename)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[num] for num in range(*key.indices(len(self)))]
+        num = self._normalize(key)
+        with self.lock:
+            if num in self.overrides:
+                return self.overrides[num]
+            if num >= self.spilled:
+                return self.resident[num - self.spilled]
+            if num in self.cache:
+                self.cache.move_to_end(num)
+                return self.cache[num]
+            entry = self._load(num)
+            self.cache[num] = entry
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+            return entry
+
+    def __setitem__(self, key, value):
+        num = self._normalize(key)
+        with self.lock:
+            if num >= self.spilled:
+                self.resident[num - self.spilled] = value
+            self.cache.pop(num, None)
+            self.overrides[num] = value
+
+    # iterating pages in spilled entries without evicting the ones cached
+    def __iter__(self):
+        for num in range(len(self)):
+            with self.lock:
+                if num in self.overrides:
+                    entry = self.overrides[num]
+                elif num >= self.spilled:
+                    entry = self.resident[num - self.spilled]
+                elif num in self.cache:
+                    entry = self.cache[num]
+                else:
+                    entry = self._load(num)
+            yield entry
+
+    # returns the (offset, length) span of the record written to our segment file
+    def append(self, entry, record):
+        json_bytes = self.encode(record)
+        with self.lock:
+            offset = self.written
+            self.writer.write(self.prefix.pack(len(json_bytes)))
+            self.writer.write(json_bytes)
+            self.written += self.prefix.size + len(json_bytes)
+            self.resident.append(entry)
+            self.resident_bytes += len(json_bytes)
+            self.lengths.append(len(json_bytes))
+            self.offsets.append(offset)         # this makes the new entry visible to other threads (see __len__)
+            if self._over_limit(len(self.resident), self.resident_bytes):
+                self._spill()
+        return (offset, len(json_bytes))
+
+    # returns a new (seekable) fp of our segment file containing all records appended so far
+    def open_segment(self):
+        with self.lock:
+            self._flush()
+        return open(self.filename, "rb")
+
+    def close(self):
+        with self.lock:
+            self.resident.clear()
+            self.cache.clear()
+            self.overrides.clear()
+            self.writer.close()
+            self.reader.close()
+        if self.temporary:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                logger.warning("Could not remove spill file '%s'..." % self.filename, exc_info=True)
+
+    # returns True if count entries of size bytes exceed our limits (lowered by 1/SPILL_HYSTERESIS if hysteresis is True)
+    def _over_limit(self, count, size, hysteresis=False):
+        for value, limit in ((count, self.max_entries), (size, self.max_bytes)):
+            if limit != None and value > (limit - limit // SPILL_HYSTERESIS if hysteresis else limit):
+                return True
+        return False
+
+    # drop the oldest resident entries until we are well below our limits (they can be paged in from our segment file)
+    def _spill(self):
+        count = 0
+        size = self.resident_bytes
+        while count < len(self.resident) and self._over_limit(len(self.resident) - count, size, hysteresis=True):
+            size -= self.lengths[self.spilled + count]
+            count += 1
+        del self.resident[:count]
+        self.spilled += count
+        self.resident_bytes = size
+        logger.debug("Spilled %d entries, %d entries (%d bytes) are still held in memory..." % (count, len(self.resident), size))
+
+    def _normalize(self, key):
+        num = key + len(self) if key < 0 else key
+        if num < 0 or num >= len(self):
+            raise IndexError("rawlog index out of range")
+        return num
+
+    # our lock has to be held while calling this
+    def _flush(self):
+        if self.flushed != self.written:
+            self.writer.flush()
+            self.flushed = self.written
+
+    # our lock has to be held while calling this (our reader is shared by all threads)
+    def _load(self, num):
+        if self.offsets[num] + self.prefix.size + self.lengths[num] > self.flushed:
+            self._flush()
+        self.reader.seek(self.offsets[num] + self.prefix.size, io.SEEK_SET)
+        json_bytes = self.reader.read(self.lengths[num])
+        record = orjson.loads(json_bytes) if hasOrjson else json.loads(str(json_bytes, "UTF-8"))
+        record["__logline_index"] = num
+        if "__virtual" not in record:
+            record["__virtual"] = False
+        return self.load_callback(record) if self.load_callback != None else record
@@ -0,0 +1,187 @@
+import os
+import gzip
+import json
+import zlib
+import time
+import socket
+import select
+import hashlib
+import threading
+import logging
+
+try:
+    import orjson
+    hasOrjson = True
+except ImportError:
+    hasOrjson = False
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    hasCrypto = True
+except ImportError:
+    hasCrypto = False
+
+logger = logging.getLogger(__name__)
+RING_SIZE = 65536                       # number of received packets that can wait for being decoded
+RECV_BATCH_SIZE = 256                   # maximum number of packets to read from the socket before handing them to our ring buffer
+DECODE_BATCH_SIZE = 1024                # default maximum number of packets decoded by one read() call
+SOCKET_BUFFER_SIZE = 8 * 1024 * 1024    # requested kernel receive buffer size (bursts have to fit in here while we are busy)
+MAX_PACKET_SIZE = 65535
+POLL_INTERVAL = 0.25                    # seconds to wait for packets before checking if we should stop
+IV_LENGTH = 12
+TAG_LENGTH = 16
+
+# preallocated ring buffer of fixed capacity used to hand over items from one producer thread to one consumer thread,
+# items not fitting into the buffer are dropped (and counted by the producer) instead of blocking the producer
+class RingBuffer:
+    def __init__(self, capacity):
+        self.slots = [None] * capacity
+        self.capacity = capacity
+        self.head = 0           # slot of the next item to get
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    # returns the number of items stored, all other items were dropped
+    def put_many(self, items):
+        with self.lock:
+            stored = min(self.capacity - self.count, len(items))
+            for i in range(stored):
+                self.slots[(self.head + self.count + i) % self.capacity] = items[i]
+            self.count += stored
+        return stored
+
+    def get_many(self, max_items):
+        with self.lock:
+            items = []
+            for i in range(min(self.count, max_items)):
+                slot = (self.head + i) % self.capacity
+                items.append(self.slots[slot])
+                self.slots[slot] = None
+            self.head = (self.head + len(items)) % self.capacity
+            self.count -= len(items)
+        return items
+
+# derives the aes key used by monal's udp logger from the key (password) configured in the app
+def derive_key(key):
+    return hashlib.sha256(bytes(key, "UTF-8")).digest()
+
+# packets are gzip compressed json entries, encrypted using aes-gcm (iv + tag + ciphertext) if a key is used
+def encode_packet(entry, aesgcm=None):
+    payload = gzip.compress(orjson.dumps(entry) if hasOrjson else bytes(json.dumps(entry), "UTF-8"))
+    if aesgcm == None:
+        return payload
+    iv = os.urandom(IV_LENGTH)
+    encrypted = aesgcm.encrypt(iv, payload, None)     # ciphertext followed by the tag
+    return iv + encrypted[-TAG_LENGTH:] + encrypted[:-TAG_LENGTH]
+
+def decode_packet(packet, aesgcm=None):
+    if aesgcm != None:
+        iv = packet[:IV_LENGTH]
+        tag = packet[IV_LENGTH:IV_LENGTH + TAG_LENGTH]
+        packet = aesgcm.decrypt(iv, packet[IV_LENGTH + TAG_LENGTH:] + tag, None)
+    payload = zlib.decompress(packet, zlib.MAX_WBITS | 32)      # accept gzip and zlib headers
+    return orjson.loads(payload) if hasOrjson else json.loads(str(payload, "UTF-8"))
+
+# receiver for the log packets sent by monal's udp logger (key is the key configured in the app or None if not encrypted)
+# a background thread reads all packets available in batches and stores them into a preallocated ring buffer,
+# read() decodes (decrypts, decompresses and json decodes) batches of these packets in the thread calling it
+# all counters are exposed by statistics(): received, dropped (ring buffer full), decoded, failed (could not be decoded)
+# and late (the _counter of an entry is lower than the highest one already decoded for its process)
+class UdpServer:
+    def __init__(self, key, host="::", port=5555, ring_size=RING_SIZE):
+        if key != None and not hasCrypto:
+            raise RuntimeError("The cryptography package is needed to receive encrypted log packets!")
+        self.aesgcm = AESGCM(derive_key(key)) if key != None else None
+        self.ring = RingBuffer(ring_size)
+        self.counters = {"received": 0, "dropped": 0, "decoded": 0, "failed": 0, "late": 0}
+        self.last_counters = {}         # processID --> highest _counter decoded
+        self.sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_DGRAM)
+        if self.sock.family == socket.AF_INET6:
+            self.sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)       # accept ipv4 packets, too
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        except OSError:
+            logger.warning("Could not set socket receive buffer size to %d bytes..." % SOCKET_BUFFER_SIZE, exc_info=True)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._receive, name="UdpServer", daemon=True)
+        self.thread.start()
+        logger.info("Listening for log packets on %s..." % str(self.address[:2]))
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.sock.close()
+        logger.info("Stopped listening for log packets: %s" % str(self.statistics()))
+
+    def statistics(self):
+        return dict(self.counters, pending=len(self.ring))
+
+    # returns a list of up to max_entries decoded entries (packets that could not be decoded are counted and skipped)
+    def read(self, max_entries=DECODE_BATCH_SIZE):
+        entries = []
+        for packet in self.ring.get_many(max_entries):
+            try:
+                entry = decode_packet(packet, self.aesgcm)
+                if not isinstance(entry, dict):
+                    raise ValueError("Log packet does not contain a json object!")
+            except Exception:
+                logger.debug("Could not decode log packet of %d bytes..." % len(packet), exc_info=True)
+                self.counters["failed"] += 1
+                continue
+            self.counters["decoded"] += 1
+            if "_counter" in entry:
+                processID = entry.get("_processID")
+                if processID in self.last_counters and entry["_counter"] < self.last_counters[processID]:
+                    self.counters["late"] += 1
+                else:
+                    self.last_counters[processID] = entry["_counter"]
+            entries.append(entry)
+        return entries
+
+    def _receive(self):
+        while not self.stopped.is_set():
+            readable, _, _ = select.select([self.sock], [], [], POLL_INTERVAL)
+            if len(readable) == 0:
+                continue
+            # python has no recvmmsg(), read everything available (up to RECV_BATCH_SIZE packets) using non-blocking reads instead
+            packets = []
+            while len(packets) < RECV_BATCH_SIZE:
+                try:
+                    packets.append(self.sock.recv(MAX_PACKET_SIZE))
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    logger.debug("Error receiving log packet...", exc_info=True)
+                    break
+            if len(packets) == 0:
+                continue
+            stored = self.ring.put_many(packets)
+            self.counters["received"] += len(packets)
+            if stored != len(packets):
+                self.counters["dropped"] += len(packets) - stored
+
+# sends all (non virtual) entries like monal's udp logger does (e.g. to test an UdpServer by replaying a rawlog),
+# rate limits the number of packets sent per second (None sends as fast as possible), returns the number of packets sent
+def send_entries(entries, key, host="::1", port=5555, rate=None):
+    if key != None and not hasCrypto:
+        raise RuntimeError("The cryptography package is needed to send encrypted log packets!")
+    aesgcm = AESGCM(derive_key(key)) if key != None else None
+    address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+    sent = 0
+    start = time.monotonic()
+    with socket.socket(address[0], socket.SOCK_DGRAM) as sock:
+        for entry in entries:
+            if entry.get("__virtual"):
+                continue
+            sock.sendto(encode_packet({name: value for name, value in entry.items() if not name.startswith("__")}, aesgcm), address[4])
+            sent += 1
+            if rate != None:
+                delay = start + sent / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    return sent
@@ -3,3 +3,5 @@ from .exceptions import catch_exceptions
 from .lambda_hack import LambdaValueContainer
 from .paths import Paths
 from .compressed_file_helpers import is_gzip_file, gzip_file_size, is_lzma_file
+from .seekable_gzip import SeekableGzipFile, open_seekable_gzip
+from .parallel_gzip import ParallelGzipWriter
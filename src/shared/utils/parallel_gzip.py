@@ -0,0 +1,80 @@
+import io
+import os
+import zlib
+import struct
+import time
+import collections
+import concurrent.futures
+
+import logging
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024        # uncompressed bytes compressed by one worker at once
+DICT_SIZE = 32 * 1024           # the last 32 KiB of the previous block are used as dictionary (like pigz does)
+
+# pigz-style gzip writer compressing blocks of data in parallel using a thread pool (zlib releases the gil while compressing):
+# every block is compressed to raw deflate data ending on a byte boundary (sync flush), primed with the end of the previous block
+# as dictionary, these deflate streams are concatenated into one single member gzip file readable by every gzip implementation
+# the crc32 of the uncompressed data is calculated serially while queueing blocks (that's much faster than deflating)
+# the fp is not closed by close(), but the gzip trailer gets written
+class ParallelGzipWriter(io.RawIOBase):
+    def __init__(self, fileobj, compresslevel=6, workers=None, block_size=BLOCK_SIZE):
+        super().__init__()
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.workers = workers if workers != None else (os.cpu_count() or 1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = collections.deque()      # futures of queued blocks in output order
+        self.buffer = bytearray()
+        self.dictionary = b""
+        self.crc = 0
+        self.size = 0
+        # gzip header: magic, deflate, no flags, mtime, no extra flags, unknown os
+        self.fileobj.write(struct.pack("<BBBBLBB", 0x1f, 0x8b, 8, 0, int(time.time()), 0, 255))
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._queue(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if len(self.buffer) > 0:
+                self._queue(bytes(self.buffer))
+                self.buffer.clear()
+            while len(self.pending) > 0:
+                self.fileobj.write(self.pending.popleft().result())
+            # an empty final deflate block terminates the stream
+            self.fileobj.write(zlib.compressobj(self.compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH))
+            self.fileobj.write(struct.pack("<LL", self.crc, self.size & 0xffffffff))
+        finally:
+            for future in self.pending:
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            super().close()
+
+    def _queue(self, block):
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        self.pending.append(self.executor.submit(_deflate_block, block, self.dictionary, self.compresslevel))
+        self.dictionary = block[-DICT_SIZE:]
+        # limit the memory used by compressed blocks waiting to be written
+        while len(self.pending) > self.workers * 2:
+            self.fileobj.write(self.pending.popleft().result())
+
+def _deflate_block(block, dictionary, compresslevel):
+    if len(dictionary) > 0:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
@@ -0,0 +1,147 @@
+import io
+import zlib
+import bisect
+
+import logging
+logger = logging.getLogger(__name__)
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS        # let zlib parse gzip headers and trailers
+CHECKPOINT_SPACING = 4 * 1024 * 1024    # create an inflate checkpoint every 4 MiB of uncompressed data
+READ_SIZE = 64 * 1024                   # compressed bytes to read at once
+CHUNK_SIZE = 256 * 1024                 # maximum uncompressed bytes to inflate at once
+
+# zran-style random access to gzip files (see zran.c in the zlib distribution):
+# while inflating, a copy of the inflate state is recorded every CHECKPOINT_SPACING bytes of uncompressed data,
+# seeking restores the nearest checkpoint before the target position instead of inflating from the beginning
+# checkpoints are only held in memory, but get created lazily by every forward read
+# multi-member gzip files (e.g. written by pigz) are supported, too
+class SeekableGzipFile(io.RawIOBase):
+    def __init__(self, fileobj, spacing=CHECKPOINT_SPACING):
+        super().__init__()
+        self.fileobj = fileobj
+        self.spacing = spacing
+        self.size = None                # uncompressed size, known once EOF was reached
+        self.fileobj.seek(0, io.SEEK_END)
+        self.compressed_size = self.fileobj.tell()
+        # list of checkpoints: (uncompressed offset, compressed offset, inflate state), sorted by uncompressed offset
+        self.checkpoints = []
+        self.checkpoint_offsets = []    # uncompressed offsets of all checkpoints (needed for bisect)
+        self._add_checkpoint(0, 0, zlib.decompressobj(GZIP_WBITS))
+        self._restore(self.checkpoints[0])
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    # position in the compressed file, useful for progress calculation (uncompressed sizes are not known in advance)
+    def compressed_tell(self):
+        return self._in_pos - len(self._input)
+
+    def readinto(self, b):
+        if len(self._buffer) == self._buffer_pos:
+            self._buffer = self._inflate()
+            self._buffer_pos = 0
+        size = min(len(b), len(self._buffer) - self._buffer_pos)
+        b[:size] = self._buffer[self._buffer_pos:self._buffer_pos + size]
+        self._buffer_pos += size
+        self._pos += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self._pos + offset
+        elif whence == io.SEEK_END:
+            if self.size == None:
+                self._skip(-1)          # inflate everything to learn our uncompressed size
+            target = self.size + offset
+        else:
+            raise ValueError("Invalid whence value: %s" % str(whence))
+        if target < 0:
+            raise ValueError("Negative seek position %d" % target)
+
+        # seek inside our current buffer if possible
+        buffer_start = self._pos - self._buffer_pos
+        if buffer_start <= target <= buffer_start + len(self._buffer):
+            self._buffer_pos = target - buffer_start
+            self._pos = target
+            return self._pos
+
+        # restore the nearest checkpoint if we would have to go backwards or it is nearer than our current position
+        checkpoint = self.checkpoints[bisect.bisect_right(self.checkpoint_offsets, target) - 1]
+        if target < self._pos or checkpoint[0] > self._pos:
+            logger.debug("Restoring gzip checkpoint at %d to seek to %d..." % (checkpoint[0], target))
+            self._restore(checkpoint)
+        self._skip(target - self._pos)
+        return self._pos
+
+    def close(self):
+        self.checkpoints = []
+        self.checkpoint_offsets = []
+        self.fileobj.close()
+        super().close()
+
+    # read and discard size bytes or everything up to EOF if size is negative
+    def _skip(self, size):
+        while size != 0:
+            if len(self._buffer) == self._buffer_pos:
+                self._buffer = self._inflate()
+                self._buffer_pos = 0
+                if len(self._buffer) == 0:
+                    break
+            step = len(self._buffer) - self._buffer_pos
+            if size > 0:
+                step = min(step, size)
+                size -= step
+            self._buffer_pos += step
+            self._pos += step
+
+    def _add_checkpoint(self, out_pos, in_pos, state):
+        self.checkpoints.append((out_pos, in_pos, state))
+        self.checkpoint_offsets.append(out_pos)
+
+    def _restore(self, checkpoint):
+        out_pos, in_pos, state = checkpoint
+        self._decompressor = state.copy()       # keep our checkpoint pristine
+        self.fileobj.seek(in_pos, io.SEEK_SET)
+        self._in_pos = in_pos
+        self._input = b""
+        self._out_pos = out_pos         # uncompressed position after the last inflated chunk
+        self._pos = out_pos             # uncompressed position of the caller
+        self._buffer = b""
+        self._buffer_pos = 0
+
+    # inflate and return the next chunk of uncompressed data (returns an empty bytes object on EOF)
+    def _inflate(self):
+        while True:
+            if len(self._input) == 0:
+                self._input = self.fileobj.read(READ_SIZE)
+                self._in_pos += len(self._input)
+                if len(self._input) == 0:
+                    if not self._decompressor.eof:
+                        logger.warning("Compressed file ended before the end-of-stream marker was reached!")
+                    self.size = self._out_pos
+                    return b""
+            if self._decompressor.eof:
+                # start the next gzip member, ignoring zero padding between members like the gzip module does
+                self._input = self._input.lstrip(b"\x00")
+                if len(self._input) != 0:
+                    self._decompressor = zlib.decompressobj(GZIP_WBITS)
+                continue
+            chunk = self._decompressor.decompress(self._input, CHUNK_SIZE)
+            self._input = self._decompressor.unused_data if self._decompressor.eof else self._decompressor.unconsumed_tail
+            if len(chunk) == 0:
+                continue
+            self._out_pos += len(chunk)
+            if self._out_pos >= self.checkpoint_offsets[-1] + self.spacing:
+                self._add_checkpoint(self._out_pos, self.compressed_tell(), self._decompressor.copy())
+            return chunk
+
+def open_seekable_gzip(fileobj, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    return io.BufferedReader(SeekableGzipFile(fileobj), buffer_size)
@@ -0,0 +1,150 @@
+import os
+import io
+import datetime
+import tempfile
+import unittest
+
+from shared.storage import Rawlog
+from shared.storage.rawlog import PREFIX_FORMAT, serialize_entry
+from shared.storage.block_container import (BlockContainerWriter, BlockContainerFile, open_block_container, is_block_container,
+                                            parse_timestamp, parse_time_range, epoch_microseconds)
+
+# entries one second apart, alternately logged in UTC and UTC+1
+def make_entries(count):
+    entries = []
+    for num in range(count):
+        moment = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=num, milliseconds=7)
+        if num % 2 == 1:
+            moment = moment.astimezone(datetime.timezone(datetime.timedelta(hours=1)))
+        entries.append({"timestamp": moment.isoformat(timespec="milliseconds"), "message": "message %d" % num})
+    return entries
+
+def strip(entries):
+    return [{key: value for key, value in entry.items() if key not in ("__logline_index", "__virtual")} for entry in entries]
+
+def write_container(entries, announce, records_per_block=10):
+    fp = io.BytesIO()
+    writer = BlockContainerWriter(fp, PREFIX_FORMAT, records_per_block=records_per_block, workers=2)
+    for entry in entries:
+        if announce:
+            writer.add_timestamp(entry.get("timestamp"))
+        writer.write(serialize_entry(entry))
+    writer.close()
+    return fp
+
+class BlockContainerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        entries = make_entries(10000)
+        rawlog = Rawlog()
+        rawlog.data = [dict(entry) for entry in entries]
+        filename = os.path.join(self.tmpdir.name, "test.rawlog.blk")
+        self.assertTrue(rawlog.store_file(filename))
+        with open(filename, "rb") as fp:
+            self.assertTrue(is_block_container(fp))
+        for workers in (None, 4):
+            loaded = Rawlog()
+            self.assertTrue(loaded.load_file(filename, workers=workers))
+            self.assertEqual(strip(loaded.data), entries)
+        loaded = Rawlog()
+        self.assertTrue(loaded.load_file(filename, lazy=True))
+        self.assertEqual(strip(loaded.data), entries)
+
+    def test_empty(self):
+        fp = open_block_container(write_container([], True))
+        self.assertEqual(fp.raw.blocks, [])
+        self.assertEqual(fp.read(), b"")
+
+    def test_block_bounds(self):
+        entries = make_entries(25)
+        entries[12].pop("timestamp")
+        for announce in (True, False):
+            blocks = BlockContainerFile(write_container(entries, announce)).blocks
+            self.assertEqual([block[3] for block in blocks], [10, 10, 5])
+            self.assertEqual(blocks[0][4:], [epoch_microseconds(parse_timestamp(entries[num]["timestamp"])) for num in (0, 9)])
+            self.assertEqual(blocks[1][4:], [None, None])       # one of its records has no timestamp
+            self.assertEqual(blocks[2][4:], [epoch_microseconds(parse_timestamp(entries[num]["timestamp"])) for num in (20, 24)])
+
+    def test_seek(self):
+        entries = make_entries(95)
+        data = b"".join(serialize_entry(entry) for entry in entries)
+        fp = open_block_container(write_container(entries, True), 64)
+        for offset in (len(data) // 2, 0, len(data) - 3, 123):
+            self.assertEqual(fp.seek(offset), offset)
+            self.assertEqual(fp.read(500), data[offset:offset + 500])
+        self.assertEqual(fp.seek(-5, io.SEEK_END), len(data) - 5)
+        self.assertEqual(fp.read(), data[-5:])
+
+    def test_select_blocks(self):
+        entries = make_entries(35)
+        records = [serialize_entry(entry) for entry in entries]
+        container = BlockContainerFile(write_container(entries, True))
+        self.assertEqual(container.blocks_in_range(parse_time_range(("2024-01-01T00:00:12Z", "2024-01-01T00:00:21Z"))), [1, 2])
+        self.assertEqual(container.blocks_in_range(parse_time_range((None, "2023-12-31T23:59:59Z"))), [])
+        self.assertEqual(container.blocks_in_range(parse_time_range(("2024-01-01T00:00:25+0000", None))), [2, 3])
+        container.select_blocks([1, 3])
+        fp = io.BufferedReader(container)
+        # positions stay those of the complete data, other blocks are skipped
+        self.assertEqual(fp.read(), b"".join(records[10:20] + records[30:]))
+        fp.seek(0)
+        self.assertEqual(fp.read(len(records[10])), records[10])
+        self.assertEqual(fp.tell(), sum(len(record) for record in records[:11]))
+
+    def test_truncated(self):
+        data = write_container(make_entries(20), True).getvalue()
+        with self.assertRaises(ValueError):
+            BlockContainerFile(io.BytesIO(data[:-4]))
+
+class TimeRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rawlog = Rawlog()
+        rawlog.data = make_entries(20)
+        rawlog.data.append({"timestamp": "not a timestamp", "message": "unparsable"})
+        self.filenames = [os.path.join(self.tmpdir.name, name) for name in ("test.rawlog", "test.rawlog.gz", "test.rawlog.blk")]
+        for filename in self.filenames:
+            rawlog.store_file(filename)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def query(self, time_range):
+        results = [[entry["message"] for entry in Rawlog().iterate_file(filename, time_range=time_range)] for filename in self.filenames]
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+        loaded = Rawlog()
+        loaded.load_file(self.filenames[-1], time_range=time_range)
+        self.assertEqual([entry["message"] for entry in loaded.data], results[0])
+        return [int(message.split(" ")[1]) for message in results[0] if message != "unparsable"]
+
+    def test_parse_time_range(self):
+        start, end = parse_time_range(("2024-01-01T00:00:05+0100", "2024-01-01T00:00:07"))
+        self.assertEqual(start, datetime.datetime(2023, 12, 31, 23, 0, 5, tzinfo=datetime.timezone.utc))
+        self.assertEqual(end, datetime.datetime(2024, 1, 1, 0, 0, 8, tzinfo=datetime.timezone.utc))
+        self.assertEqual(parse_time_range((None, "2024-01-01T10:00Z"))[1], datetime.datetime(2024, 1, 1, 10, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(parse_time_range((None, "2024-01-01 10:00:00.12"))[1],
+                         datetime.datetime(2024, 1, 1, 10, 0, 0, 130000, tzinfo=datetime.timezone.utc))
+        self.assertEqual(parse_time_range((None, "2024-01-01"))[1], datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc))
+        self.assertEqual(parse_time_range((None, None)), (None, None))
+        with self.assertRaises(ValueError):
+            parse_time_range(("yesterday", None))
+
+    def test_timezones(self):
+        # entry 7 is logged at 00:00:07.007Z, entry 8 at 01:00:08.007+01:00
+        self.assertEqual(self.query((None, "2024-01-01T00:00:07")), list(range(8)))
+        self.assertEqual(self.query((None, "2024-01-01T01:00:07+01:00")), list(range(8)))
+        self.assertEqual(self.query(("2024-01-01T01:00:05.007+0100", "2024-01-01T00:00:08Z")), [5, 6, 7, 8])
+        self.assertEqual(self.query(("2024-01-01T00:00:05.008Z", "2024-01-01T00:00:08.006Z")), [6, 7])
+        self.assertEqual(self.query(("2024-01-01T00:00:15", None)), [15, 16, 17, 18, 19])
+        self.assertEqual(self.query((None, "2023-12-31T23:59")), [])
+
+    def test_unparsable(self):
+        # entries whose timestamp can not be parsed match every time range
+        for filename in self.filenames:
+            entries = list(Rawlog().iterate_file(filename, time_range=(None, "2023-12-31")))
+            self.assertEqual([entry["message"] for entry in entries], ["unparsable"])
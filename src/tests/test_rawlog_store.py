@@ -0,0 +1,106 @@
+import os
+import json
+import struct
+import tempfile
+import unittest
+
+from shared.storage import Rawlog
+from shared.storage.rawlog import PREFIX_FORMAT, serialize_entry, _encode_entry
+from shared.storage.spill import SpillingEntries
+
+# records are json encoded with whitespace the encoder of our store_fp() would not write, copied records keep it
+def write_rawlog(filename, entries):
+    with open(filename, "wb") as fp:
+        for entry in entries:
+            json_bytes = bytes(json.dumps(entry, indent=1), "UTF-8")
+            fp.write(struct.pack(PREFIX_FORMAT, len(json_bytes)) + json_bytes)
+
+def read_records(filename):
+    records = []
+    with open(filename, "rb") as fp:
+        data = fp.read()
+    pos = 0
+    while pos < len(data):
+        length = struct.unpack_from(PREFIX_FORMAT, data, pos)[0]
+        records.append(data[pos:pos + struct.calcsize(PREFIX_FORMAT) + length])
+        pos += struct.calcsize(PREFIX_FORMAT) + length
+    return records
+
+class PassthroughStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = self.path("source.rawlog")
+        self.entries = [{"timestamp": "2024-01-01T00:00:%02dZ" % num, "message": "message %d" % num} for num in range(50)]
+        write_rawlog(self.source, self.entries)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def store(self, filename, suffix):
+        rawlog = Rawlog()
+        rawlog.load_file(filename)
+        rawlog.store_file(filename + suffix)
+        return filename + suffix
+
+    def test_copied_bytes(self):
+        # plain rawlogs are copied by the kernel, compressed ones and block containers are copied the hard way
+        for filename in (self.source, self.store(self.source, ".gz"), self.store(self.source, ".blk")):
+            rawlog = Rawlog()
+            self.assertTrue(rawlog.load_file(filename))
+            self.assertTrue(rawlog.store_file(self.path("copy.rawlog")))
+            with open(self.source, "rb") as source, open(self.path("copy.rawlog"), "rb") as copy:
+                self.assertEqual(copy.read(), source.read())
+
+    def test_modified_entries(self):
+        rawlog = Rawlog()
+        self.assertTrue(rawlog.load_file(self.source))
+        rawlog[3]["message"] = "modified in place"
+        rawlog.mark_modified(3)
+        rawlog[4] = dict(rawlog[4], message="replaced")
+        self.assertTrue(rawlog.store_file(self.path("copy.rawlog")))
+        records = read_records(self.path("copy.rawlog"))
+        source_records = read_records(self.source)
+        # modified entries are encoded again, all others are copied
+        for num, record in enumerate(records):
+            if num in (3, 4):
+                self.assertNotEqual(record, source_records[num])
+            else:
+                self.assertEqual(record, source_records[num])
+        loaded = Rawlog()
+        loaded.load_file(self.path("copy.rawlog"))
+        self.assertEqual([entry["message"] for entry in loaded.data][2:6], ["message 2", "modified in place", "replaced", "message 5"])
+
+    def test_no_passthrough(self):
+        rawlog = Rawlog()
+        rawlog.load_file(self.source)
+        self.assertTrue(rawlog.store_file(self.path("copy.rawlog"), passthrough=False))
+        self.assertEqual(read_records(self.path("copy.rawlog")), [serialize_entry(entry) for entry in rawlog.data])
+        self.assertNotEqual(read_records(self.path("copy.rawlog")), read_records(self.source))
+
+    def test_changed_source(self):
+        rawlog = Rawlog()
+        rawlog.load_file(self.source)
+        write_rawlog(self.source, [{"message": "changed"}] * 50)
+        os.utime(self.source, ns=(0, 0))
+        self.assertTrue(rawlog.store_file(self.path("copy.rawlog")))
+        loaded = Rawlog()
+        loaded.load_file(self.path("copy.rawlog"))
+        self.assertEqual([entry["message"] for entry in loaded.data], [entry["message"] for entry in self.entries])
+
+    def test_spilling_entries(self):
+        rawlog = Rawlog()
+        rawlog.data = SpillingEntries(PREFIX_FORMAT, _encode_entry, max_entries=10)
+        try:
+            for entry in self.entries:
+                rawlog._append_entry(dict(entry))
+            # records are copied from the spill file
+            self.assertTrue(rawlog.store_file(self.path("copy.rawlog")))
+            self.assertEqual(read_records(self.path("copy.rawlog")), read_records(rawlog.data.filename))
+            loaded = Rawlog()
+            loaded.load_file(self.path("copy.rawlog"))
+            self.assertEqual([entry["message"] for entry in loaded.data], [entry["message"] for entry in self.entries])
+        finally:
+            rawlog.data.close()
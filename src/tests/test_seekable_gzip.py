@@ -0,0 +1,54 @@
+import io
+import gzip
+import random
+import unittest
+
+from shared.utils import SeekableGzipFile, open_seekable_gzip
+
+# about 2 MiB of not too compressible data
+DATA = b"".join(b"line %d: %s\n" % (num, bytes(random.Random(num).choices(b"abcdefghij", k=num % 200))) for num in range(20000))
+
+class SeekableGzipFileTest(unittest.TestCase):
+    # raw reads may be short (e.g. at the end of a gzip member), buffered ones are not
+    def open(self, compressed, spacing=64 * 1024):
+        return io.BufferedReader(SeekableGzipFile(io.BytesIO(compressed), spacing), 4096)
+
+    def test_round_trip(self):
+        with open_seekable_gzip(io.BytesIO(gzip.compress(DATA))) as fp:
+            self.assertEqual(fp.read(), DATA)
+
+    def test_seek(self):
+        fp = self.open(gzip.compress(DATA))
+        rand = random.Random(0)
+        # forward and backward seeks using the checkpoints created while reading
+        for offset in [0, 100, 1000000, 5] + [rand.randrange(len(DATA)) for _ in range(50)]:
+            self.assertEqual(fp.seek(offset), offset)
+            self.assertEqual(fp.read(1000), DATA[offset:offset + 1000])
+            self.assertEqual(fp.tell(), min(offset + 1000, len(DATA)))
+        self.assertGreater(len(fp.raw.checkpoints), 1)
+
+    def test_seek_whence(self):
+        fp = self.open(gzip.compress(DATA))
+        self.assertEqual(fp.seek(-10, io.SEEK_END), len(DATA) - 10)
+        self.assertEqual(fp.read(), DATA[-10:])
+        fp.seek(500)
+        self.assertEqual(fp.seek(-100, io.SEEK_CUR), 400)
+        self.assertEqual(fp.read(10), DATA[400:410])
+        self.assertEqual(fp.seek(len(DATA) + 10), len(DATA))
+        self.assertEqual(fp.read(10), b"")
+        with self.assertRaises(ValueError):
+            fp.seek(-1)
+
+    def test_multiple_members(self):
+        half = len(DATA) // 2
+        fp = self.open(gzip.compress(DATA[:half]) + b"\x00" * 8 + gzip.compress(DATA[half:]))
+        self.assertEqual(fp.seek(half - 5), half - 5)
+        self.assertEqual(fp.read(10), DATA[half - 5:half + 5])
+        fp.seek(0)
+        self.assertEqual(fp.read(), DATA)
+
+    def test_truncated(self):
+        compressed = gzip.compress(DATA)
+        with self.assertLogs("shared.utils.seekable_gzip", "WARNING"):
+            data = self.open(compressed[:len(compressed) // 2]).read()
+        self.assertTrue(DATA.startswith(data))
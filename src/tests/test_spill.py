@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from shared.storage import Rawlog
+from shared.storage.rawlog import PREFIX_FORMAT, _encode_entry
+from shared.storage.spill import SpillingEntries, CACHE_SIZE
+
+def make_entry(num):
+    return {"timestamp": "2024-01-01T00:00:%02dZ" % (num % 60), "message": "message %d %s" % (num, "x" * (num % 30))}
+
+class SpillingEntriesTest(unittest.TestCase):
+    def fill(self, entries, count):
+        for num in range(count):
+            entry = make_entry(num)
+            entry["__logline_index"] = num
+            entry["__virtual"] = False
+            entries.append(entry, entry)
+
+    def test_paging(self):
+        entries = SpillingEntries(PREFIX_FORMAT, _encode_entry, max_entries=100)
+        try:
+            self.fill(entries, CACHE_SIZE + 1000)
+            self.assertEqual(len(entries), CACHE_SIZE + 1000)
+            self.assertLessEqual(len(entries.resident), 100)
+            self.assertGreater(entries.spilled, 0)
+            # random access pages in spilled entries (more than fit into our cache), iterating does not evict them
+            for num in list(range(0, len(entries), 7)) + [5, len(entries) - 1, 5]:
+                self.assertEqual(entries[num]["message"], make_entry(num)["message"])
+                self.assertEqual(entries[num]["__logline_index"], num)
+            self.assertLessEqual(len(entries.cache), CACHE_SIZE)
+            self.assertEqual([entry["message"] for entry in entries], [make_entry(num)["message"] for num in range(len(entries))])
+            self.assertEqual(entries[-1]["message"], make_entry(len(entries) - 1)["message"])
+            self.assertEqual([entry["__logline_index"] for entry in entries[3:9:2]], [3, 5, 7])
+            with self.assertRaises(IndexError):
+                entries[len(entries)]
+        finally:
+            entries.close()
+        self.assertFalse(os.path.exists(entries.filename))
+
+    def test_byte_limit(self):
+        entries = SpillingEntries(PREFIX_FORMAT, _encode_entry, max_bytes=4096)
+        try:
+            self.fill(entries, 1000)
+            self.assertLessEqual(entries.resident_bytes, 4096)
+            self.assertEqual(entries[0]["message"], make_entry(0)["message"])
+        finally:
+            entries.close()
+
+    def test_overrides(self):
+        entries = SpillingEntries(PREFIX_FORMAT, _encode_entry, load_callback=lambda entry: {"data": entry}, max_entries=10)
+        try:
+            self.fill(entries, 100)
+            # the load callback is applied to paged in entries only, replaced entries survive being spilled
+            self.assertEqual(entries[0]["data"]["message"], make_entry(0)["message"])
+            entries[1] = {"data": {"message": "replaced"}}
+            entries[99] = {"data": {"message": "replaced too"}}
+            self.fill(entries, 100)
+            self.assertEqual(entries[1]["data"]["message"], "replaced")
+            self.assertEqual(entries[99]["data"]["message"], "replaced too")
+        finally:
+            entries.close()
+
+    def test_kept_segment_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "segment.rawlog")
+            entries = SpillingEntries(PREFIX_FORMAT, _encode_entry, max_entries=10, filename=filename)
+            self.fill(entries, 50)
+            entries.close()
+            # the segment file is a plain rawlog file
+            rawlog = Rawlog()
+            self.assertTrue(rawlog.load_file(filename))
+            self.assertEqual([entry["message"] for entry in rawlog.data], [make_entry(num)["message"] for num in range(50)])